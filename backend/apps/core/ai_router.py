@@ -0,0 +1,1429 @@
+"""
+Gestionnaire unifié pour les appels IA hybrides.
+- Local (Ollama): Embeddings avec nomic-embed-text
+- Cloud (OpenRouter): Génération de texte avec Claude/DeepSeek
+"""
+
+import asyncio
+import atexit
+import hashlib
+import httpx
+import os
+from typing import List, Dict, Any, Optional, Literal, Iterator, AsyncIterator, Tuple, Union
+from dataclasses import dataclass
+from enum import Enum
+import json
+import time
+import logging
+import numpy as np
+from openai import OpenAI, AsyncOpenAI
+
+from apps.core.endpoint_pool import EndpointPool, NoHealthyEndpointError, parse_endpoint_urls
+from apps.core.health import AI_HEALTH_CHECK_TIMEOUT, HealthMonitor
+from apps.core.model_router import CHAT_MODEL_TIERS, ModelRouter, RoutingDecision, parse_model_tiers
+from apps.core.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, is_connection_error
+from apps.core.single_flight import SingleFlight
+from apps.core.tokenizers import OLLAMA_CHAT_NUM_CTX, TokenCounter, get_token_counter
+from apps.core.vectors import EMBEDDING_DIMENSIONS, as_float32, l2_normalize, truncate_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURATION DES CONNEXIONS HTTP
+# ========================================
+
+AI_HTTP_MAX_CONNECTIONS = int(os.getenv('AI_HTTP_MAX_CONNECTIONS', 20))  # Par client et par process
+AI_HTTP_MAX_KEEPALIVE = int(os.getenv('AI_HTTP_MAX_KEEPALIVE', 10))  # Connexions gardées ouvertes
+AI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv('AI_HTTP_KEEPALIVE_EXPIRY', 60))  # secondes
+AI_HTTP_CONNECT_TIMEOUT = float(os.getenv('AI_HTTP_CONNECT_TIMEOUT', 5))  # secondes
+AI_HTTP2 = os.getenv('AI_HTTP2', 'True') == 'True'
+
+# Backend d'embedding: 'ollama' (HTTP) ou 'local' (modèle dans le process, CPU)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'ollama')
+
+# Timeout des appels d'embedding (bien plus court que celui des complétions)
+OLLAMA_TIMEOUT = float(os.getenv('OLLAMA_TIMEOUT', 30))  # secondes
+
+# Requêtes d'embedding simultanées par serveur Ollama (get_embeddings_batch)
+OLLAMA_CONCURRENCY_PER_ENDPOINT = int(os.getenv('OLLAMA_CONCURRENCY_PER_ENDPOINT', 2))
+
+# Regroupement des demandes d'embedding identiques simultanées (un seul appel Ollama)
+EMBEDDING_SINGLE_FLIGHT = os.getenv('EMBEDDING_SINGLE_FLIGHT', 'True') == 'True'
+
+# Réponse minimale garantie: en dessous, le prompt est refusé avant l'appel
+MIN_COMPLETION_TOKENS = int(os.getenv('MIN_COMPLETION_TOKENS', 256))
+
+try:
+    import h2  # noqa: F401 (httpx[http2])
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class AIProvider(str, Enum):
+    """Énumération des fournisseurs IA disponibles."""
+    OLLAMA = "ollama"
+    OPENROUTER = "openrouter"
+    LOCAL = "local"  # Modèle d'embedding dans le process (CPU)
+
+
+@dataclass
+class EmbeddingResult:
+    """Résultat d'une génération d'embedding."""
+    embedding: np.ndarray  # float32 contigu, shape (dimensions,)
+    model: str
+    dimensions: int
+    provider: AIProvider
+    execution_time_ms: int
+
+
+def _serialize_embedding_result(result: EmbeddingResult) -> bytes:
+    """En-tête JSON (modèle, fournisseur, temps) puis le vecteur float32 brut."""
+    header = json.dumps({
+        "model": result.model,
+        "provider": result.provider.value,
+        "execution_time_ms": result.execution_time_ms,
+    }).encode('utf-8')
+    return header + b'\n' + as_float32(result.embedding).tobytes()
+
+
+def _deserialize_embedding_result(raw: bytes) -> EmbeddingResult:
+    header, _, data = raw.partition(b'\n')
+    meta = json.loads(header)
+    embedding = np.frombuffer(data, dtype=np.float32).copy()  # Copie alignée et modifiable
+    return EmbeddingResult(
+        embedding=embedding,
+        model=meta["model"],
+        dimensions=len(embedding),
+        provider=AIProvider(meta["provider"]),
+        execution_time_ms=meta["execution_time_ms"]
+    )
+
+
+@dataclass
+class ChatMessage:
+    """Message dans une conversation."""
+    role: Literal["system", "user", "assistant"]
+    content: str
+
+
+@dataclass
+class ChatCompletionResult:
+    """Résultat d'une complétion de chat."""
+    content: str
+    model: str
+    provider: AIProvider
+    tokens_used: int
+    execution_time_ms: int
+    finish_reason: str
+    time_to_first_token_ms: Optional[int] = None  # Streaming uniquement
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    routing_reason: Optional[str] = None  # Raison du choix du modèle (ModelRouter)
+    estimated_prompt_tokens: int = 0  # Comptage local, avant l'appel
+    estimated_completion_tokens: int = 0
+
+
+class _CompletionStream:
+    """Accumule les fragments d'une complétion en streaming (contenu, usage, fin)."""
+    
+    def __init__(self, model: str, start_time: float):
+        self.model = model
+        self.start_time = start_time
+        self.parts: List[str] = []
+        self.finish_reason: Optional[str] = None
+        self.tokens_used = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.time_to_first_token_ms: Optional[int] = None
+    
+    def feed(self, chunk) -> Optional[str]:
+        """Traite un fragment SSE et retourne le texte ajouté (ou None)."""
+        # OpenRouter envoie l'usage dans le dernier fragment (champ hors schéma)
+        usage = getattr(chunk, 'usage', None)
+        if usage:
+            if not isinstance(usage, dict):
+                usage = usage.model_dump()
+            self.tokens_used = usage.get('total_tokens') or 0
+            self.prompt_tokens = usage.get('prompt_tokens') or 0
+            self.completion_tokens = usage.get('completion_tokens') or 0
+        
+        if not chunk.choices:
+            return None
+        
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+        
+        delta = choice.delta.content if choice.delta else None
+        if not delta:
+            return None
+        
+        if self.time_to_first_token_ms is None:
+            self.time_to_first_token_ms = int((time.time() - self.start_time) * 1000)
+        self.parts.append(delta)
+        return delta
+    
+    def result(self) -> ChatCompletionResult:
+        execution_time = int((time.time() - self.start_time) * 1000)
+        
+        logger.info(
+            f"✅ Chat completion (stream) - Modèle: {self.model} | Tokens: {self.tokens_used} | "
+            f"Premier token: {self.time_to_first_token_ms}ms | Temps: {execution_time}ms | "
+            f"Finish: {self.finish_reason}"
+        )
+        
+        return ChatCompletionResult(
+            content="".join(self.parts),
+            model=self.model,
+            provider=AIProvider.OPENROUTER,
+            tokens_used=self.tokens_used,
+            execution_time_ms=execution_time,
+            finish_reason=self.finish_reason or "stop",
+            time_to_first_token_ms=self.time_to_first_token_ms,
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens
+        )
+
+
+class OllamaConnectionError(Exception):
+    """Erreur de connexion au serveur Ollama."""
+    pass
+
+
+class OpenRouterConnectionError(Exception):
+    """Erreur de connexion à l'API OpenRouter."""
+    pass
+
+
+class PromptTooLargeError(ValueError):
+    """Prompt trop long pour la fenêtre de contexte du modèle (refusé avant l'appel)."""
+    
+    def __init__(self, model: str, prompt_tokens: int, limit: int):
+        super().__init__(
+            f"Prompt trop long pour {model}: ~{prompt_tokens} tokens (max {limit})"
+        )
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.limit = limit
+
+
+class OllamaUnavailableError(OllamaConnectionError):
+    """Ollama en panne (disjoncteur ouvert): échec immédiat, sans appel réseau."""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class OpenRouterUnavailableError(OpenRouterConnectionError):
+    """OpenRouter en panne (disjoncteur ouvert): échec immédiat, sans appel réseau."""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AIRouter:
+    """
+    Routeur IA hybride qui gère les appels locaux (Ollama) et cloud (OpenRouter).
+    
+    Architecture:
+    - Embeddings : Toujours en local via Ollama (nomic-embed-text)
+    - Chat/Génération : Toujours en cloud via OpenRouter (Claude/DeepSeek)
+    
+    Configuration via variables d'environnement:
+    - OLLAMA_BASE_URL (ou OLLAMA_BASE_URLS: plusieurs serveurs séparés par des virgules)
+    - OLLAMA_EMBEDDING_MODEL
+    - EMBEDDING_BACKEND ('ollama' ou 'local', voir apps/core/local_embeddings.py)
+    - OPENROUTER_API_KEY
+    - OPENROUTER_BASE_URL
+    - OPENROUTER_DEFAULT_MODEL
+    - CHAT_MODEL_TIERS (routage par paliers, voir apps/core/model_router.py)
+    """
+    
+    def __init__(
+        self,
+        ollama_base_url: Optional[str] = None,
+        ollama_embedding_model: Optional[str] = None,
+        openrouter_api_key: Optional[str] = None,
+        openrouter_base_url: Optional[str] = None,
+        openrouter_default_model: Optional[str] = None,
+        timeout: int = 120,
+        ollama_base_urls: Optional[List[str]] = None,
+        embedding_backend: Optional[str] = None,
+        embedding_dimensions: Optional[int] = None
+    ):
+        """
+        Initialise le routeur IA avec les configurations nécessaires.
+        
+        Args:
+            ollama_base_url: URL du serveur Ollama (défaut: http://localhost:11434)
+            ollama_embedding_model: Modèle d'embedding Ollama (défaut: nomic-embed-text)
+            openrouter_api_key: Clé API OpenRouter
+            openrouter_base_url: URL de l'API OpenRouter
+            openrouter_default_model: Modèle par défaut pour OpenRouter
+            timeout: Timeout pour les requêtes HTTP (secondes)
+            ollama_base_urls: Pool de serveurs Ollama (répartition de charge)
+            embedding_backend: 'ollama' ou 'local' (défaut: EMBEDDING_BACKEND)
+            embedding_dimensions: Dimension des embeddings retournés, tronqués
+                et renormalisés si inférieure à celle du modèle (défaut: EMBEDDING_DIMENSIONS)
+        """
+        # Configuration Ollama (Local): un ou plusieurs serveurs
+        urls = ollama_base_urls or ([ollama_base_url] if ollama_base_url else None)
+        urls = urls or parse_endpoint_urls(os.getenv('OLLAMA_BASE_URLS')) or [
+            os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
+        ]
+        self.ollama_pool = EndpointPool(urls)
+        # Mêmes serveurs pour le palier de chat local, mais compteurs séparés:
+        # une génération lente ne doit pas écarter un serveur pour les embeddings
+        self.ollama_chat_pool = EndpointPool(urls)
+        self.ollama_base_url = self.ollama_pool.primary_url
+        self.ollama_embedding_model = ollama_embedding_model or os.getenv(
+            'OLLAMA_EMBEDDING_MODEL', 
+            'nomic-embed-text'
+        )
+        self.embedding_backend = embedding_backend or EMBEDDING_BACKEND
+        self.embedding_dimensions = embedding_dimensions or EMBEDDING_DIMENSIONS
+        
+        # Configuration OpenRouter (Cloud)
+        self.openrouter_api_key = openrouter_api_key or os.getenv('OPENROUTER_API_KEY')
+        self.openrouter_base_url = openrouter_base_url or os.getenv(
+            'OPENROUTER_BASE_URL',
+            'https://openrouter.ai/api/v1'
+        )
+        self.openrouter_default_model = openrouter_default_model or os.getenv(
+            'OPENROUTER_DEFAULT_MODEL',
+            'anthropic/claude-3.5-sonnet'
+        )
+        
+        # Validation de la configuration
+        if not self.openrouter_api_key:
+            logger.warning("⚠️ OPENROUTER_API_KEY non configurée. Les fonctionnalités de chat seront indisponibles.")
+        
+        self.timeout = timeout
+        self.ollama_timeout = min(timeout, OLLAMA_TIMEOUT)
+        
+        # Disjoncteurs par fournisseur et politique de nouvelles tentatives
+        self.ollama_breaker = CircuitBreaker('ollama')
+        self.ollama_chat_breaker = CircuitBreaker('ollama-chat')
+        self.openrouter_breaker = CircuitBreaker('openrouter')
+        self.retry_policy = RetryPolicy()
+        
+        # Choix du modèle de chat par requête (vide = modèle par défaut)
+        self.model_router = ModelRouter(parse_model_tiers(CHAT_MODEL_TIERS), self.openrouter_default_model)
+        
+        # Sondes de santé en arrière-plan (démarrées au premier get_health_status)
+        self.health_monitor = HealthMonitor(self)
+        
+        # Un seul appel Ollama par embedding identique en cours (entre process si SINGLE_FLIGHT_REDIS)
+        self.embedding_flight = SingleFlight(
+            'ai:emb:flight',
+            serializer=_serialize_embedding_result,
+            deserializer=_deserialize_embedding_result
+        )
+        
+        # Clients HTTP créés au premier usage, dans le process qui les utilise
+        # (jamais partagés entre process après un fork: Celery prefork, gunicorn)
+        # Clients asynchrones: un jeu par boucle d'évènements (leurs connexions
+        # sont liées à la boucle qui les a ouvertes)
+        self._clients_pid: Optional[int] = None
+        self._http_client: Optional[httpx.Client] = None
+        self._openrouter_client: Optional[OpenAI] = None
+        self._async_clients: Dict[int, Dict[str, Any]] = {}
+        
+        logger.info(f"✅ AIRouter initialisé - Ollama: {', '.join(urls)} | OpenRouter: {'Configuré' if self.openrouter_api_key else 'Non configuré'}")
+    
+    # ========================================
+    # EMBEDDINGS (LOCAL - OLLAMA)
+    # ========================================
+    
+    def get_embedding(
+        self, 
+        text: str,
+        model: Optional[str] = None,
+        normalize: bool = True
+    ) -> EmbeddingResult:
+        """
+        Génère un embedding vectoriel pour un texte donné (local Ollama).
+        
+        Args:
+            text: Texte à vectoriser
+            model: Modèle d'embedding à utiliser (défaut: nomic-embed-text)
+            normalize: Normaliser le vecteur (recommandé pour la recherche de similarité)
+        
+        Les demandes identiques simultanées (même texte, modèle et
+        normalisation) partagent un seul appel Ollama et reçoivent le même
+        EmbeddingResult: le vecteur retourné ne doit pas être modifié sur place.
+        
+        Returns:
+            EmbeddingResult avec le vecteur généré
+        
+        Raises:
+            OllamaConnectionError: Si la connexion à Ollama échoue
+        """
+        if self._use_local_embeddings(model):
+            return self._local_embeddings([text], normalize)[0]
+        
+        model = model or self.ollama_embedding_model
+        
+        def call() -> EmbeddingResult:
+            start_time = time.time()
+            try:
+                # Appel à l'API Ollama /api/embeddings (serveur le moins chargé du pool)
+                data = self._post_ollama("/api/embeddings", {"model": model, "prompt": text})
+                
+                return self._build_embedding_result(data, model, normalize, start_time)
+            
+            except Exception as e:
+                raise self._ollama_error(e)
+        
+        if not EMBEDDING_SINGLE_FLIGHT:
+            return call()
+        return self.embedding_flight.do(self._embedding_flight_key(text, model, normalize, self.embedding_dimensions), call)
+    
+    async def aget_embedding(
+        self,
+        text: str,
+        model: Optional[str] = None,
+        normalize: bool = True
+    ) -> EmbeddingResult:
+        """
+        Version asynchrone de get_embedding (vues ASGI).
+        
+        Raises:
+            OllamaConnectionError: Si la connexion à Ollama échoue
+        """
+        if self._use_local_embeddings(model):
+            # Calcul CPU: hors de la boucle d'évènements
+            results = await asyncio.to_thread(self._local_embeddings, [text], normalize)
+            return results[0]
+        
+        model = model or self.ollama_embedding_model
+        
+        async def call() -> EmbeddingResult:
+            start_time = time.time()
+            try:
+                data = await self._apost_ollama("/api/embeddings", {"model": model, "prompt": text})
+                
+                return self._build_embedding_result(data, model, normalize, start_time)
+            
+            except Exception as e:
+                raise self._ollama_error(e)
+        
+        if not EMBEDDING_SINGLE_FLIGHT:
+            return await call()
+        return await self.embedding_flight.ado(self._embedding_flight_key(text, model, normalize, self.embedding_dimensions), call)
+    
+    @staticmethod
+    def _embedding_flight_key(text: str, model: str, normalize: bool, dimensions: int) -> str:
+        """Clé single-flight: hash du modèle, de la dimension, de la normalisation et du texte."""
+        payload = f"{model}\x00{dimensions}\x00{int(normalize)}\x00{text}"
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    @property
+    def embedding_model(self) -> str:
+        """Nom du modèle d'embedding actif (clé des caches d'embeddings)."""
+        if self.embedding_backend == 'local':
+            from apps.core.local_embeddings import get_local_embedding_model
+            return get_local_embedding_model().model_name
+        return self.ollama_embedding_model
+    
+    def _use_local_embeddings(self, model: Optional[str]) -> bool:
+        """Backend local, sauf si un modèle Ollama est demandé explicitement."""
+        return self.embedding_backend == 'local' and model is None
+    
+    def _local_embeddings(self, texts: List[str], normalize: bool) -> List[EmbeddingResult]:
+        """Embeddings calculés dans le process (un seul passage pour tout le lot)."""
+        from apps.core.local_embeddings import get_local_embedding_model
+        
+        local_model = get_local_embedding_model()
+        start_time = time.time()
+        matrix = truncate_embeddings(
+            local_model.encode(texts, normalize=normalize),
+            self.embedding_dimensions,
+            normalize=normalize
+        )
+        execution_time = int((time.time() - start_time) * 1000)
+        
+        logger.debug(f"✅ {len(texts)} embeddings locaux - Modèle: {local_model.model_name} | Temps: {execution_time}ms")
+        
+        return [
+            EmbeddingResult(
+                embedding=vector,  # Ligne de la matrice float32 (vue, sans copie)
+                model=local_model.model_name,
+                dimensions=matrix.shape[1],
+                provider=AIProvider.LOCAL,
+                execution_time_ms=execution_time
+            )
+            for vector in matrix
+        ]
+    
+    def _post_ollama(
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        timeout: Optional[float] = None,
+        chat: bool = False
+    ) -> Dict[str, Any]:
+        """
+        POST vers un serveur Ollama du pool (disjoncteur + nouvelles tentatives).
+        
+        Après une erreur de connexion, la tentative suivante part vers un
+        autre serveur du pool s'il y en a un.
+        
+        Args:
+            chat: Génération du palier de chat local (pool et disjoncteur
+                distincts de ceux des embeddings)
+        """
+        tried = set()
+        timeout = timeout or self.ollama_timeout
+        pool, breaker = self._ollama_pool_and_breaker(chat)
+        
+        def call():
+            with pool.lease(exclude=tried) as endpoint:
+                try:
+                    response = self.http_client.post(
+                        f"{endpoint.url}{path}",
+                        json=payload,
+                        timeout=timeout
+                    )
+                    response.raise_for_status()
+                    return response.json()
+                except Exception as e:
+                    if is_connection_error(e):
+                        tried.add(endpoint.url)
+                    raise
+        
+        return self._with_retries(breaker, call)
+    
+    async def _apost_ollama(
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        timeout: Optional[float] = None,
+        chat: bool = False
+    ) -> Dict[str, Any]:
+        """Version asynchrone de _post_ollama."""
+        tried = set()
+        timeout = timeout or self.ollama_timeout
+        pool, breaker = self._ollama_pool_and_breaker(chat)
+        
+        async def call():
+            with pool.lease(exclude=tried) as endpoint:
+                try:
+                    response = await self.async_http_client.post(
+                        f"{endpoint.url}{path}",
+                        json=payload,
+                        timeout=timeout
+                    )
+                    response.raise_for_status()
+                    return response.json()
+                except Exception as e:
+                    if is_connection_error(e):
+                        tried.add(endpoint.url)
+                    raise
+        
+        return await self._awith_retries(breaker, call)
+    
+    def _ollama_pool_and_breaker(self, chat: bool) -> Tuple[EndpointPool, CircuitBreaker]:
+        if chat:
+            return self.ollama_chat_pool, self.ollama_chat_breaker
+        return self.ollama_pool, self.ollama_breaker
+    
+    # ========================================
+    # DISJONCTEURS ET NOUVELLES TENTATIVES
+    # ========================================
+    
+    def _with_retries(self, breaker: CircuitBreaker, call):
+        """
+        Exécute `call` derrière le disjoncteur du fournisseur.
+        
+        Nouvelles tentatives (backoff exponentiel + jitter) uniquement pour
+        les erreurs transitoires: 429, 5xx, connexion/timeout. Les autres
+        4xx remontent immédiatement.
+        """
+        attempt = 0
+        while True:
+            breaker.before_call()
+            try:
+                result = call()
+            except Exception as e:
+                breaker.record_failure(e)
+                delay = self.retry_policy.next_delay(e, attempt)
+                if delay is None:
+                    raise
+                logger.warning(
+                    f"🔁 {breaker.name}: tentative {attempt + 1} échouée ({str(e)[:120]}), "
+                    f"nouvel essai dans {delay:.1f}s"
+                )
+                time.sleep(delay)
+                attempt += 1
+            except BaseException:
+                # Annulation (CancelledError, client déconnecté...): sans cela un
+                # appel d'essai semi-ouvert bloquerait le disjoncteur pour toujours
+                breaker.release_trial()
+                raise
+            else:
+                breaker.record_success()
+                return result
+    
+    async def _awith_retries(self, breaker: CircuitBreaker, call):
+        """Version asynchrone de _with_retries (`call` est une coroutine function)."""
+        attempt = 0
+        while True:
+            breaker.before_call()
+            try:
+                result = await call()
+            except Exception as e:
+                breaker.record_failure(e)
+                delay = self.retry_policy.next_delay(e, attempt)
+                if delay is None:
+                    raise
+                logger.warning(
+                    f"🔁 {breaker.name}: tentative {attempt + 1} échouée ({str(e)[:120]}), "
+                    f"nouvel essai dans {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+            except BaseException:
+                # Annulation (CancelledError, client déconnecté...): sans cela un
+                # appel d'essai semi-ouvert bloquerait le disjoncteur pour toujours
+                breaker.release_trial()
+                raise
+            else:
+                breaker.record_success()
+                return result
+    
+    @staticmethod
+    def _openrouter_error(error: Exception) -> OpenRouterConnectionError:
+        """Convertit une erreur d'appel OpenRouter (et la journalise)."""
+        if isinstance(error, OpenRouterConnectionError):
+            return error
+        if isinstance(error, CircuitOpenError):
+            logger.error(f"❌ {str(error)}")
+            return OpenRouterUnavailableError(str(error), error.retry_after)
+        logger.error(f"❌ Erreur OpenRouter: {str(error)}")
+        return OpenRouterConnectionError(f"Erreur lors de l'appel à OpenRouter: {str(error)}")
+    
+    def _build_embedding_result(
+        self,
+        data: Dict[str, Any],
+        model: str,
+        normalize: bool,
+        start_time: float
+    ) -> EmbeddingResult:
+        """Construit un EmbeddingResult depuis la réponse JSON d'Ollama."""
+        values = data.get('embedding')
+        
+        if not values:
+            raise OllamaConnectionError("Aucun embedding retourné par Ollama")
+        
+        # Une seule conversion JSON -> float32, normalisation sur place si demandée
+        embedding = as_float32(values)
+        if len(embedding) != self.embedding_dimensions:
+            # Dimension réduite (Matryoshka): tronqué puis renormalisé
+            embedding = truncate_embeddings(embedding, self.embedding_dimensions, normalize=normalize)
+        elif normalize:
+            l2_normalize(embedding)
+        
+        execution_time = int((time.time() - start_time) * 1000)
+        
+        logger.debug(f"✅ Embedding généré - Modèle: {model} | Dimensions: {len(embedding)} | Temps: {execution_time}ms")
+        
+        return EmbeddingResult(
+            embedding=embedding,
+            model=model,
+            dimensions=len(embedding),
+            provider=AIProvider.OLLAMA,
+            execution_time_ms=execution_time
+        )
+    
+    def _ollama_error(self, error: Exception) -> OllamaConnectionError:
+        """Convertit une erreur d'appel Ollama en OllamaConnectionError (et la journalise)."""
+        if isinstance(error, OllamaConnectionError):
+            return error
+        
+        if isinstance(error, CircuitOpenError):
+            logger.error(f"❌ {str(error)}")
+            return OllamaUnavailableError(str(error), error.retry_after)
+        
+        if isinstance(error, httpx.HTTPStatusError):
+            logger.error(f"❌ Erreur HTTP Ollama: {error.response.status_code} - {error.response.text}")
+            return OllamaConnectionError(f"Erreur HTTP {error.response.status_code}: {error.response.text}")
+        
+        if isinstance(error, httpx.RequestError):
+            logger.error(f"❌ Erreur de connexion Ollama: {str(error)}")
+            return OllamaConnectionError(f"Impossible de se connecter à Ollama: {str(error)}")
+        
+        if isinstance(error, NoHealthyEndpointError):
+            logger.error(f"❌ {str(error)}")
+            return OllamaConnectionError(str(error))
+        
+        logger.error(f"❌ Erreur inattendue lors de la génération d'embedding: {str(error)}")
+        return OllamaConnectionError(f"Erreur inattendue: {str(error)}")
+    
+    def get_embeddings_batch(
+        self, 
+        texts: List[str],
+        model: Optional[str] = None,
+        normalize: bool = True
+    ) -> List[EmbeddingResult]:
+        """
+        Génère des embeddings pour plusieurs textes.
+        
+        Backend local: un seul encodage par lots. Ollama: séquentiel avec
+        un seul serveur; avec un pool, les requêtes sont réparties en
+        parallèle (OLLAMA_CONCURRENCY_PER_ENDPOINT par serveur), dans
+        l'ordre des textes.
+        
+        Args:
+            texts: Liste de textes à vectoriser
+            model: Modèle d'embedding
+            normalize: Normaliser les vecteurs
+        
+        Returns:
+            Liste d'EmbeddingResult
+        """
+        if not texts:
+            return []
+        
+        # Textes en double (chunks répétés d'un import): calculés une seule fois
+        unique_texts = list(dict.fromkeys(texts))
+        workers = min(len(unique_texts), len(self.ollama_pool) * OLLAMA_CONCURRENCY_PER_ENDPOINT)
+        
+        if self._use_local_embeddings(model):
+            unique_results = self._local_embeddings(unique_texts, normalize)
+        elif len(self.ollama_pool) > 1 and workers > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                unique_results = list(executor.map(
+                    lambda text: self.get_embedding(text, model=model, normalize=normalize),
+                    unique_texts
+                ))
+        else:
+            unique_results = [self.get_embedding(text, model=model, normalize=normalize) for text in unique_texts]
+        
+        if len(unique_texts) == len(texts):
+            results = unique_results
+        else:
+            by_text = dict(zip(unique_texts, unique_results))
+            results = [by_text[text] for text in texts]
+        
+        logger.info(f"✅ Batch d'embeddings généré: {len(results)} textes ({len(unique_texts)} distincts)")
+        return results
+    
+    # ========================================
+    # CHAT COMPLETION (CLOUD - OPENROUTER)
+    # ========================================
+    
+    def route_chat_model(
+        self,
+        messages: List[ChatMessage] | List[Dict[str, str]],
+        model: Optional[str] = None,
+        allow_local: bool = True
+    ) -> RoutingDecision:
+        """
+        Choisit le modèle de chat d'une requête (voir ModelRouter).
+        
+        Args:
+            messages: Messages du prompt (taille estimée)
+            model: Modèle demandé explicitement (pas de routage)
+            allow_local: Autoriser un palier Ollama local
+        """
+        prompt_tokens = self.estimate_prompt_tokens(messages)
+        decision = self.model_router.choose(prompt_tokens, requested_model=model, allow_local=allow_local)
+        
+        if self.model_router.enabled:
+            logger.debug(f"🧭 Modèle {decision.model} - {decision.reason}")
+        return decision
+    
+    def token_counter(self, model: Optional[str] = None) -> TokenCounter:
+        """Compteur de tokens local du modèle (défaut: modèle OpenRouter par défaut)."""
+        return get_token_counter(model or self.openrouter_default_model)
+    
+    def estimate_prompt_tokens(
+        self,
+        messages: List[ChatMessage] | List[Dict[str, str]],
+        model: Optional[str] = None
+    ) -> int:
+        """Nombre de tokens du prompt, compté localement (format de chat inclus)."""
+        return self.token_counter(model).count_messages(self._format_messages(messages))
+    
+    def fit_completion_budget(
+        self,
+        messages: List[ChatMessage] | List[Dict[str, str]],
+        model: str,
+        max_tokens: int
+    ) -> Tuple[int, int]:
+        """
+        Vérifie que le prompt tient dans la fenêtre de contexte du modèle.
+        
+        max_tokens est réduit si prompt + réponse dépasserait la fenêtre
+        (le fournisseur refuserait ou tronquerait la requête après l'avoir
+        facturée). Si la place restante est inférieure à
+        MIN_COMPLETION_TOKENS, la requête est refusée sans appel réseau.
+        
+        Returns:
+            Tuple (tokens estimés du prompt, max_tokens ajusté)
+        
+        Raises:
+            PromptTooLargeError: Si le prompt est trop long
+        """
+        counter = self.token_counter(model)
+        prompt_tokens = counter.count_messages(self._format_messages(messages))
+        available = counter.profile.context_window - prompt_tokens
+        
+        if available < min(max_tokens, MIN_COMPLETION_TOKENS):
+            logger.warning(f"⚠️ Prompt refusé avant l'appel: ~{prompt_tokens} tokens pour {model}")
+            raise PromptTooLargeError(model, prompt_tokens, counter.profile.context_window - MIN_COMPLETION_TOKENS)
+        
+        if max_tokens > available:
+            logger.debug(f"✂️ max_tokens réduit de {max_tokens} à {available} ({model})")
+            max_tokens = available
+        
+        return prompt_tokens, max_tokens
+    
+    def chat_completion(
+        self,
+        messages: List[ChatMessage] | List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        routing: Optional[RoutingDecision] = None
+    ) -> ChatCompletionResult:
+        """
+        Génère une réponse de chat via OpenRouter (Claude, DeepSeek, etc.).
+        
+        Sans modèle explicite, le modèle est choisi par le routeur de
+        paliers (CHAT_MODEL_TIERS), éventuellement un modèle Ollama local.
+        
+        Args:
+            messages: Liste de messages (format ChatMessage ou dict)
+            model: Modèle à utiliser (défaut: routage, sinon claude-3.5-sonnet)
+            temperature: Créativité (0.0 = déterministe, 1.0 = créatif)
+            max_tokens: Nombre maximum de tokens dans la réponse
+            routing: Modèle déjà choisi par l'appelant (RagPipeline.build_messages),
+                sans nouveau routage
+        
+        Returns:
+            ChatCompletionResult avec la réponse générée
+        
+        Raises:
+            OpenRouterConnectionError: Si l'appel échoue
+        """
+        decision = routing or self.route_chat_model(messages, model)
+        
+        if decision.is_local:
+            try:
+                prompt_tokens, local_max_tokens = self.fit_completion_budget(messages, decision.model, max_tokens)
+                result = self._ollama_chat_completion(messages, decision, temperature, local_max_tokens)
+                return self._record_routed_result(result, decision, prompt_tokens)
+            except (OllamaConnectionError, PromptTooLargeError) as e:
+                if model:
+                    raise
+                # Palier local indisponible ou trop petit: palier distant suivant
+                decision = self._reroute_remote(messages, decision, e)
+        
+        prompt_tokens, max_tokens = self.fit_completion_budget(messages, decision.model, max_tokens)
+        result = self._openrouter_chat_completion(messages, decision.model, temperature, max_tokens)
+        return self._record_routed_result(result, decision, prompt_tokens)
+    
+    async def achat_completion(
+        self,
+        messages: List[ChatMessage] | List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        routing: Optional[RoutingDecision] = None
+    ) -> ChatCompletionResult:
+        """
+        Version asynchrone de chat_completion (vues ASGI).
+        
+        Raises:
+            OpenRouterConnectionError: Si l'appel échoue
+        """
+        decision = routing or self.route_chat_model(messages, model)
+        
+        if decision.is_local:
+            try:
+                prompt_tokens, local_max_tokens = self.fit_completion_budget(messages, decision.model, max_tokens)
+                result = await self._aollama_chat_completion(messages, decision, temperature, local_max_tokens)
+                return self._record_routed_result(result, decision, prompt_tokens)
+            except (OllamaConnectionError, PromptTooLargeError) as e:
+                if model:
+                    raise
+                decision = self._reroute_remote(messages, decision, e)
+        
+        prompt_tokens, max_tokens = self.fit_completion_budget(messages, decision.model, max_tokens)
+        
+        client = self.async_openrouter_client
+        if client is None:
+            raise OpenRouterConnectionError("OpenRouter n'est pas configuré (clé API manquante)")
+        
+        start_time = time.time()
+        
+        try:
+            response = await self._awith_retries(
+                self.openrouter_breaker,
+                lambda: client.chat.completions.create(
+                    model=decision.model,
+                    messages=self._format_messages(messages),
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
+            )
+            
+            result = self._build_completion_result(response, decision.model, start_time)
+        
+        except Exception as e:
+            raise self._openrouter_error(e)
+        
+        return self._record_routed_result(result, decision, prompt_tokens)
+    
+    def stream_chat_completion(
+        self,
+        messages: List[ChatMessage] | List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        routing: Optional[RoutingDecision] = None
+    ) -> Iterator[Union[str, ChatCompletionResult]]:
+        """
+        Génère une réponse de chat en streaming via OpenRouter.
+        
+        Produit les fragments de texte (str) au fil de la génération, puis
+        un dernier élément ChatCompletionResult (contenu complet, tokens,
+        temps jusqu'au premier token). Le routage n'utilise que les paliers
+        OpenRouter.
+        
+        Raises:
+            OpenRouterConnectionError: Si l'appel échoue
+        """
+        if not self.openrouter_client:
+            raise OpenRouterConnectionError("OpenRouter n'est pas configuré (clé API manquante)")
+        
+        decision = routing or self.route_chat_model(messages, model, allow_local=False)
+        prompt_tokens, max_tokens = self.fit_completion_budget(messages, decision.model, max_tokens)
+        state = _CompletionStream(decision.model, time.time())
+        
+        try:
+            # Nouvelles tentatives possibles jusqu'à l'ouverture du flux seulement
+            response = self._with_retries(
+                self.openrouter_breaker,
+                lambda: self.openrouter_client.chat.completions.create(
+                    model=decision.model,
+                    messages=self._format_messages(messages),
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    extra_body={"stream_options": {"include_usage": True}}
+                )
+            )
+            
+            for chunk in response:
+                delta = state.feed(chunk)
+                if delta:
+                    yield delta
+        
+        except Exception as e:
+            raise self._openrouter_error(e)
+        
+        yield self._record_routed_result(state.result(), decision, prompt_tokens)
+    
+    async def astream_chat_completion(
+        self,
+        messages: List[ChatMessage] | List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        routing: Optional[RoutingDecision] = None
+    ) -> AsyncIterator[Union[str, ChatCompletionResult]]:
+        """
+        Version asynchrone de stream_chat_completion (vues ASGI).
+        
+        Raises:
+            OpenRouterConnectionError: Si l'appel échoue
+        """
+        client = self.async_openrouter_client
+        if client is None:
+            raise OpenRouterConnectionError("OpenRouter n'est pas configuré (clé API manquante)")
+        
+        decision = routing or self.route_chat_model(messages, model, allow_local=False)
+        prompt_tokens, max_tokens = self.fit_completion_budget(messages, decision.model, max_tokens)
+        state = _CompletionStream(decision.model, time.time())
+        
+        try:
+            response = await self._awith_retries(
+                self.openrouter_breaker,
+                lambda: client.chat.completions.create(
+                    model=decision.model,
+                    messages=self._format_messages(messages),
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    extra_body={"stream_options": {"include_usage": True}}
+                )
+            )
+            
+            async for chunk in response:
+                delta = state.feed(chunk)
+                if delta:
+                    yield delta
+        
+        except Exception as e:
+            raise self._openrouter_error(e)
+        
+        yield self._record_routed_result(state.result(), decision, prompt_tokens)
+    
+    def _openrouter_chat_completion(
+        self,
+        messages: List[ChatMessage] | List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: int
+    ) -> ChatCompletionResult:
+        """Appel OpenRouter (compatible OpenAI) sans routage."""
+        if not self.openrouter_client:
+            raise OpenRouterConnectionError("OpenRouter n'est pas configuré (clé API manquante)")
+        
+        start_time = time.time()
+        
+        try:
+            response = self._with_retries(
+                self.openrouter_breaker,
+                lambda: self.openrouter_client.chat.completions.create(
+                    model=model,
+                    messages=self._format_messages(messages),
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
+            )
+            
+            return self._build_completion_result(response, model, start_time)
+        
+        except Exception as e:
+            raise self._openrouter_error(e)
+    
+    def _ollama_chat_completion(
+        self,
+        messages: List[ChatMessage] | List[Dict[str, str]],
+        decision: RoutingDecision,
+        temperature: float,
+        max_tokens: int
+    ) -> ChatCompletionResult:
+        """Complétion par un modèle de chat Ollama (palier local)."""
+        start_time = time.time()
+        
+        try:
+            data = self._post_ollama(
+                "/api/chat",
+                self._ollama_chat_payload(messages, decision, temperature, max_tokens),
+                timeout=self.timeout,
+                chat=True
+            )
+        except Exception as e:
+            raise self._ollama_error(e)
+        
+        return self._build_ollama_chat_result(data, decision.model, start_time)
+    
+    async def _aollama_chat_completion(
+        self,
+        messages: List[ChatMessage] | List[Dict[str, str]],
+        decision: RoutingDecision,
+        temperature: float,
+        max_tokens: int
+    ) -> ChatCompletionResult:
+        """Version asynchrone de _ollama_chat_completion."""
+        start_time = time.time()
+        
+        try:
+            data = await self._apost_ollama(
+                "/api/chat",
+                self._ollama_chat_payload(messages, decision, temperature, max_tokens),
+                timeout=self.timeout,
+                chat=True
+            )
+        except Exception as e:
+            raise self._ollama_error(e)
+        
+        return self._build_ollama_chat_result(data, decision.model, start_time)
+    
+    def _ollama_chat_payload(
+        self,
+        messages: List[ChatMessage] | List[Dict[str, str]],
+        decision: RoutingDecision,
+        temperature: float,
+        max_tokens: int
+    ) -> Dict[str, Any]:
+        return {
+            "model": decision.provider_model,
+            "messages": self._format_messages(messages),
+            "stream": False,
+            "options": {"temperature": temperature, "num_predict": max_tokens, "num_ctx": OLLAMA_CHAT_NUM_CTX},
+        }
+    
+    def _reroute_remote(
+        self,
+        messages: List[ChatMessage] | List[Dict[str, str]],
+        decision: RoutingDecision,
+        error: Exception
+    ) -> RoutingDecision:
+        """Nouveau choix parmi les paliers distants après l'échec du palier local."""
+        logger.warning(f"⚠️ Modèle local {decision.model} indisponible ({str(error)[:120]}), palier distant")
+        remote = self.route_chat_model(messages, allow_local=False)
+        remote.reason = f"{remote.reason} (après échec de {decision.model})"
+        return remote
+    
+    def _record_routed_result(
+        self,
+        result: ChatCompletionResult,
+        decision: RoutingDecision,
+        estimated_prompt_tokens: int
+    ) -> ChatCompletionResult:
+        """Ajoute le routage et les estimations de tokens, alimente la fenêtre de latence du modèle."""
+        result.routing_reason = decision.reason
+        result.estimated_prompt_tokens = estimated_prompt_tokens
+        result.estimated_completion_tokens = self.token_counter(decision.model).count(result.content or "")
+        self.model_router.latencies.record(decision.model, result.execution_time_ms)
+        return result
+    
+    @staticmethod
+    def _format_messages(messages: List[ChatMessage] | List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Conversion des messages au format OpenAI."""
+        formatted_messages = []
+        for msg in messages:
+            if isinstance(msg, ChatMessage):
+                formatted_messages.append({
+                    "role": msg.role,
+                    "content": msg.content
+                })
+            else:
+                formatted_messages.append(msg)
+        return formatted_messages
+    
+    def _build_completion_result(self, response, model: str, start_time: float) -> ChatCompletionResult:
+        """Construit un ChatCompletionResult depuis la réponse OpenRouter."""
+        execution_time = int((time.time() - start_time) * 1000)
+        
+        # Extraction de la réponse
+        choice = response.choices[0]
+        content = choice.message.content
+        finish_reason = choice.finish_reason
+        
+        # Comptage des tokens
+        usage = getattr(response, 'usage', None)
+        tokens_used = usage.total_tokens if usage else 0
+        
+        logger.info(
+            f"✅ Chat completion - Modèle: {model} | Tokens: {tokens_used} | "
+            f"Temps: {execution_time}ms | Finish: {finish_reason}"
+        )
+        
+        return ChatCompletionResult(
+            content=content,
+            model=model,
+            provider=AIProvider.OPENROUTER,
+            tokens_used=tokens_used,
+            execution_time_ms=execution_time,
+            finish_reason=finish_reason,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0
+        )
+    
+    def _build_ollama_chat_result(self, data: Dict[str, Any], model: str, start_time: float) -> ChatCompletionResult:
+        """Construit un ChatCompletionResult depuis la réponse /api/chat d'Ollama."""
+        execution_time = int((time.time() - start_time) * 1000)
+        
+        content = (data.get('message') or {}).get('content')
+        if content is None:
+            raise OllamaConnectionError("Aucune réponse retournée par Ollama")
+        
+        prompt_tokens = data.get('prompt_eval_count') or 0
+        completion_tokens = data.get('eval_count') or 0
+        finish_reason = data.get('done_reason') or "stop"
+        
+        logger.info(
+            f"✅ Chat completion (Ollama) - Modèle: {model} | Tokens: {prompt_tokens + completion_tokens} | "
+            f"Temps: {execution_time}ms | Finish: {finish_reason}"
+        )
+        
+        return ChatCompletionResult(
+            content=content,
+            model=model,
+            provider=AIProvider.OLLAMA,
+            tokens_used=prompt_tokens + completion_tokens,
+            execution_time_ms=execution_time,
+            finish_reason=finish_reason,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens
+        )
+    
+    # ========================================
+    # CLIENTS HTTP (POOL DE CONNEXIONS PAR PROCESS)
+    # ========================================
+    
+    def _check_process(self) -> None:
+        """
+        Oublie les clients hérités d'un process parent.
+        
+        Après un fork, les sockets du pool sont partagés avec le parent: les
+        réutiliser mélangerait les échanges des deux process. On abandonne
+        les références (sans fermer, ce qui couperait aussi les connexions
+        du parent) et de nouveaux clients sont créés à la demande.
+        """
+        pid = os.getpid()
+        if self._clients_pid == pid:
+            return
+        if self._clients_pid is not None:
+            logger.debug(f"🔄 Fork détecté (pid {self._clients_pid} -> {pid}), nouveaux clients HTTP")
+        self._clients_pid = pid
+        self._http_client = None
+        self._openrouter_client = None
+        self._async_clients = {}
+    
+    def _loop_clients(self) -> Dict[str, Any]:
+        """
+        Clients asynchrones de la boucle d'évènements courante.
+        
+        Chaque asyncio.run (ou async_to_sync hors ASGI) crée une nouvelle
+        boucle: les clients d'une boucle fermée lèveraient "Event loop is
+        closed" (compté comme une panne par le disjoncteur). On les abandonne
+        sans les fermer, leurs connexions ayant disparu avec la boucle.
+        """
+        self._check_process()
+        loop = asyncio.get_running_loop()
+        clients = self._async_clients.get(id(loop))
+        if clients is None or clients["loop"] is not loop:
+            for loop_id, stale in list(self._async_clients.items()):
+                if stale["loop"].is_closed():
+                    self._async_clients.pop(loop_id, None)
+            clients = self._async_clients[id(loop)] = {"loop": loop, "http": None, "openrouter": None}
+        return clients
+    
+    def _http_options(self) -> Dict[str, Any]:
+        """Paramètres communs des clients httpx (pool, keep-alive, HTTP/2)."""
+        return {
+            "timeout": httpx.Timeout(self.timeout, connect=AI_HTTP_CONNECT_TIMEOUT),
+            "limits": httpx.Limits(
+                max_connections=AI_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=AI_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=AI_HTTP_KEEPALIVE_EXPIRY
+            ),
+            # Négocié via ALPN: HTTP/2 en TLS si le serveur le propose, HTTP/1.1 sinon
+            "http2": AI_HTTP2 and HTTP2_AVAILABLE,
+        }
+    
+    @property
+    def http_client(self) -> httpx.Client:
+        """Client HTTP pour Ollama (pool de connexions du process)."""
+        self._check_process()
+        if self._http_client is None:
+            self._http_client = httpx.Client(**self._http_options())
+        return self._http_client
+    
+    @property
+    def openrouter_client(self) -> Optional[OpenAI]:
+        """Client OpenAI-compatible pour OpenRouter (None si non configuré)."""
+        self._check_process()
+        if self._openrouter_client is None and self.openrouter_api_key:
+            self._openrouter_client = OpenAI(
+                base_url=self.openrouter_base_url,
+                api_key=self.openrouter_api_key,
+                timeout=self.timeout,
+                max_retries=0,  # Nouvelles tentatives gérées par _with_retries
+                http_client=httpx.Client(**self._http_options())
+            )
+        return self._openrouter_client
+    
+    @property
+    def async_http_client(self) -> httpx.AsyncClient:
+        """Client HTTP asynchrone pour Ollama (vues ASGI), propre à la boucle courante."""
+        clients = self._loop_clients()
+        if clients["http"] is None:
+            clients["http"] = httpx.AsyncClient(**self._http_options())
+        return clients["http"]
+    
+    @property
+    def async_openrouter_client(self) -> Optional[AsyncOpenAI]:
+        """Client OpenAI asynchrone pour OpenRouter (None si non configuré)."""
+        clients = self._loop_clients()
+        if clients["openrouter"] is None and self.openrouter_api_key:
+            clients["openrouter"] = AsyncOpenAI(
+                base_url=self.openrouter_base_url,
+                api_key=self.openrouter_api_key,
+                timeout=self.timeout,
+                max_retries=0,
+                http_client=httpx.AsyncClient(**self._http_options())
+            )
+        return clients["openrouter"]
+    
+    def close(self) -> None:
+        """Ferme les clients synchrones du process courant."""
+        if self._clients_pid != os.getpid():
+            return
+        if self._http_client is not None:
+            self._http_client.close()
+            self._http_client = None
+        if self._openrouter_client is not None:
+            self._openrouter_client.close()
+            self._openrouter_client = None
+    
+    async def aclose(self) -> None:
+        """Ferme les clients asynchrones de la boucle courante."""
+        if self._clients_pid != os.getpid():
+            return
+        clients = self._async_clients.pop(id(asyncio.get_running_loop()), None)
+        if clients is None:
+            return
+        if clients["http"] is not None:
+            await clients["http"].aclose()
+        if clients["openrouter"] is not None:
+            await clients["openrouter"].close()
+    
+    # ========================================
+    # MÉTHODES UTILITAIRES
+    # ========================================
+    
+    def probe_ollama(self) -> Dict[str, Any]:
+        """
+        Sonde gratuite d'Ollama: liste des modèles d'un serveur du pool.
+        
+        Returns:
+            Détails (nombre de modèles, présence du modèle d'embedding)
+        
+        Raises:
+            Exception: Si le serveur ne répond pas
+        """
+        with self.ollama_pool.lease() as endpoint:
+            response = self.http_client.get(f"{endpoint.url}/api/tags", timeout=AI_HEALTH_CHECK_TIMEOUT)
+            response.raise_for_status()
+        
+        model_names = [m.get('name', '') for m in response.json().get('models', [])]
+        # Ollama suffixe les noms par le tag (nomic-embed-text:latest)
+        available = any(name.split(':')[0] == self.ollama_embedding_model.split(':')[0] for name in model_names)
+        
+        return {"models": len(model_names), "embedding_model_available": available}
+    
+    def probe_openrouter(self) -> Optional[Dict[str, Any]]:
+        """
+        Sonde gratuite d'OpenRouter: informations de la clé API (aucun token consommé).
+        
+        Returns:
+            Détails de la clé, ou None si OpenRouter n'est pas configuré
+        
+        Raises:
+            Exception: Si l'API ne répond pas ou refuse la clé
+        """
+        if not self.openrouter_api_key:
+            return None
+        
+        response = self.http_client.get(
+            f"{self.openrouter_base_url.rstrip('/')}/auth/key",
+            headers={"Authorization": f"Bearer {self.openrouter_api_key}"},
+            timeout=AI_HEALTH_CHECK_TIMEOUT
+        )
+        response.raise_for_status()
+        
+        key_info = response.json().get('data') or {}
+        return {"limit_remaining": key_info.get('limit_remaining')}
+    
+    def test_ollama_connection(self) -> bool:
+        """
+        Teste la connexion à un serveur Ollama du pool.
+        
+        Returns:
+            True si la connexion est OK, False sinon
+        """
+        try:
+            details = self.probe_ollama()
+            
+            logger.info(f"✅ Connexion Ollama OK - {details['models']} modèles disponibles")
+            
+            # Vérification que le modèle d'embedding est disponible
+            if not details['embedding_model_available']:
+                logger.warning(f"⚠️ Modèle '{self.ollama_embedding_model}' non trouvé sur le serveur")
+            
+            return True
+        
+        except Exception as e:
+            logger.error(f"❌ Connexion Ollama échouée: {str(e)}")
+            return False
+    
+    def test_openrouter_connection(self) -> bool:
+        """
+        Teste la connexion à l'API OpenRouter (sans complétion facturée).
+        
+        Returns:
+            True si la connexion est OK, False sinon
+        """
+        if not self.openrouter_api_key:
+            logger.error("❌ OpenRouter non configuré")
+            return False
+        
+        try:
+            self.probe_openrouter()
+            
+            logger.info("✅ Connexion OpenRouter OK - Clé API valide")
+            return True
+        
+        except Exception as e:
+            logger.error(f"❌ Connexion OpenRouter échouée: {str(e)}")
+            return False
+    
+    def get_health_status(self) -> Dict[str, Any]:
+        """
+        Retourne le statut de santé des deux providers.
+        
+        Les statuts viennent du cache du HealthMonitor (sondes en arrière-plan,
+        toutes les AI_HEALTH_CHECK_INTERVAL secondes): aucun appel réseau ici.
+        
+        Returns:
+            Dictionnaire avec les statuts et informations
+        """
+        probes = self.health_monitor.snapshot()
+        return {
+            "ollama": {
+                "configured": True,
+                "url": self.ollama_base_url,
+                "model": self.ollama_embedding_model,
+                "embedding_dimensions": self.embedding_dimensions,
+                **probes["ollama"],
+                "endpoints": self.ollama_pool.stats(),
+                "circuit": self.ollama_breaker.stats(),
+                "chat_endpoints": self.ollama_chat_pool.stats(),
+                "chat_circuit": self.ollama_chat_breaker.stats(),
+                "embedding_single_flight": self.embedding_flight.stats()
+            },
+            "openrouter": {
+                "configured": bool(self.openrouter_api_key),
+                "model": self.openrouter_default_model,
+                **probes["openrouter"],
+                "circuit": self.openrouter_breaker.stats()
+            },
+            "chat_routing": {
+                "tiers": [tier.model for tier in self.model_router.tiers],
+                "p95_budget_ms": self.model_router.p95_budget_ms,
+                "latencies": self.model_router.latencies.stats()
+            }
+        }
+
+
+# ========================================
+# SINGLETON GLOBAL (optionnel)
+# ========================================
+
+_ai_router_instance: Optional[AIRouter] = None
+
+def get_ai_router() -> AIRouter:
+    """
+    Retourne l'instance singleton du routeur IA.
+    Utilisé dans les vues Django pour éviter la réinstanciation.
+    """
+    global _ai_router_instance
+    if _ai_router_instance is None:
+        _ai_router_instance = AIRouter()
+        atexit.register(_ai_router_instance.close)
+    return _ai_router_instance
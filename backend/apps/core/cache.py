@@ -0,0 +1,183 @@
+"""
+Cache à deux niveaux pour les résultats coûteux (embeddings, réponses).
+- Niveau 1: LRU en mémoire du process (microsecondes)
+- Niveau 2: Redis partagé entre workers (millisecondes)
+
+Redis est optionnel: en cas d'indisponibilité, seul le niveau 1 est utilisé.
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import threading
+import logging
+import time
+import os
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/2')
+
+# Délai avant de retenter Redis après une erreur (secondes)
+REDIS_RETRY_AFTER = 30
+
+
+_redis_client = None
+_redis_disabled_until = 0.0
+_redis_lock = threading.Lock()
+
+
+def get_redis_client():
+    """
+    Retourne le client Redis partagé du process, ou None si Redis est
+    indisponible (module absent ou erreur récente).
+    """
+    global _redis_client
+    if redis is None or not CACHE_REDIS_URL:
+        return None
+    if time.monotonic() < _redis_disabled_until:
+        return None
+    with _redis_lock:
+        if _redis_client is None:
+            _redis_client = redis.Redis.from_url(
+                CACHE_REDIS_URL,
+                socket_timeout=0.2,
+                socket_connect_timeout=0.2
+            )
+    return _redis_client
+
+
+def mark_redis_unavailable(error: Exception) -> None:
+    """Désactive Redis temporairement après une erreur."""
+    global _redis_disabled_until
+    _redis_disabled_until = time.monotonic() + REDIS_RETRY_AFTER
+    logger.warning(f"⚠️ Redis indisponible pour le cache ({error}), niveau mémoire seul pendant {REDIS_RETRY_AFTER}s")
+
+
+class TwoTierCache:
+    """
+    Cache clé/valeur LRU + Redis avec TTL et compteurs de hits.
+
+    Les valeurs sont stockées telles quelles en mémoire, et sérialisées en
+    bytes (serializer/deserializer) côté Redis.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int = 1024,
+        local_ttl: int = 3600,
+        redis_ttl: int = 86400,
+        serializer: Optional[Callable[[Any], bytes]] = None,
+        deserializer: Optional[Callable[[bytes], Any]] = None
+    ):
+        """
+        Args:
+            namespace: Préfixe des clés Redis (ex: 'rag:qemb')
+            max_entries: Taille maximale du LRU en mémoire
+            local_ttl: Durée de vie en mémoire (secondes)
+            redis_ttl: Durée de vie dans Redis (secondes, 0 = pas de Redis)
+            serializer: Conversion valeur -> bytes pour Redis
+            deserializer: Conversion bytes -> valeur depuis Redis
+        """
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.serializer = serializer
+        self.deserializer = deserializer
+
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _use_redis(self) -> bool:
+        return bool(self.redis_ttl and self.serializer and self.deserializer)
+
+    def _set_local(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.local_ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Retourne la valeur en cache (mémoire puis Redis) ou None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.local_hits += 1
+                    return value
+                del self._entries[key]
+
+        if self._use_redis():
+            client = get_redis_client()
+            if client is not None:
+                try:
+                    raw = client.get(self._redis_key(key))
+                except Exception as e:
+                    mark_redis_unavailable(e)
+                    raw = None
+                if raw is not None:
+                    value = self.deserializer(raw)
+                    self._set_local(key, value)
+                    self.redis_hits += 1
+                    return value
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        """Enregistre une valeur dans les deux niveaux."""
+        self._set_local(key, value)
+
+        if self._use_redis():
+            client = get_redis_client()
+            if client is not None:
+                try:
+                    client.set(self._redis_key(key), self.serializer(value), ex=self.redis_ttl)
+                except Exception as e:
+                    mark_redis_unavailable(e)
+
+    def delete(self, key: str) -> None:
+        """Supprime une clé des deux niveaux."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+        if self._use_redis():
+            client = get_redis_client()
+            if client is not None:
+                try:
+                    client.delete(self._redis_key(key))
+                except Exception as e:
+                    mark_redis_unavailable(e)
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs de hits et taux de succès."""
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "entries": len(self._entries),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.local_hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,289 @@
+"""
+Répartition de charge entre plusieurs serveurs Ollama.
+
+- Choix du serveur ayant le moins de requêtes en cours (tourniquet en cas d'égalité)
+- Mise à l'écart (drain) d'un serveur après des échecs consécutifs
+- Vérification de santé en arrière-plan et réintégration automatique
+- Statistiques de latence par serveur
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+import threading
+import logging
+import time
+import os
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+OLLAMA_HEALTH_CHECK_INTERVAL = float(os.getenv('OLLAMA_HEALTH_CHECK_INTERVAL', 10))  # secondes
+OLLAMA_MAX_CONSECUTIVE_FAILURES = int(os.getenv('OLLAMA_MAX_CONSECUTIVE_FAILURES', 3))
+OLLAMA_HEALTH_CHECK_TIMEOUT = 2.0  # secondes
+
+# Poids de la moyenne mobile exponentielle des latences
+LATENCY_EWMA_ALPHA = 0.2
+
+
+class NoHealthyEndpointError(Exception):
+    """Aucun serveur du pool n'est disponible."""
+    pass
+
+
+@dataclass
+class Endpoint:
+    """Un serveur du pool et ses compteurs."""
+    url: str
+    in_flight: int = 0
+    healthy: bool = True
+    drained: bool = False  # Retiré manuellement (maintenance)
+    consecutive_failures: int = 0
+    requests: int = 0
+    errors: int = 0
+    latency_ewma_ms: Optional[float] = None
+    last_error: Optional[str] = None
+    last_checked_at: Optional[float] = None
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and not self.drained
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "available": self.available,
+            "healthy": self.healthy,
+            "drained": self.drained,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_ewma_ms": round(self.latency_ewma_ms, 1) if self.latency_ewma_ms is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class EndpointPool:
+    """
+    Pool de serveurs interchangeables (même modèle d'embedding).
+
+    Usage:
+        with pool.lease() as endpoint:
+            httpx.post(f"{endpoint.url}/api/embeddings", ...)
+
+    Un échec de connexion ou une erreur 5xx compte comme un échec du
+    serveur; au-delà de OLLAMA_MAX_CONSECUTIVE_FAILURES il est écarté
+    jusqu'à ce que la vérification de santé le déclare à nouveau joignable.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        health_path: str = '/api/tags',
+        health_check_interval: float = OLLAMA_HEALTH_CHECK_INTERVAL,
+        max_consecutive_failures: int = OLLAMA_MAX_CONSECUTIVE_FAILURES
+    ):
+        if not urls:
+            raise ValueError("Le pool doit contenir au moins un serveur")
+
+        self.endpoints: List[Endpoint] = [Endpoint(url=url.rstrip('/')) for url in urls]
+        self.health_path = health_path
+        self.health_check_interval = health_check_interval
+        self.max_consecutive_failures = max_consecutive_failures
+
+        self._lock = threading.Lock()
+        self._cursor = 0  # Tourniquet entre serveurs à égalité
+        self._checker: Optional[threading.Thread] = None
+        self._checker_pid: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    @property
+    def primary_url(self) -> str:
+        return self.endpoints[0].url
+
+    # ----------------------------------------
+    # Sélection
+    # ----------------------------------------
+
+    def acquire(self, exclude: Optional[Set[str]] = None) -> Endpoint:
+        """
+        Réserve le serveur disponible le moins chargé.
+
+        in_flight est compté par process: des workers Celery prefork qui
+        envoient une requête à la fois voient tous 0. Les égalités sont donc
+        départagées en tourniquet plutôt que par latence, sinon tous les
+        process choisiraient le même serveur.
+
+        Args:
+            exclude: URLs à éviter (déjà essayées), ignoré s'il ne reste rien d'autre
+        """
+        self._ensure_health_checker()
+
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.available]
+            if exclude:
+                candidates = [e for e in candidates if e.url not in exclude] or candidates
+            if not candidates:
+                # Tous écartés: on tente quand même le moins récemment en échec
+                # plutôt que de refuser (le pool peut s'être trompé)
+                candidates = [e for e in self.endpoints if not e.drained]
+            if not candidates:
+                raise NoHealthyEndpointError("Aucun serveur Ollama disponible (tous retirés)")
+
+            count = len(self.endpoints)
+            cursor = self._cursor
+            endpoint = min(
+                candidates,
+                key=lambda e: (e.in_flight, (self.endpoints.index(e) - cursor) % count)
+            )
+            self._cursor = (self.endpoints.index(endpoint) + 1) % count
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint, latency_ms: float, error: Optional[Exception] = None) -> None:
+        """Libère un serveur et met à jour ses statistiques."""
+        with self._lock:
+            endpoint.in_flight -= 1
+
+            if error is None:
+                endpoint.consecutive_failures = 0
+                if endpoint.latency_ewma_ms is None:
+                    endpoint.latency_ewma_ms = latency_ms
+                else:
+                    endpoint.latency_ewma_ms += LATENCY_EWMA_ALPHA * (latency_ms - endpoint.latency_ewma_ms)
+                return
+
+            endpoint.errors += 1
+            endpoint.last_error = str(error)[:200]
+
+            if not self._is_endpoint_failure(error):
+                return
+
+            endpoint.consecutive_failures += 1
+            if endpoint.healthy and endpoint.consecutive_failures >= self.max_consecutive_failures:
+                endpoint.healthy = False
+                logger.warning(
+                    f"⚠️ Serveur Ollama {endpoint.url} écarté après "
+                    f"{endpoint.consecutive_failures} échecs: {endpoint.last_error}"
+                )
+
+    @contextmanager
+    def lease(self, exclude: Optional[Set[str]] = None):
+        """Context manager: acquire() puis release() avec la latence mesurée."""
+        endpoint = self.acquire(exclude)
+        start = time.perf_counter()
+        error: Optional[Exception] = None
+        try:
+            yield endpoint
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # Aussi sur annulation (CancelledError, GeneratorExit...): sinon
+            # in_flight ne redescend jamais et le serveur est évité pour toujours
+            self.release(endpoint, (time.perf_counter() - start) * 1000, error=error)
+
+    @staticmethod
+    def _is_endpoint_failure(error: Exception) -> bool:
+        """Erreur imputable au serveur (et non à la requête)."""
+        if isinstance(error, httpx.RequestError):
+            return True
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+        return False
+
+    # ----------------------------------------
+    # Administration
+    # ----------------------------------------
+
+    def drain(self, url: str) -> None:
+        """Retire un serveur: plus de nouvelles requêtes, les requêtes en cours se terminent."""
+        self._set_drained(url, True)
+
+    def undrain(self, url: str) -> None:
+        """Réintègre un serveur retiré manuellement."""
+        self._set_drained(url, False)
+
+    def _set_drained(self, url: str, drained: bool) -> None:
+        url = url.rstrip('/')
+        with self._lock:
+            for endpoint in self.endpoints:
+                if endpoint.url == url:
+                    endpoint.drained = drained
+                    logger.info(f"{'⏸️' if drained else '▶️'} Serveur Ollama {url} {'retiré' if drained else 'réintégré'}")
+                    return
+        raise KeyError(url)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+    # ----------------------------------------
+    # Vérification de santé
+    # ----------------------------------------
+
+    def check_health(self) -> None:
+        """Interroge chaque serveur et met à jour son état."""
+        with httpx.Client(timeout=OLLAMA_HEALTH_CHECK_TIMEOUT) as client:
+            for endpoint in self.endpoints:
+                try:
+                    response = client.get(f"{endpoint.url}{self.health_path}")
+                    response.raise_for_status()
+                    ok, error = True, None
+                except Exception as e:
+                    ok, error = False, str(e)[:200]
+
+                with self._lock:
+                    endpoint.last_checked_at = time.time()
+                    if ok:
+                        if not endpoint.healthy:
+                            logger.info(f"✅ Serveur Ollama {endpoint.url} de nouveau disponible")
+                        endpoint.healthy = True
+                        endpoint.consecutive_failures = 0
+                    else:
+                        if endpoint.healthy:
+                            logger.warning(f"⚠️ Serveur Ollama {endpoint.url} injoignable: {error}")
+                        endpoint.healthy = False
+                        endpoint.last_error = error
+
+    def _ensure_health_checker(self) -> None:
+        """Démarre le thread de vérification (un par process, inutile avec un seul serveur)."""
+        if len(self.endpoints) < 2 or self.health_check_interval <= 0:
+            return
+
+        pid = os.getpid()
+        if self._checker_pid == pid and self._checker is not None and self._checker.is_alive():
+            return
+
+        with self._lock:
+            if self._checker_pid == pid and self._checker is not None and self._checker.is_alive():
+                return
+            self._checker_pid = pid
+            self._checker = threading.Thread(
+                target=self._run_health_checks,
+                name='ollama-health-check',
+                daemon=True
+            )
+            self._checker.start()
+
+    def _run_health_checks(self) -> None:
+        stop = threading.Event()
+        while not stop.wait(self.health_check_interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.error(f"❌ Vérification de santé Ollama échouée: {str(e)}")
+
+
+def parse_endpoint_urls(value: Optional[str]) -> List[str]:
+    """Liste d'URLs séparées par des virgules (entrées vides ignorées)."""
+    return [url.strip() for url in (value or '').split(',') if url.strip()]
@@ -0,0 +1,140 @@
+"""
+Surveillance de santé des fournisseurs IA, en arrière-plan.
+
+Un thread démon sonde Ollama et OpenRouter à intervalle régulier avec des
+appels gratuits (liste des modèles Ollama, informations de la clé
+OpenRouter: aucun token consommé) et garde le dernier résultat en mémoire.
+get_health_status() lit ce cache: une sonde de load balancer ne déclenche
+aucun appel réseau.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, TYPE_CHECKING
+import threading
+import logging
+import time
+import os
+
+if TYPE_CHECKING:
+    from apps.core.ai_router import AIRouter
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+AI_HEALTH_CHECK_INTERVAL = float(os.getenv('AI_HEALTH_CHECK_INTERVAL', 30))  # secondes
+AI_HEALTH_CHECK_TIMEOUT = float(os.getenv('AI_HEALTH_CHECK_TIMEOUT', 5))  # secondes
+# Au-delà de N intervalles sans mesure, le résultat est signalé comme périmé
+AI_HEALTH_STALE_FACTOR = 3
+
+
+@dataclass
+class ProviderHealth:
+    """Dernier résultat de sonde d'un fournisseur."""
+    status: str = 'unknown'  # 'unknown', 'healthy', 'unhealthy', 'not_configured'
+    checked_at: Optional[float] = None  # time.time()
+    latency_ms: Optional[int] = None
+    error: Optional[str] = None
+    details: Dict[str, Any] = field(default_factory=dict)
+
+    def snapshot(self, stale_after: float) -> Dict[str, Any]:
+        age = time.time() - self.checked_at if self.checked_at is not None else None
+        return {
+            "status": self.status,
+            "checked_at": self.checked_at,
+            "age_s": round(age, 1) if age is not None else None,
+            "stale": age is None or age > stale_after,
+            "latency_ms": self.latency_ms,
+            "error": self.error,
+            **self.details,
+        }
+
+
+class HealthMonitor:
+    """
+    Sondes périodiques des fournisseurs, résultats en cache.
+
+    Le thread est démarré au premier snapshot() (un par process: relancé
+    après un fork) et fait une première mesure immédiatement.
+    """
+
+    def __init__(self, ai_router: "AIRouter", interval: float = AI_HEALTH_CHECK_INTERVAL):
+        self.ai_router = ai_router
+        self.interval = interval
+        self.providers: Dict[str, ProviderHealth] = {
+            "ollama": ProviderHealth(),
+            "openrouter": ProviderHealth(),
+        }
+
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+
+    @property
+    def stale_after(self) -> float:
+        return self.interval * AI_HEALTH_STALE_FACTOR
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Derniers résultats connus (aucun appel réseau)."""
+        self._ensure_started()
+        with self._lock:
+            return {name: health.snapshot(self.stale_after) for name, health in self.providers.items()}
+
+    def check_now(self) -> Dict[str, Dict[str, Any]]:
+        """Sonde immédiatement les deux fournisseurs (commande, tests manuels)."""
+        self._probe('ollama', self.ai_router.probe_ollama)
+        self._probe('openrouter', self.ai_router.probe_openrouter)
+        with self._lock:
+            return {name: health.snapshot(self.stale_after) for name, health in self.providers.items()}
+
+    def _probe(self, name: str, probe: Callable[[], Optional[Dict[str, Any]]]) -> None:
+        start = time.perf_counter()
+        try:
+            details = probe()
+            status, error = ('healthy', None) if details is not None else ('not_configured', None)
+        except Exception as e:
+            details, status, error = None, 'unhealthy', str(e)[:200]
+        latency_ms = int((time.perf_counter() - start) * 1000)
+
+        with self._lock:
+            previous = self.providers[name].status
+            self.providers[name] = ProviderHealth(
+                status=status,
+                checked_at=time.time(),
+                latency_ms=latency_ms,
+                error=error,
+                details=details or {}
+            )
+
+        if status == 'unhealthy' and previous != 'unhealthy':
+            logger.warning(f"⚠️ Sonde {name} en échec: {error}")
+        elif status == 'healthy' and previous == 'unhealthy':
+            logger.info(f"✅ Sonde {name} de nouveau OK")
+
+    def _ensure_started(self) -> None:
+        if self.interval <= 0:
+            return
+
+        pid = os.getpid()
+        if self._thread_pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread_pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            self._thread_pid = pid
+            self._thread = threading.Thread(target=self._run, name='ai-health-monitor', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        stop = threading.Event()
+        while True:
+            try:
+                self.check_now()
+            except Exception as e:
+                logger.error(f"❌ Surveillance de santé IA échouée: {str(e)}")
+            if stop.wait(self.interval):
+                return
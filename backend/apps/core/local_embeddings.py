@@ -0,0 +1,138 @@
+"""
+Embeddings calculés dans le process (CPU), sans aller-retour HTTP vers Ollama.
+
+Le modèle (sentence-transformers, runtime PyTorch ou ONNX) est chargé une
+fois par process worker, au premier appel, et encode les textes par lots
+avec le parallélisme intra-opération du runtime.
+
+Dépendances optionnelles (EMBEDDING_BACKEND=local):
+    pip install sentence-transformers          # runtime torch
+    pip install "sentence-transformers[onnx]"  # runtime onnx
+"""
+
+from typing import List, Optional
+import threading
+import logging
+import os
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+from apps.core.vectors import EMBEDDING_DIMENSIONS
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+LOCAL_EMBEDDING_MODEL = os.getenv('LOCAL_EMBEDDING_MODEL', 'nomic-ai/nomic-embed-text-v1.5')
+LOCAL_EMBEDDING_RUNTIME = os.getenv('LOCAL_EMBEDDING_RUNTIME', 'torch')  # 'torch' ou 'onnx'
+LOCAL_EMBEDDING_THREADS = int(os.getenv('LOCAL_EMBEDDING_THREADS', 0))  # 0 = défaut du runtime
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv('LOCAL_EMBEDDING_BATCH_SIZE', 32))
+
+
+
+class LocalEmbeddingError(Exception):
+    """Modèle d'embedding local indisponible ou incompatible."""
+    pass
+
+
+class LocalEmbeddingModel:
+    """Modèle sentence-transformers chargé paresseusement, un par process."""
+
+    def __init__(
+        self,
+        model_name: str = LOCAL_EMBEDDING_MODEL,
+        runtime: str = LOCAL_EMBEDDING_RUNTIME,
+        threads: int = LOCAL_EMBEDDING_THREADS,
+        batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE
+    ):
+        self.model_name = model_name
+        self.runtime = runtime
+        self.threads = threads
+        self.batch_size = batch_size
+
+        self._model = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """Charge le modèle dans le process courant (rechargé après un fork)."""
+        if self._model is not None and self._pid == os.getpid():
+            return self._model
+
+        with self._lock:
+            if self._model is not None and self._pid == os.getpid():
+                return self._model
+
+            if SentenceTransformer is None:
+                raise LocalEmbeddingError(
+                    "EMBEDDING_BACKEND=local nécessite le paquet sentence-transformers"
+                )
+
+            if self.threads > 0 and self.runtime == 'torch':
+                import torch
+                torch.set_num_threads(self.threads)
+
+            kwargs = {"device": "cpu", "trust_remote_code": True}
+            if self.runtime == 'onnx':
+                kwargs["backend"] = "onnx"
+                if self.threads > 0:
+                    import onnxruntime
+                    session_options = onnxruntime.SessionOptions()
+                    session_options.intra_op_num_threads = self.threads
+                    kwargs["model_kwargs"] = {"session_options": session_options}
+
+            try:
+                model = SentenceTransformer(self.model_name, **kwargs)
+            except Exception as e:
+                raise LocalEmbeddingError(f"Chargement du modèle {self.model_name} impossible: {str(e)}")
+
+            dimensions = model.get_sentence_embedding_dimension()
+            # Tronqués ensuite par AIRouter si EMBEDDING_DIMENSIONS est inférieure
+            if dimensions < EMBEDDING_DIMENSIONS:
+                raise LocalEmbeddingError(
+                    f"Le modèle {self.model_name} produit des vecteurs de {dimensions} dimensions "
+                    f"(attendu: au moins {EMBEDDING_DIMENSIONS})"
+                )
+
+            self._model = model
+            self._pid = os.getpid()
+            logger.info(f"✅ Modèle d'embedding local chargé: {self.model_name} ({self.runtime}, CPU)")
+            return model
+
+    def encode(self, texts: List[str], normalize: bool = True):
+        """
+        Encode un lot de textes.
+
+        Returns:
+            Matrice numpy float32 (len(texts), dimension native du modèle)
+        """
+        import numpy as np
+
+        model = self._load()
+        # Un encodage à la fois: le runtime parallélise déjà chaque lot sur les cœurs
+        with self._lock:
+            vectors = model.encode(
+                texts,
+                batch_size=self.batch_size,
+                normalize_embeddings=normalize,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+        return np.asarray(vectors, dtype=np.float32)
+
+
+_local_model_instance: Optional[LocalEmbeddingModel] = None
+
+
+def get_local_embedding_model() -> LocalEmbeddingModel:
+    """Retourne le modèle local du process (chargé au premier encodage)."""
+    global _local_model_instance
+    if _local_model_instance is None:
+        _local_model_instance = LocalEmbeddingModel()
+    return _local_model_instance
@@ -0,0 +1,186 @@
+"""
+Choix du modèle de chat par requête (latence et coût).
+
+Les modèles sont déclarés par paliers, du moins cher au plus capable:
+
+    CHAT_MODEL_TIERS="ollama:llama3.2:3b:1000,deepseek/deepseek-chat:4000,anthropic/claude-3.5-sonnet:0"
+
+Chaque entrée est `modèle:tokens_max_du_prompt` (0 = sans limite); le
+préfixe `ollama:` désigne un modèle de chat local servi par Ollama.
+Le premier palier qui accepte la taille du prompt et dont le p95 de
+latence observé reste dans le budget est retenu.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+import threading
+import time
+import os
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+CHAT_MODEL_TIERS = os.getenv('CHAT_MODEL_TIERS', '')  # Vide = pas de routage (modèle par défaut)
+CHAT_ROUTING_P95_BUDGET_MS = int(os.getenv('CHAT_ROUTING_P95_BUDGET_MS', 15000))
+CHAT_LATENCY_WINDOW = 200  # Dernières latences conservées par modèle
+CHAT_LATENCY_MIN_SAMPLES = 20  # En dessous, le p95 n'est pas jugé fiable
+# Les mesures plus anciennes sont ignorées: un palier écarté pour lenteur
+# finit par être réessayé (sinon il ne recevrait plus jamais de mesures)
+CHAT_LATENCY_MAX_AGE = float(os.getenv('CHAT_LATENCY_MAX_AGE', 300))  # secondes
+
+OLLAMA_MODEL_PREFIX = 'ollama:'
+
+
+@dataclass
+class ModelTier:
+    """Un palier de la liste de routage."""
+    model: str
+    max_prompt_tokens: int  # 0 = sans limite
+
+    @property
+    def is_local(self) -> bool:
+        return self.model.startswith(OLLAMA_MODEL_PREFIX)
+
+    @property
+    def provider_model(self) -> str:
+        """Nom du modèle côté fournisseur (sans le préfixe ollama:)."""
+        return self.model[len(OLLAMA_MODEL_PREFIX):] if self.is_local else self.model
+
+    def accepts(self, prompt_tokens: int) -> bool:
+        return self.max_prompt_tokens <= 0 or prompt_tokens <= self.max_prompt_tokens
+
+
+@dataclass
+class RoutingDecision:
+    """Modèle retenu et raison du choix (journalisée dans QueryLog)."""
+    model: str
+    reason: str
+    is_local: bool = False
+
+    @property
+    def provider_model(self) -> str:
+        return self.model[len(OLLAMA_MODEL_PREFIX):] if self.is_local else self.model
+
+
+def parse_model_tiers(value: str) -> List[ModelTier]:
+    """Analyse CHAT_MODEL_TIERS (`modèle:tokens_max`, séparés par des virgules)."""
+    tiers = []
+    for entry in (value or '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        model, _, limit = entry.rpartition(':')
+        if not model or not limit.isdigit():
+            # Pas de limite indiquée: l'entrée entière est le nom du modèle
+            model, limit = entry, '0'
+        tiers.append(ModelTier(model=model, max_prompt_tokens=int(limit)))
+    return tiers
+
+
+class ModelLatencyTracker:
+    """Fenêtre glissante des latences récentes par modèle (p95 à la demande)."""
+
+    def __init__(self, window: int = CHAT_LATENCY_WINDOW, max_age: float = CHAT_LATENCY_MAX_AGE):
+        self.window = window
+        self.max_age = max_age
+        self._samples: Dict[str, Deque[Tuple[float, int]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, latency_ms: int) -> None:
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append((time.monotonic(), latency_ms))
+
+    def recent(self, model: str) -> List[int]:
+        """Latences des max_age dernières secondes."""
+        horizon = time.monotonic() - self.max_age
+        with self._lock:
+            return [latency for at, latency in self._samples.get(model, ()) if at >= horizon]
+
+    def p95(self, model: str, min_samples: int = CHAT_LATENCY_MIN_SAMPLES) -> Optional[int]:
+        samples = sorted(self.recent(model))
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+    def stats(self) -> Dict[str, Dict[str, Optional[int]]]:
+        with self._lock:
+            models = list(self._samples)
+        return {
+            model: {"samples": len(self.recent(model)), "p95_ms": self.p95(model, min_samples=1)}
+            for model in models
+        }
+
+
+class ModelRouter:
+    """Sélection du modèle par paliers (taille du prompt, p95 observé)."""
+
+    def __init__(
+        self,
+        tiers: List[ModelTier],
+        default_model: str,
+        p95_budget_ms: int = CHAT_ROUTING_P95_BUDGET_MS
+    ):
+        self.tiers = tiers
+        self.default_model = default_model
+        self.p95_budget_ms = p95_budget_ms
+        self.latencies = ModelLatencyTracker()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.tiers)
+
+    def available_tiers(self, allow_local: bool = True) -> List[ModelTier]:
+        """Paliers utilisables (p95 dans le budget), du moins cher au plus capable."""
+        return [
+            tier for tier in self.tiers
+            if (allow_local or not tier.is_local)
+            and (self.latencies.p95(tier.model) or 0) <= self.p95_budget_ms
+        ]
+
+    def tier_decision(self, tier: ModelTier, prompt_tokens: int, note: str = "") -> RoutingDecision:
+        """Décision pour un palier retenu par l'appelant."""
+        reason = f"tier {self.tiers.index(tier) + 1}/{len(self.tiers)}, prompt ~{prompt_tokens} tokens"
+        if note:
+            reason += f" ({note})"
+        return RoutingDecision(tier.model, reason, tier.is_local)
+
+    def choose(
+        self,
+        prompt_tokens: int,
+        requested_model: Optional[str] = None,
+        allow_local: bool = True
+    ) -> RoutingDecision:
+        """
+        Choisit le modèle d'une requête.
+
+        Args:
+            prompt_tokens: Taille estimée du prompt
+            requested_model: Modèle imposé par le client (prioritaire)
+            allow_local: Autoriser les paliers Ollama (non disponibles en streaming)
+        """
+        if requested_model:
+            return RoutingDecision(requested_model, "requested", requested_model.startswith(OLLAMA_MODEL_PREFIX))
+
+        if not self.enabled:
+            return RoutingDecision(self.default_model, "default")
+
+        skipped = []
+        for tier in self.tiers:
+            if tier.is_local and not allow_local:
+                continue
+            if not tier.accepts(prompt_tokens):
+                skipped.append(f"{tier.model}: prompt {prompt_tokens} > {tier.max_prompt_tokens}")
+                continue
+            p95 = self.latencies.p95(tier.model)
+            if p95 is not None and p95 > self.p95_budget_ms:
+                skipped.append(f"{tier.model}: p95 {p95}ms > {self.p95_budget_ms}ms")
+                continue
+
+            return self.tier_decision(tier, prompt_tokens, '; '.join(skipped))
+
+        # Aucun palier ne convient: le dernier palier distant, sinon le modèle par défaut
+        fallback = next((t.model for t in reversed(self.tiers) if not t.is_local), self.default_model)
+        return RoutingDecision(fallback, f"fallback ({'; '.join(skipped)})")
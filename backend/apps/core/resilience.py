@@ -0,0 +1,251 @@
+"""
+Disjoncteurs et politique de nouvelles tentatives pour les fournisseurs IA.
+
+- CircuitBreaker: après N échecs consécutifs d'un fournisseur, les appels
+  échouent immédiatement pendant un délai de récupération, puis un appel
+  d'essai décide de la réouverture.
+- RetryPolicy: nouvelle tentative selon la classe d'erreur
+  (429/5xx/connexion: backoff exponentiel avec jitter; autres 4xx: aucune).
+"""
+
+from typing import Optional
+import threading
+import logging
+import random
+import time
+import os
+
+import httpx
+
+try:
+    import openai
+except ImportError:
+    openai = None
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+AI_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('AI_CIRCUIT_FAILURE_THRESHOLD', 5))
+AI_CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv('AI_CIRCUIT_RECOVERY_TIMEOUT', 30))  # secondes
+AI_RETRY_MAX_ATTEMPTS = int(os.getenv('AI_RETRY_MAX_ATTEMPTS', 3))
+AI_RETRY_BASE_DELAY = float(os.getenv('AI_RETRY_BASE_DELAY', 0.5))  # secondes
+AI_RETRY_MAX_DELAY = float(os.getenv('AI_RETRY_MAX_DELAY', 8))  # secondes
+
+# Statuts HTTP transitoires: on réessaie
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Le disjoncteur du fournisseur est ouvert: appel refusé sans attendre."""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"{name} indisponible (disjoncteur ouvert, nouvel essai dans {retry_after:.0f}s)")
+
+
+# ========================================
+# CLASSIFICATION DES ERREURS
+# ========================================
+
+def error_status_code(error: Exception) -> Optional[int]:
+    """Code HTTP d'une erreur httpx/openai, ou None."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    if openai is not None and isinstance(error, openai.APIStatusError):
+        return error.status_code
+    return None
+
+
+def is_connection_error(error: Exception) -> bool:
+    """Erreur réseau (connexion refusée, timeout...)."""
+    if isinstance(error, httpx.RequestError):
+        return True
+    return openai is not None and isinstance(error, openai.APIConnectionError)
+
+
+def is_provider_failure(error: Exception) -> bool:
+    """
+    Erreur indiquant que le fournisseur est en panne (compte pour le disjoncteur).
+    Un 429 signale une limite de débit, pas une panne; un 4xx est une erreur de la requête.
+    """
+    if is_connection_error(error):
+        return True
+    status = error_status_code(error)
+    return status is not None and status >= 500
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Valeur de l'en-tête Retry-After (secondes) si le fournisseur l'indique."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+# ========================================
+# POLITIQUE DE NOUVELLES TENTATIVES
+# ========================================
+
+class RetryPolicy:
+    """Backoff exponentiel avec jitter complet, selon la classe d'erreur."""
+
+    def __init__(
+        self,
+        max_attempts: int = AI_RETRY_MAX_ATTEMPTS,
+        base_delay: float = AI_RETRY_BASE_DELAY,
+        max_delay: float = AI_RETRY_MAX_DELAY
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, CircuitOpenError):
+            return False
+        status = error_status_code(error)
+        if status is not None:
+            return status in RETRYABLE_STATUS_CODES
+        return is_connection_error(error)
+
+    def next_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Délai avant la tentative suivante, ou None s'il ne faut pas réessayer.
+
+        Args:
+            error: Erreur de la tentative `attempt`
+            attempt: Numéro de la tentative échouée (0 = premier appel)
+        """
+        if attempt + 1 >= self.max_attempts or not self.is_retryable(error):
+            return None
+
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            if retry_after > self.max_delay:
+                return None  # Attente trop longue: on échoue plutôt que bloquer
+            delay = max(delay, retry_after)
+
+        return delay
+
+
+# ========================================
+# DISJONCTEUR
+# ========================================
+
+class CircuitBreaker:
+    """
+    Disjoncteur à trois états.
+
+    - fermé: les appels passent, les échecs consécutifs sont comptés
+    - ouvert: les appels échouent immédiatement (CircuitOpenError)
+    - semi-ouvert: après recovery_timeout, un seul appel d'essai passe;
+      son succès referme le disjoncteur, son échec le rouvre
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = AI_CIRCUIT_FAILURE_THRESHOLD,
+        recovery_timeout: float = AI_CIRCUIT_RECOVERY_TIMEOUT
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._remaining() <= 0:
+                return self.HALF_OPEN
+            return self._state
+
+    def _remaining(self) -> float:
+        return self._opened_at + self.recovery_timeout - time.monotonic()
+
+    def before_call(self) -> None:
+        """Lève CircuitOpenError si l'appel doit être refusé."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+
+            if self._state == self.OPEN:
+                remaining = self._remaining()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self._state = self.HALF_OPEN
+                self._trial_in_progress = False
+
+            # Semi-ouvert: un seul appel d'essai à la fois
+            if self._trial_in_progress:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.recovery_timeout)
+            self._trial_in_progress = True
+
+    def release_trial(self) -> None:
+        """
+        Libère l'appel d'essai sans conclure (annulation, timeout côté
+        appelant): le prochain appel pourra servir d'essai.
+        """
+        with self._lock:
+            self._trial_in_progress = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"✅ Disjoncteur {self.name} refermé")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._trial_in_progress = False
+
+    def record_failure(self, error: Exception) -> None:
+        """Compte un échec (seulement s'il révèle une panne du fournisseur)."""
+        with self._lock:
+            self._trial_in_progress = False
+            if not is_provider_failure(error):
+                if self._state == self.HALF_OPEN:
+                    # Le fournisseur a répondu: il est de nouveau joignable
+                    self._state = self.CLOSED
+                    self._consecutive_failures = 0
+                return
+
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(
+                        f"⚠️ Disjoncteur {self.name} ouvert pour {self.recovery_timeout:.0f}s "
+                        f"après {self._consecutive_failures} échecs: {str(error)[:200]}"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,275 @@
+"""
+Regroupement des appels identiques simultanés (single-flight).
+
+Quand plusieurs requêtes demandent le même résultat en même temps (même
+texte à vectoriser: chunks dupliqués d'un import, question populaire), une
+seule exécute l'appel et les autres attendent puis reçoivent son résultat
+(ou son exception).
+
+- Dans le process: threads (do) et coroutines (ado)
+- Entre process (optionnel): verrou Redis par clé; le process qui le
+  détient publie le résultat, les autres l'attendent au lieu de rappeler
+  le fournisseur. Sans Redis, chaque process appelle de son côté.
+"""
+
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import threading
+import logging
+import time
+import uuid
+import os
+
+from apps.core.cache import get_redis_client, mark_redis_unavailable
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+SINGLE_FLIGHT_REDIS = os.getenv('SINGLE_FLIGHT_REDIS', 'False') == 'True'
+SINGLE_FLIGHT_LOCK_TTL = float(os.getenv('SINGLE_FLIGHT_LOCK_TTL', 30))  # secondes
+SINGLE_FLIGHT_RESULT_TTL = 10  # secondes: le résultat publié ne sert qu'aux appels en attente
+SINGLE_FLIGHT_POLL_INTERVAL = 0.02  # secondes
+
+# Libère le verrou seulement s'il appartient encore à ce process
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Exécute une seule fois les appels identiques en cours.
+
+    Usage:
+        result = flight.do(key, lambda: appel_couteux(texte))
+        result = await flight.ado(key, lambda: appel_couteux_async(texte))
+
+    Args:
+        namespace: Préfixe des clés Redis
+        serializer / deserializer: Conversion du résultat pour Redis
+            (requis pour le mode entre process)
+        use_redis: Coordination entre process via Redis
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        serializer: Optional[Callable[[Any], bytes]] = None,
+        deserializer: Optional[Callable[[bytes], Any]] = None,
+        use_redis: bool = SINGLE_FLIGHT_REDIS,
+        lock_ttl: float = SINGLE_FLIGHT_LOCK_TTL
+    ):
+        self.namespace = namespace
+        self.serializer = serializer
+        self.deserializer = deserializer
+        self.use_redis = use_redis and serializer is not None and deserializer is not None
+        self.lock_ttl = lock_ttl
+
+        self._calls: Dict[str, Future] = {}
+        self._async_calls: Dict[Tuple[int, str], "asyncio.Future"] = {}
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.coalesced = 0
+        self.remote_hits = 0
+
+    # ----------------------------------------
+    # Dans le process
+    # ----------------------------------------
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Exécute fn() ou attend l'appel identique déjà en cours."""
+        with self._lock:
+            self.calls += 1
+            pending = self._calls.get(key)
+            if pending is None:
+                pending = self._calls[key] = Future()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            return pending.result()
+
+        try:
+            result = self._redis_do(key, fn) if self.use_redis else fn()
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        else:
+            pending.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Version asynchrone de do (regroupement par boucle d'évènements)."""
+        loop = asyncio.get_running_loop()
+        call_key = (id(loop), key)
+
+        with self._lock:
+            self.calls += 1
+            pending = self._async_calls.get(call_key)
+            if pending is None:
+                pending = self._async_calls[call_key] = loop.create_future()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            # shield: l'annulation d'un appel en attente n'annule pas les autres
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # Appel de tête annulé (client déconnecté): on recommence
+                return await self.ado(key, fn)
+
+        try:
+            result = await (self._aredis_do(key, fn) if self.use_redis else fn())
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except BaseException as e:
+            pending.set_exception(e)
+            # Évite l'avertissement "exception never retrieved" sans appel en attente
+            pending.exception()
+            raise
+        else:
+            pending.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._async_calls.pop(call_key, None)
+
+    # ----------------------------------------
+    # Entre process (Redis)
+    # ----------------------------------------
+
+    def _lock_key(self, key: str) -> str:
+        return f"{self.namespace}:lock:{key}"
+
+    def _result_key(self, key: str) -> str:
+        return f"{self.namespace}:result:{key}"
+
+    def _try_acquire(self, key: str) -> Tuple[Optional[Any], Optional[str]]:
+        """
+        Tente de prendre le verrou de la clé.
+
+        Returns:
+            (client, jeton) si le verrou est pris, (client, None) si un autre
+            process le détient, (None, None) si Redis est indisponible
+        """
+        client = get_redis_client()
+        if client is None:
+            return None, None
+        token = uuid.uuid4().hex
+        try:
+            acquired = client.set(self._lock_key(key), token, nx=True, px=int(self.lock_ttl * 1000))
+        except Exception as e:
+            mark_redis_unavailable(e)
+            return None, None
+        return client, token if acquired else None
+
+    def _publish(self, client, key: str, token: str, result: Any) -> None:
+        try:
+            client.set(self._result_key(key), self.serializer(result), ex=SINGLE_FLIGHT_RESULT_TTL)
+        except Exception as e:
+            mark_redis_unavailable(e)
+        self._release(client, key, token)
+
+    def _release(self, client, key: str, token: str) -> None:
+        try:
+            client.eval(_RELEASE_LOCK_SCRIPT, 1, self._lock_key(key), token)
+        except Exception as e:
+            mark_redis_unavailable(e)
+
+    def _poll(self, client, key: str) -> Tuple[bool, Optional[Any]]:
+        """
+        Un tour d'attente du résultat publié par un autre process.
+
+        Returns:
+            (terminé, résultat): terminé sans résultat = le détenteur du
+            verrou a échoué ou disparu, il faut appeler soi-même
+        """
+        try:
+            raw = client.get(self._result_key(key))
+            if raw is not None:
+                return True, self.deserializer(raw)
+            return not client.exists(self._lock_key(key)), None
+        except Exception as e:
+            mark_redis_unavailable(e)
+            return True, None
+
+    def _redis_do(self, key: str, fn: Callable[[], Any]) -> Any:
+        client, token = self._try_acquire(key)
+        if client is None:
+            return fn()
+
+        if token is None:
+            deadline = time.monotonic() + self.lock_ttl
+            while time.monotonic() < deadline:
+                done, result = self._poll(client, key)
+                if result is not None:
+                    self.remote_hits += 1
+                    return result
+                if done:
+                    break
+                time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+            return fn()
+
+        try:
+            result = fn()
+        except BaseException:
+            self._release(client, key, token)
+            raise
+        self._publish(client, key, token, result)
+        return result
+
+    async def _aredis_do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # Client Redis synchrone (déjà utilisé par les caches): appels dans un thread
+        client, token = await asyncio.to_thread(self._try_acquire, key)
+        if client is None:
+            return await fn()
+
+        if token is None:
+            deadline = time.monotonic() + self.lock_ttl
+            while time.monotonic() < deadline:
+                done, result = await asyncio.to_thread(self._poll, client, key)
+                if result is not None:
+                    self.remote_hits += 1
+                    return result
+                if done:
+                    break
+                await asyncio.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+            return await fn()
+
+        try:
+            result = await fn()
+        except BaseException:
+            await asyncio.to_thread(self._release, client, key, token)
+            raise
+        await asyncio.to_thread(self._publish, client, key, token, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "namespace": self.namespace,
+            "in_flight": len(self._calls) + len(self._async_calls),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "remote_hits": self.remote_hits,
+            "redis": self.use_redis,
+        }
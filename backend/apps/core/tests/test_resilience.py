@@ -0,0 +1,135 @@
+"""
+Tests du disjoncteur: fermé -> ouvert -> semi-ouvert -> fermé (ou rouvert).
+"""
+
+from unittest import mock
+import asyncio
+import unittest
+
+import httpx
+
+from apps.core.ai_router import AIRouter
+from apps.core.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+def provider_down() -> Exception:
+    return httpx.ConnectError("Connection refused")
+
+
+def bad_request() -> Exception:
+    request = httpx.Request('POST', 'http://ollama:11434/api/embed')
+    return httpx.HTTPStatusError("400", request=request, response=httpx.Response(400, request=request))
+
+
+class CircuitBreakerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('apps.core.resilience.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('ollama', failure_threshold=3, recovery_timeout=30)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.breaker.before_call()
+            self.breaker.record_failure(provider_down())
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            self.breaker.before_call()
+            self.breaker.record_failure(provider_down())
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+        self.breaker.before_call()
+        self.breaker.record_failure(provider_down())
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        with self.assertRaises(CircuitOpenError) as ctx:
+            self.breaker.before_call()
+        self.assertAlmostEqual(ctx.exception.retry_after, 30)
+        self.assertEqual(self.breaker.rejected, 1)
+
+    def test_success_resets_failure_count(self):
+        for _ in range(2):
+            self.breaker.record_failure(provider_down())
+        self.breaker.record_success()
+        for _ in range(2):
+            self.breaker.record_failure(provider_down())
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_request_errors_do_not_count(self):
+        for _ in range(5):
+            self.breaker.record_failure(bad_request())
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_after_recovery_timeout_allows_single_trial(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+        self.breaker.before_call()  # Appel d'essai
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()  # Deuxième appel pendant l'essai
+
+    def test_successful_trial_closes(self):
+        self.open_breaker()
+        self.now += 31
+        self.breaker.before_call()
+        self.breaker.record_success()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.stats()["consecutive_failures"], 0)
+
+    def test_failed_trial_reopens_for_a_full_timeout(self):
+        self.open_breaker()
+        self.now += 31
+        self.breaker.before_call()
+        self.breaker.record_failure(provider_down())
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.now += 29
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.now += 1
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_trial_answered_with_request_error_closes(self):
+        # Le fournisseur a répondu (4xx): il est joignable
+        self.open_breaker()
+        self.now += 31
+        self.breaker.before_call()
+        self.breaker.record_failure(bad_request())
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_cancelled_trial_releases_half_open_slot(self):
+        self.open_breaker()
+        self.now += 31
+
+        router = AIRouter.__new__(AIRouter)  # Seule la politique de retry est utilisée
+        router.retry_policy = RetryPolicy()
+
+        async def cancelled_trial():
+            started = asyncio.Event()
+
+            async def call():
+                started.set()
+                await asyncio.sleep(60)
+
+            task = asyncio.ensure_future(router._awith_retries(self.breaker, call))
+            await started.wait()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancelled_trial())
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.breaker.before_call()  # Nouvel appel d'essai accepté
+
+
+if __name__ == '__main__':
+    unittest.main()
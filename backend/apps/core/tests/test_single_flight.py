@@ -0,0 +1,172 @@
+"""
+Tests du regroupement des appels identiques (threads et coroutines, sans Redis).
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+
+from apps.core.single_flight import SingleFlight
+
+
+class SingleFlightThreadTests(unittest.TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight('test', use_redis=False)
+
+    def run_concurrently(self, fn, count=5):
+        """Lance `count` appels de la même clé pendant que le premier est bloqué."""
+        release = threading.Event()
+        started = threading.Event()
+        results, errors = [], []
+
+        def call():
+            started.set()
+            release.wait(5)
+            return fn()
+
+        def worker():
+            try:
+                results.append(self.flight.do('key', call))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while self.flight.coalesced < count - 1:
+            if time.monotonic() > deadline:
+                release.set()
+                self.fail(f"{self.flight.coalesced}/{count - 1} appels regroupés après 5 s")
+            threading.Event().wait(0.001)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        return results, errors
+
+    def test_concurrent_calls_share_one_execution(self):
+        executions = []
+        results, errors = self.run_concurrently(lambda: executions.append(1) or 'vecteur')
+
+        self.assertEqual(executions, [1])
+        self.assertEqual(results, ['vecteur'] * 5)
+        self.assertEqual(errors, [])
+        self.assertEqual(self.flight.stats()['in_flight'], 0)
+
+    def test_leader_exception_reaches_every_caller(self):
+        def fail():
+            raise RuntimeError("Ollama indisponible")
+
+        results, errors = self.run_concurrently(fail)
+
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 5)
+        self.assertTrue(all(str(e) == "Ollama indisponible" for e in errors))
+
+    def test_next_call_after_failure_runs_again(self):
+        with self.assertRaises(RuntimeError):
+            self.flight.do('key', lambda: (_ for _ in ()).throw(RuntimeError("panne")))
+        self.assertEqual(self.flight.do('key', lambda: 42), 42)
+
+
+class SingleFlightAsyncTests(unittest.TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight('test', use_redis=False)
+
+    def test_concurrent_coroutines_share_one_execution(self):
+        executions = []
+
+        async def call():
+            executions.append(1)
+            await asyncio.sleep(0.01)
+            return 'vecteur'
+
+        async def main():
+            return await asyncio.gather(*(self.flight.ado('key', call) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), ['vecteur'] * 5)
+        self.assertEqual(executions, [1])
+        self.assertEqual(self.flight.coalesced, 4)
+
+    def test_cancelled_leader_lets_follower_retry(self):
+        executions = []
+
+        async def main():
+            started = asyncio.Event()
+            release = asyncio.Event()
+
+            async def call():
+                executions.append(1)
+                started.set()
+                await release.wait()
+                return len(executions)
+
+            leader = asyncio.create_task(self.flight.ado('key', call))
+            await started.wait()
+            follower = asyncio.create_task(self.flight.ado('key', call))
+            await asyncio.sleep(0)
+
+            leader.cancel()  # Client déconnecté
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+
+            release.set()
+            return await follower
+
+        # Le suivant n'hérite pas de l'annulation: il refait l'appel
+        self.assertEqual(asyncio.run(main()), 2)
+        self.assertEqual(self.flight.stats()['in_flight'], 0)
+
+    def test_cancelled_follower_does_not_cancel_leader(self):
+        async def main():
+            release = asyncio.Event()
+
+            async def call():
+                await release.wait()
+                return 'vecteur'
+
+            leader = asyncio.create_task(self.flight.ado('key', call))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(self.flight.ado('key', call))
+            await asyncio.sleep(0)
+
+            follower.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await follower
+
+            release.set()
+            return await leader
+
+        self.assertEqual(asyncio.run(main()), 'vecteur')
+
+    def test_leader_exception_reaches_followers(self):
+        async def call():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("Ollama indisponible")
+
+        async def main():
+            return await asyncio.gather(
+                *(self.flight.ado('key', call) for _ in range(3)),
+                return_exceptions=True
+            )
+
+        errors = asyncio.run(main())
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(all(isinstance(e, RuntimeError) for e in errors))
+
+    def test_calls_are_not_shared_across_event_loops(self):
+        async def call():
+            return 'vecteur'
+
+        self.assertEqual(asyncio.run(self.flight.ado('key', call)), 'vecteur')
+        self.assertEqual(asyncio.run(self.flight.ado('key', call)), 'vecteur')
+        self.assertEqual(self.flight.coalesced, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
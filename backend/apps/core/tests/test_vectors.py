@@ -0,0 +1,202 @@
+"""
+Tests des encodages de vecteurs (texte et binaire pgvector, COPY BINARY).
+"""
+
+from datetime import datetime, timedelta, timezone
+import json
+import struct
+import unittest
+
+import numpy as np
+
+from apps.core.vectors import (
+    COPY_SIGNATURE,
+    BinaryCopyWriter,
+    copy_rows,
+    truncate_embeddings,
+    vector_binary,
+    vector_literal,
+)
+
+try:
+    from pgvector.utils import from_db, from_db_binary
+except ImportError:
+    from_db = from_db_binary = None
+
+
+def read_copy_rows(stream: bytes):
+    """Décode un flux COPY BINARY en lignes de valeurs brutes (None pour NULL)."""
+    assert stream.startswith(COPY_SIGNATURE)
+    offset = len(COPY_SIGNATURE)
+    flags, extension = struct.unpack_from('>ii', stream, offset)
+    assert (flags, extension) == (0, 0)
+    offset += 8
+
+    rows = []
+    while True:
+        (fields,) = struct.unpack_from('>h', stream, offset)
+        offset += 2
+        if fields == -1:
+            break
+        row = []
+        for _ in range(fields):
+            (length,) = struct.unpack_from('>i', stream, offset)
+            offset += 4
+            if length == -1:
+                row.append(None)
+                continue
+            row.append(stream[offset:offset + length])
+            offset += length
+        rows.append(row)
+
+    assert offset == len(stream), "données après la fin de flux"
+    return rows
+
+
+def sample_vector(dimensions: int = 768, seed: int = 0) -> np.ndarray:
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class VectorLiteralTests(unittest.TestCase):
+
+    def test_literal_round_trips_float32_exactly(self):
+        vector = sample_vector()
+        literal = vector_literal(vector)
+
+        self.assertTrue(literal.startswith('[') and literal.endswith(']'))
+        parsed = np.array(literal[1:-1].split(','), dtype=np.float32)
+        np.testing.assert_array_equal(parsed, vector)
+
+    def test_literal_handles_extreme_values(self):
+        vector = np.array([0.0, -0.0, 1e-38, -3.4e38, 1.0], dtype=np.float32)
+        parsed = np.array(vector_literal(vector)[1:-1].split(','), dtype=np.float32)
+        np.testing.assert_array_equal(parsed, vector)
+
+    def test_literal_accepts_python_lists(self):
+        self.assertEqual(vector_literal([0.5, 1, -2.25]), '[0.5,1,-2.25]')
+
+    @unittest.skipIf(from_db is None, "pgvector non installé")
+    def test_literal_parsed_by_pgvector(self):
+        vector = sample_vector(seed=1)
+        np.testing.assert_array_equal(from_db(vector_literal(vector)), vector)
+
+
+class VectorBinaryTests(unittest.TestCase):
+
+    def test_header_and_big_endian_values(self):
+        vector = sample_vector(256)
+        data = vector_binary(vector)
+
+        self.assertEqual(len(data), 4 + 256 * 4)
+        self.assertEqual(struct.unpack_from('>HH', data), (256, 0))
+        decoded = np.frombuffer(data, dtype='>f4', offset=4)
+        np.testing.assert_array_equal(decoded.astype(np.float32), vector)
+
+    def test_float64_input_is_converted(self):
+        data = vector_binary([1.0, 2.5, -0.125])
+        self.assertEqual(data[4:], struct.pack('>fff', 1.0, 2.5, -0.125))
+
+    @unittest.skipIf(from_db_binary is None, "pgvector non installé")
+    def test_binary_parsed_by_pgvector(self):
+        vector = sample_vector(seed=2)
+        np.testing.assert_array_equal(from_db_binary(vector_binary(vector)), vector)
+
+
+class TruncateEmbeddingsTests(unittest.TestCase):
+
+    def test_matrix_rows_are_truncated_and_normalized(self):
+        matrix = np.stack([sample_vector(seed=seed) for seed in range(3)])
+        truncated = truncate_embeddings(matrix, 128)
+
+        self.assertEqual(truncated.shape, (3, 128))
+        self.assertEqual(truncated.dtype, np.float32)
+        np.testing.assert_allclose(np.linalg.norm(truncated, axis=1), 1.0, rtol=1e-6)
+        np.testing.assert_allclose(truncated[0] * np.linalg.norm(matrix[0, :128]), matrix[0, :128], rtol=1e-5)
+
+    def test_same_dimension_is_returned_unchanged(self):
+        vector = sample_vector(64)
+        self.assertIs(truncate_embeddings(vector, 64), vector)
+
+    def test_more_dimensions_than_available_raises(self):
+        with self.assertRaises(ValueError):
+            truncate_embeddings(sample_vector(64), 128)
+
+
+class BinaryCopyWriterTests(unittest.TestCase):
+
+    def test_encodes_every_column_type(self):
+        created_at = datetime(2024, 3, 1, 12, 30, 15, 250, tzinfo=timezone.utc)
+        vector = sample_vector(8)
+        writer = BinaryCopyWriter(['int4', 'int8', 'text', 'jsonb', 'bytea', 'timestamptz', 'vector'])
+        writer.add_row([7, 2 ** 40, "Chunk é", {"page": 3, "titre": "Résumé"}, b'\x00\x01', created_at, vector])
+
+        [row] = read_copy_rows(writer.finish().getvalue())
+
+        self.assertEqual(struct.unpack('>i', row[0])[0], 7)
+        self.assertEqual(struct.unpack('>q', row[1])[0], 2 ** 40)
+        self.assertEqual(row[2].decode('utf-8'), "Chunk é")
+        self.assertEqual(row[3][:1], b'\x01')  # Version du format jsonb
+        self.assertEqual(json.loads(row[3][1:].decode('utf-8')), {"page": 3, "titre": "Résumé"})
+        self.assertEqual(row[4], b'\x00\x01')
+        self.assertEqual(row[6], vector_binary(vector))
+
+        microseconds = struct.unpack('>q', row[5])[0]
+        epoch = datetime(2000, 1, 1, tzinfo=timezone.utc)
+        self.assertEqual(epoch + timedelta(microseconds=microseconds), created_at)
+
+    def test_timestamp_before_postgres_epoch_is_negative(self):
+        writer = BinaryCopyWriter(['timestamptz'])
+        writer.add_row([datetime(1999, 12, 31, 23, 59, 59, tzinfo=timezone.utc)])
+
+        [row] = read_copy_rows(writer.finish().getvalue())
+        self.assertEqual(struct.unpack('>q', row[0])[0], -1_000_000)
+
+    def test_null_values_and_row_count(self):
+        writer = BinaryCopyWriter(['int8', 'vector'])
+        writer.add_row([1, None])
+        writer.add_row([None, [0.5, 0.5]])
+
+        rows = read_copy_rows(writer.finish().getvalue())
+        self.assertEqual(writer.rows, 2)
+        self.assertIsNone(rows[0][1])
+        self.assertIsNone(rows[1][0])
+
+    def test_wrong_number_of_values_raises(self):
+        writer = BinaryCopyWriter(['int8', 'text'])
+        with self.assertRaises(ValueError):
+            writer.add_row([1])
+
+    def test_unknown_column_type_raises(self):
+        writer = BinaryCopyWriter(['uuid'])
+        with self.assertRaises(ValueError):
+            writer.add_row(['0000'])
+
+
+class FakeCursor:
+    def __init__(self):
+        self.statements = []
+
+    def copy_expert(self, sql, stream):
+        self.statements.append((sql, stream.read()))
+
+
+class CopyRowsTests(unittest.TestCase):
+
+    def test_copy_statement_and_stream(self):
+        cursor = FakeCursor()
+        written = copy_rows(cursor, 'document_chunk', ['id', 'content'], ['int8', 'text'], [(1, "a"), (2, "b")])
+
+        self.assertEqual(written, 2)
+        [(sql, stream)] = cursor.statements
+        self.assertEqual(sql, "COPY document_chunk (id, content) FROM STDIN WITH (FORMAT BINARY)")
+        self.assertEqual(len(read_copy_rows(stream)), 2)
+
+    def test_no_rows_skips_copy(self):
+        cursor = FakeCursor()
+        self.assertEqual(copy_rows(cursor, 't', ['a'], ['int8'], []), 0)
+        self.assertEqual(cursor.statements, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+"""
+Comptage local des tokens, par profil de tokenizer du modèle.
+
+- Comptage exact via tiktoken pour les modèles dont l'encodage est public
+  (optionnel: pip install tiktoken)
+- Sinon estimation rapide mot par mot: un mot court = 1 token, un mot long
+  est découpé en sous-mots, un nombre par groupes de 3 chiffres, chaque
+  ponctuation compte pour 1. Plus fidèle qu'un simple ratio caractères/token
+  sur du texte mêlant chiffres et ponctuation, et légèrement majorée pour
+  rester du bon côté des limites.
+
+Chaque profil indique aussi la fenêtre de contexte du modèle, ce qui permet
+de refuser ou de réduire une requête avant l'appel réseau.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import threading
+import logging
+import math
+import os
+import re
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+# Fenêtre de contexte des modèles de chat Ollama (options.num_ctx)
+OLLAMA_CHAT_NUM_CTX = int(os.getenv('OLLAMA_CHAT_NUM_CTX', 4096))
+
+# Tokens ajoutés par le format de chat (rôle, séparateurs) par message, et amorce de la réponse
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+# Majoration de l'estimation heuristique (pas de majoration en comptage exact)
+HEURISTIC_SAFETY_MARGIN = 1.1
+# Mots courants: un seul token jusqu'à cette longueur
+SINGLE_TOKEN_WORD_LENGTH = 6
+
+_PIECE_RE = re.compile(r"\d+|[^\W\d_]+|[^\w\s]", re.UNICODE)
+
+
+@dataclass(frozen=True)
+class TokenizerProfile:
+    """Caractéristiques de tokenisation d'une famille de modèles."""
+    name: str
+    context_window: int
+    chars_per_subword: float  # Longueur moyenne des sous-mots d'un mot long (estimation)
+    encoding: Optional[str] = None  # Encodage tiktoken, si public
+
+
+# Profils par préfixe de modèle (le premier préfixe correspondant l'emporte)
+TOKENIZER_PROFILES: Dict[str, TokenizerProfile] = {
+    'openai/': TokenizerProfile('openai', 128000, 4.0, encoding='o200k_base'),
+    'anthropic/': TokenizerProfile('anthropic', 200000, 3.2),
+    'deepseek/': TokenizerProfile('deepseek', 64000, 3.3),
+    'meta-llama/': TokenizerProfile('llama', 128000, 3.6),
+    'google/': TokenizerProfile('gemini', 1000000, 3.8),
+    'ollama:': TokenizerProfile('ollama', OLLAMA_CHAT_NUM_CTX, 3.5),
+}
+DEFAULT_TOKENIZER_PROFILE = TokenizerProfile('default', 32000, 3.5)
+
+
+def tokenizer_profile(model: Optional[str]) -> TokenizerProfile:
+    """Profil de tokenisation d'un modèle (défaut si inconnu)."""
+    if model:
+        for prefix, profile in TOKENIZER_PROFILES.items():
+            if model.startswith(prefix):
+                return profile
+    return DEFAULT_TOKENIZER_PROFILE
+
+
+class TokenCounter:
+    """Compte et tronque du texte selon un profil (exact si tiktoken est disponible)."""
+
+    def __init__(self, profile: TokenizerProfile):
+        self.profile = profile
+        self._encoding = None
+        self._encoding_failed = False
+        self._lock = threading.Lock()
+
+    @property
+    def exact(self) -> bool:
+        return self._get_encoding() is not None
+
+    def _get_encoding(self):
+        if self._encoding is not None or self._encoding_failed:
+            return self._encoding
+        if tiktoken is None or not self.profile.encoding:
+            self._encoding_failed = True
+            return None
+
+        with self._lock:
+            if self._encoding is None and not self._encoding_failed:
+                try:
+                    self._encoding = tiktoken.get_encoding(self.profile.encoding)
+                except Exception as e:
+                    # Fichier d'encodage non téléchargeable (environnement hors ligne)
+                    logger.warning(f"⚠️ Encodage {self.profile.encoding} indisponible, estimation heuristique: {str(e)}")
+                    self._encoding_failed = True
+        return self._encoding
+
+    def _piece_cost(self, piece: str) -> int:
+        if piece[0].isdigit():
+            return math.ceil(len(piece) / 3)  # Nombres découpés par groupes de chiffres
+        if len(piece) <= SINGLE_TOKEN_WORD_LENGTH or not piece[0].isalnum():
+            return 1
+        return 1 + math.ceil((len(piece) - SINGLE_TOKEN_WORD_LENGTH) / self.profile.chars_per_subword)
+
+    def count(self, text: str) -> int:
+        """Nombre de tokens d'un texte."""
+        if not text:
+            return 0
+        encoding = self._get_encoding()
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        estimate = sum(self._piece_cost(piece) for piece in _PIECE_RE.findall(text))
+        return math.ceil(estimate * HEURISTIC_SAFETY_MARGIN)
+
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        """Tokens d'une liste de messages de chat (format inclus)."""
+        return REPLY_PRIMING_TOKENS + sum(
+            MESSAGE_OVERHEAD_TOKENS + self.count(message.get("content") or "")
+            for message in messages
+        )
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Plus long préfixe de `text` tenant dans `max_tokens`."""
+        if max_tokens <= 0:
+            return ""
+        encoding = self._get_encoding()
+        if encoding is not None:
+            tokens = encoding.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+        budget = max_tokens / HEURISTIC_SAFETY_MARGIN
+        used = 0
+        for match in _PIECE_RE.finditer(text):
+            used += self._piece_cost(match.group())
+            if used > budget:
+                return text[:match.start()].rstrip()
+        return text
+
+
+_counters: Dict[str, TokenCounter] = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(model: Optional[str]) -> TokenCounter:
+    """Compteur (partagé) du profil de tokenisation d'un modèle."""
+    profile = tokenizer_profile(model)
+    counter = _counters.get(profile.name)
+    if counter is None:
+        with _counters_lock:
+            counter = _counters.setdefault(profile.name, TokenCounter(profile))
+    return counter
@@ -0,0 +1,190 @@
+"""
+Vecteurs d'embedding en float32 contigus, du fournisseur jusqu'à PostgreSQL.
+
+- as_float32 / l2_normalize: un seul tableau float32 par vecteur, normalisé
+  sur place (pas de float64 intermédiaire ni de liste de floats Python)
+- truncate_embeddings: dimension réduite (modèles Matryoshka comme
+  nomic-embed-text v1.5), premières composantes puis renormalisation
+- vector_literal: texte pgvector compact pour les paramètres de requête
+  (psycopg2 n'envoie que des paramètres texte)
+- BinaryCopyWriter: COPY ... FROM STDIN (FORMAT BINARY), où les vecteurs
+  sont transmis dans le format binaire natif de pgvector
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Iterable, List, Sequence
+import io
+import json
+import struct
+
+import numpy as np
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+# Dimension des embeddings stockés (DocumentChunk.embedding). En dessous de la
+# dimension native du modèle (768 pour nomic-embed-text), les vecteurs sont
+# tronqués puis renormalisés.
+# Fixée dans le code (pas de variable d'environnement): le schéma doit être le
+# même partout. La changer = modifier cette valeur et ajouter une migration
+# documents sur le modèle de 0008_reduce_embedding_dimensions.
+EMBEDDING_DIMENSIONS = 768
+
+
+# ========================================
+# TABLEAUX FLOAT32
+# ========================================
+
+def as_float32(values: Any) -> np.ndarray:
+    """Vecteur float32 contigu (sans copie s'il l'est déjà)."""
+    return np.ascontiguousarray(values, dtype=np.float32)
+
+
+def l2_normalize(vector: np.ndarray) -> np.ndarray:
+    """Normalise un vecteur float32 sur place (norme L2 = 1) et le retourne."""
+    norm = float(np.linalg.norm(vector))
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def truncate_embeddings(vectors: Any, dimensions: int, normalize: bool = True) -> np.ndarray:
+    """
+    Garde les `dimensions` premières composantes d'un vecteur ou de chaque
+    ligne d'une matrice, puis renormalise (norme L2 = 1) si demandé.
+
+    Ne vaut que pour les modèles entraînés en Matryoshka: ailleurs, les
+    premières composantes ne résument pas le vecteur.
+
+    Raises:
+        ValueError: Si les vecteurs ont moins de `dimensions` composantes
+    """
+    vectors = as_float32(vectors)
+    if vectors.shape[-1] < dimensions:
+        raise ValueError(f"Vecteurs de {vectors.shape[-1]} dimensions, {dimensions} attendues")
+    if vectors.shape[-1] == dimensions:
+        return vectors
+
+    truncated = np.array(vectors[..., :dimensions], dtype=np.float32)  # Copie contiguë
+    if normalize:
+        norms = np.linalg.norm(truncated, axis=-1, keepdims=True)
+        np.divide(truncated, norms, out=truncated, where=norms > 0)
+    return truncated
+
+
+def vector_literal(vector: Any) -> str:
+    """
+    Représentation texte pgvector ('[0.1,0.2,...]').
+
+    Chaque composante est écrite sur 9 chiffres significatifs (suffisant
+    pour restituer exactement un float32) au lieu des 17 d'un float64:
+    un seul formatage pour tout le vecteur et ~35 % de texte en moins à
+    analyser côté serveur.
+    """
+    values = as_float32(vector).tolist()
+    return '[' + ('%.9g,' * len(values) % tuple(values))[:-1] + ']'
+
+
+def vector_binary(vector: Any) -> bytes:
+    """Format binaire de pgvector (vector_recv): dim (int16), réservé (int16), float32 big-endian."""
+    data = np.asarray(vector, dtype='>f4')
+    return struct.pack('>HH', data.shape[0], 0) + data.tobytes()
+
+
+# ========================================
+# COPY BINAIRE POSTGRESQL
+# ========================================
+
+COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+POSTGRES_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+class BinaryCopyWriter:
+    """
+    Encode des lignes au format COPY BINARY de PostgreSQL.
+
+    Usage:
+        writer = BinaryCopyWriter(['int8', 'text', 'vector'])
+        writer.add_row([42, "texte", embedding])
+        cursor.copy_expert("COPY t (a, b, c) FROM STDIN WITH (FORMAT BINARY)", writer.finish())
+
+    Les types doivent correspondre exactement à ceux des colonnes (pas de
+    conversion implicite en binaire: int8 pour un bigint, int4 pour un integer).
+    """
+
+    def __init__(self, column_types: Sequence[str]):
+        self.column_types = list(column_types)
+        self.rows = 0
+        self._buffer = io.BytesIO()
+        self._buffer.write(COPY_SIGNATURE)
+        self._buffer.write(struct.pack('>ii', 0, 0))  # flags, longueur de l'extension d'en-tête
+
+    def add_row(self, values: Iterable[Any]) -> None:
+        values = list(values)
+        if len(values) != len(self.column_types):
+            raise ValueError(f"{len(values)} valeurs pour {len(self.column_types)} colonnes")
+
+        write = self._buffer.write
+        write(struct.pack('>h', len(values)))
+        for column_type, value in zip(self.column_types, values):
+            if value is None:
+                write(struct.pack('>i', -1))
+                continue
+            data = self._encode(column_type, value)
+            write(struct.pack('>i', len(data)))
+            write(data)
+        self.rows += 1
+
+    def finish(self) -> io.BytesIO:
+        """Ajoute la fin de flux et retourne le buffer, prêt à être lu."""
+        self._buffer.write(struct.pack('>h', -1))
+        self._buffer.seek(0)
+        return self._buffer
+
+    @staticmethod
+    def _encode(column_type: str, value: Any) -> bytes:
+        if column_type == 'int4':
+            return struct.pack('>i', value)
+        if column_type == 'int8':
+            return struct.pack('>q', value)
+        if column_type == 'text':
+            return value.encode('utf-8')
+        if column_type == 'jsonb':
+            return b'\x01' + json.dumps(value, ensure_ascii=False).encode('utf-8')
+        if column_type == 'bytea':
+            return bytes(value)
+        if column_type == 'timestamptz':
+            delta = value - POSTGRES_EPOCH
+            microseconds = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+            return struct.pack('>q', microseconds)
+        if column_type == 'vector':
+            return vector_binary(value)
+        raise ValueError(f"Type de colonne non géré: {column_type}")
+
+
+def copy_rows(
+    cursor,
+    table: str,
+    columns: List[str],
+    column_types: Sequence[str],
+    rows: Iterable[Sequence[Any]]
+) -> int:
+    """
+    Insère des lignes via COPY BINARY (curseur psycopg2).
+
+    Returns:
+        Nombre de lignes écrites
+    """
+    writer = BinaryCopyWriter(column_types)
+    for row in rows:
+        writer.add_row(row)
+    if not writer.rows:
+        return 0
+
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT BINARY)",
+        writer.finish()
+    )
+    return writer.rows
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class DocumentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.documents'
+
+    def ready(self):
+        from apps.documents import checks  # noqa: F401 (enregistre les checks système)
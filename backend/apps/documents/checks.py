@@ -0,0 +1,43 @@
+"""
+Checks système de l'app documents.
+"""
+
+from django.core.checks import Tags, Warning, register
+from django.db import DatabaseError, connections
+
+
+@register(Tags.database)
+def check_embedding_dimensions(app_configs, databases=None, **kwargs):
+    """
+    Compare la dimension de la colonne embedding à EMBEDDING_DIMENSIONS.
+
+    Check "database": exécuté par migrate et check --database default.
+    """
+    from apps.core.vectors import EMBEDDING_DIMENSIONS
+    from apps.documents.models import DocumentChunk
+    from apps.documents.services.embedding_dimensions import column_dimensions
+
+    errors = []
+    for alias in databases or []:
+        try:
+            with connections[alias].cursor() as cursor:
+                current = column_dimensions(cursor, DocumentChunk._meta.db_table, 'embedding')
+        except DatabaseError:
+            continue  # Table pas encore créée ou base injoignable
+
+        if current is None or current == EMBEDDING_DIMENSIONS:
+            continue
+
+        if current > EMBEDDING_DIMENSIONS:
+            hint = "Appliquer les migrations documents (python manage.py migrate documents)"
+        else:
+            hint = "Ré-indexer les documents (les vecteurs ne peuvent pas être allongés)"
+
+        errors.append(Warning(
+            f"La colonne {DocumentChunk._meta.db_table}.embedding ({alias}) est en {current} dimensions, "
+            f"EMBEDDING_DIMENSIONS={EMBEDDING_DIMENSIONS}",
+            hint=hint,
+            obj=DocumentChunk,
+            id='documents.W001',
+        ))
+    return errors
@@ -0,0 +1,65 @@
+"""
+Réduction de la dimension des embeddings stockés, sans ré-indexation.
+
+Usage:
+    python manage.py reduce_embedding_dimensions
+    python manage.py reduce_embedding_dimensions --dimensions 512 --batch-size 5000
+
+La dimension du schéma est fixée dans apps/core/vectors.py
+(EMBEDDING_DIMENSIONS) et appliquée par une migration documents (voir
+0008_reduce_embedding_dimensions), qui fait la même conversion. Cette
+commande permet de la lancer à part, avec suivi de la progression et taille
+de lot réglable, sur une grosse table: migrate n'a ensuite plus rien à
+convertir. La recherche est dégradée pendant la conversion (écritures
+bloquées lors de l'échange, index HNSW absent jusqu'à sa recréation): voir
+apps/documents/services/embedding_dimensions.py.
+
+Mesurer d'abord le rappel attendu: python manage.py benchmark_embedding_dimensions
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.vectors import EMBEDDING_DIMENSIONS
+from apps.documents.services.embedding_dimensions import DEFAULT_BATCH_SIZE, reduce_embedding_dimensions
+
+
+class Command(BaseCommand):
+    help = "Tronque et renormalise les embeddings des chunks (modèles Matryoshka), puis recrée l'index HNSW"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dimensions', type=int, default=EMBEDDING_DIMENSIONS,
+            help=f"Nouvelle dimension (défaut: EMBEDDING_DIMENSIONS={EMBEDDING_DIMENSIONS})"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f"Chunks par transaction (défaut: {DEFAULT_BATCH_SIZE})"
+        )
+
+    def handle(self, *args, **options):
+        dimensions = options['dimensions']
+        if dimensions <= 0:
+            raise CommandError("La dimension doit être positive")
+
+        def progress(done, total):
+            self.stdout.write(f"   {done}/{total} chunks")
+
+        try:
+            converted = reduce_embedding_dimensions(
+                dimensions,
+                batch_size=options['batch_size'],
+                progress=progress
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if not converted:
+            self.stdout.write(f"Embeddings déjà en {dimensions} dimensions")
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {converted} chunks réduits à {dimensions} dimensions"))
+        if dimensions != EMBEDDING_DIMENSIONS:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ EMBEDDING_DIMENSIONS vaut {EMBEDDING_DIMENSIONS} (apps/core/vectors.py): "
+                f"le modifier et ajouter la migration documents correspondante"
+            ))
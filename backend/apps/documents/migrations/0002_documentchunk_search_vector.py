@@ -0,0 +1,24 @@
+# Recherche hybride: colonne plein texte générée + index GIN
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('content', config='french'), output_field=django.contrib.postgres.search.SearchVectorField(), verbose_name='Vecteur de recherche plein texte'),
+        ),
+        migrations.AddIndex(
+            model_name='documentchunk',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='document_ch_search_gin_idx'),
+        ),
+    ]
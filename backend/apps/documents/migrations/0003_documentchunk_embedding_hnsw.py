@@ -0,0 +1,18 @@
+# Index ANN (HNSW) sur les embeddings des chunks
+
+import pgvector.django
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_documentchunk_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='documentchunk',
+            index=pgvector.django.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='document_ch_embedding_hnsw_idx', opclasses=['vector_l2_ops']),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Embeddings par phrase pour la compression du contexte
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_documentchunk_embedding_hnsw'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='sentence_embeddings',
+            field=models.BinaryField(blank=True, editable=False, null=True, verbose_name='Embeddings des phrases'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Détail de la latence par étape et tokens prompt/réponse des QueryLog
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_documentchunk_sentence_embeddings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='querylog',
+            name='prompt_tokens',
+            field=models.IntegerField(default=0, verbose_name='Tokens du prompt'),
+        ),
+        migrations.AddField(
+            model_name='querylog',
+            name='completion_tokens',
+            field=models.IntegerField(default=0, verbose_name='Tokens de la réponse'),
+        ),
+        migrations.AddField(
+            model_name='querylog',
+            name='embedding_time_ms',
+            field=models.IntegerField(blank=True, null=True, verbose_name='Embedding de la question (ms)'),
+        ),
+        migrations.AddField(
+            model_name='querylog',
+            name='retrieval_time_ms',
+            field=models.IntegerField(blank=True, null=True, verbose_name='Recherche des chunks (ms)'),
+        ),
+        migrations.AddField(
+            model_name='querylog',
+            name='context_time_ms',
+            field=models.IntegerField(blank=True, null=True, verbose_name='Construction du contexte (ms)'),
+        ),
+        migrations.AddField(
+            model_name='querylog',
+            name='generation_time_ms',
+            field=models.IntegerField(blank=True, null=True, verbose_name='Génération LLM (ms)'),
+        ),
+    ]
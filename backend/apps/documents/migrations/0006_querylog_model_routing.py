@@ -0,0 +1,23 @@
+# Modèle de chat retenu et raison du routage des QueryLog
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_querylog_stage_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='querylog',
+            name='model_used',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Modèle utilisé'),
+        ),
+        migrations.AddField(
+            model_name='querylog',
+            name='routing_reason',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Raison du choix du modèle'),
+        ),
+    ]
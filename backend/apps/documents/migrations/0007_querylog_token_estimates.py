@@ -0,0 +1,23 @@
+# Estimations locales des tokens (prompt et réponse) des QueryLog
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_querylog_model_routing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='querylog',
+            name='estimated_prompt_tokens',
+            field=models.IntegerField(default=0, verbose_name='Tokens du prompt (estimation locale)'),
+        ),
+        migrations.AddField(
+            model_name='querylog',
+            name='estimated_completion_tokens',
+            field=models.IntegerField(default=0, verbose_name='Tokens de la réponse (estimation locale)'),
+        ),
+    ]
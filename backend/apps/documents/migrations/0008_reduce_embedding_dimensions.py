@@ -0,0 +1,33 @@
+# Dimension de DocumentChunk.embedding alignée sur EMBEDDING_DIMENSIONS
+#
+# Sans effet sur une base déjà en 768 dimensions. Pour réduire la dimension:
+# modifier EMBEDDING_DIMENSIONS (apps/core/vectors.py) puis ajouter une
+# migration sur ce modèle, avec DIMENSIONS à la nouvelle valeur et, dans un
+# SeparateDatabaseAndState, un AlterField (state_operations) du champ
+# embedding et ce RunPython (database_operations).
+#
+# Non atomique: la conversion se fait par lots (une transaction chacun) et
+# l'index HNSW est recréé en dehors de toute transaction.
+
+from django.db import migrations
+
+DIMENSIONS = 768  # Valeur figée: ne pas importer EMBEDDING_DIMENSIONS ici
+
+
+def reduce_dimensions(apps, schema_editor):
+    from apps.documents.services.embedding_dimensions import reduce_embedding_dimensions
+
+    reduce_embedding_dimensions(DIMENSIONS, schema_editor=schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('documents', '0007_querylog_token_estimates'),
+    ]
+
+    operations = [
+        migrations.RunPython(reduce_dimensions, migrations.RunPython.noop),
+    ]
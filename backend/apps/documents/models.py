@@ -3,11 +3,79 @@ Modèles Django pour la gestion des documents et des chunks vectorisés.
 Utilise pgvector pour le stockage et la recherche vectorielle.
 """
 
-from django.db import models
+from django.db import models, connection, transaction
 from django.contrib.auth.models import User
-from pgvector.django import VectorField
-from typing import List, Dict, Any
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from pgvector.django import VectorField, HnswIndex
+from apps.core.vectors import EMBEDDING_DIMENSIONS, as_float32, copy_rows, truncate_embeddings, vector_literal
+from typing import List, Any, Optional
+from dataclasses import dataclass
 import hashlib
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Configuration de recherche plein texte (utilisée par la colonne générée)
+FULLTEXT_SEARCH_CONFIG = 'french'
+
+# Constante k de la Reciprocal Rank Fusion (valeur usuelle: 60)
+RRF_K = 60
+
+# Sous ce nombre de chunks candidats, un calcul exact (sans index HNSW) est
+# plus rapide et garantit un rappel de 100%
+EXACT_SCAN_MAX_CANDIDATES = int(os.getenv('RAG_EXACT_SCAN_MAX_CANDIDATES', 10000))
+
+# Paramètres HNSW appliqués aux recherches ANN (SET LOCAL)
+HNSW_EF_SEARCH = int(os.getenv('RAG_HNSW_EF_SEARCH', 100))
+# Scan itératif (pgvector >= 0.8): 'relaxed_order', 'strict_order' ou '' (désactivé).
+# Ignoré si l'extension installée est plus ancienne (paramètre inconnu).
+HNSW_ITERATIVE_SCAN = os.getenv('RAG_HNSW_ITERATIVE_SCAN', '')
+HNSW_ITERATIVE_SCAN_MIN_VERSION = (0, 8)
+
+_pgvector_version: Optional[tuple] = None
+
+# Dimension de la colonne embedding, relue au plus toutes les N secondes
+# (suit une réduction de dimension faite pendant que le process tourne)
+EMBEDDING_COLUMN_CHECK_INTERVAL = 30
+_embedding_column: Optional[tuple] = None  # (dimension, instant de lecture)
+
+
+@dataclass(slots=True)
+class RetrievedChunk:
+    """
+    Résultat de recherche léger (projection SQL, sans instance ORM).
+    Ne contient pas le vecteur d'embedding.
+    """
+    chunk_id: int
+    document_id: int
+    document_title: str
+    content: str
+    page_number: Optional[int]
+    chunk_index: int
+    distance: float
+    similarity_score: float
+    rrf_score: Optional[float] = None
+    
+    @classmethod
+    def from_row(cls, row, rrf_score: Optional[float] = None) -> "RetrievedChunk":
+        """Construit un résultat depuis une ligne (voir RESULT_COLUMNS)."""
+        chunk_id, document_id, document_title, content, page_number, chunk_index, distance = row
+        distance = float(distance)
+        return cls(
+            chunk_id=chunk_id,
+            document_id=document_id,
+            document_title=document_title,
+            content=content,
+            page_number=page_number,
+            chunk_index=chunk_index,
+            distance=distance,
+            similarity_score=1.0 / (1.0 + distance),
+            rrf_score=rrf_score
+        )
 
 
 class SourceDocument(models.Model):
@@ -141,6 +209,40 @@ class SourceDocument(models.Model):
         
         return sha256_hash.hexdigest()
     
+    @classmethod
+    def document_set_version(
+        cls,
+        user: User,
+        document_ids: Optional[List[int]] = None
+    ) -> str:
+        """
+        Version de l'ensemble des documents interrogeables d'un utilisateur.
+        
+        Dérivée des couples (id, processed_at) des documents COMPLETED: elle
+        change dès qu'un document termine son traitement, est retraité ou
+        supprimé, sans état à invalider.
+        
+        Args:
+            user: Propriétaire des documents
+            document_ids: Périmètre optionnel (sinon tous les documents)
+        
+        Returns:
+            Empreinte hexadécimale courte de l'ensemble
+        """
+        documents = cls.objects.filter(
+            user=user,
+            processing_status=cls.ProcessingStatus.COMPLETED
+        )
+        if document_ids:
+            documents = documents.filter(id__in=document_ids)
+        
+        rows = documents.order_by('id').values_list('id', 'processed_at')
+        
+        digest = hashlib.sha256()
+        for doc_id, processed_at in rows:
+            digest.update(f"{doc_id}:{processed_at.isoformat() if processed_at else ''};".encode())
+        return digest.hexdigest()[:16]
+    
     def mark_as_processing(self) -> None:
         """Marque le document comme étant en cours de traitement."""
         self.processing_status = self.ProcessingStatus.PROCESSING
@@ -190,12 +292,13 @@ class DocumentChunk(models.Model):
         verbose_name="Longueur du contenu (caractères)"
     )
     
-    # Embedding vectoriel (dimension 768 pour nomic-embed-text)
+    # Embedding vectoriel (EMBEDDING_DIMENSIONS, 768 par défaut pour nomic-embed-text)
     # NOTE: Ajustez la dimension selon votre modèle
-    # - nomic-embed-text: 768
+    # - nomic-embed-text: 768 (Matryoshka: 512, 256, 128 possibles)
     # - text-embedding-ada-002: 1536
+    # Réduction d'une base existante: python manage.py reduce_embedding_dimensions
     embedding = VectorField(
-        dimensions=768,
+        dimensions=EMBEDDING_DIMENSIONS,
         verbose_name="Vecteur d'embedding"
     )
     
@@ -219,21 +322,59 @@ class DocumentChunk(models.Model):
         help_text="Section, paragraphe, etc."
     )
     
+    # Embeddings des phrases du chunk (matrice float32 n_phrases x dimensions)
+    # Positions des phrases dans metadata['sentence_spans']
+    sentence_embeddings = models.BinaryField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Embeddings des phrases"
+    )
+    
+    # Index plein texte (colonne générée par PostgreSQL, jamais écrite par Django)
+    search_vector = models.GeneratedField(
+        expression=SearchVector('content', config=FULLTEXT_SEARCH_CONFIG),
+        output_field=SearchVectorField(),
+        db_persist=True,
+        verbose_name="Vecteur de recherche plein texte"
+    )
+    
     # Timestamps
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name="Date de création"
     )
     
+    class SearchMode(models.TextChoices):
+        VECTOR = 'vector', 'Vectorielle'
+        HYBRID = 'hybrid', 'Hybride (plein texte + vectorielle)'
+    
+    class SearchStrategy(models.TextChoices):
+        EXACT = 'exact', 'Calcul exact sur le sous-ensemble filtré'
+        ANN = 'ann', 'Index HNSW avec scan itératif'
+    
+    # Colonnes projetées pour construire un RetrievedChunk
+    RESULT_COLUMNS = (
+        'id', 'source_document_id', 'document_title', 'content',
+        'page_number', 'chunk_index', 'distance'
+    )
+    
     class Meta:
         db_table = 'document_chunks'
         ordering = ['source_document', 'chunk_index']
         indexes = [
             models.Index(fields=['source_document', 'chunk_index']),
             models.Index(fields=['page_number']),
+            GinIndex(fields=['search_vector'], name='document_ch_search_gin_idx'),
+            # Index vectoriel ANN pour les recherches de similarité (pgvector)
+            HnswIndex(
+                fields=['embedding'],
+                name='document_ch_embedding_hnsw_idx',
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_l2_ops'],
+            ),
         ]
-        # Index vectoriel pour les recherches de similarité (géré par pgvector)
-        # Créé automatiquement par la migration Django + pgvector
         verbose_name = "Chunk de document"
         verbose_name_plural = "Chunks de documents"
     
@@ -248,8 +389,11 @@ class DocumentChunk(models.Model):
         user: User,
         top_k: int = 5,
         similarity_threshold: float = 0.7,
-        source_document_ids: List[int] = None
-    ) -> List[Dict[str, Any]]:
+        source_document_ids: List[int] = None,
+        mode: str = SearchMode.VECTOR,
+        query_text: Optional[str] = None,
+        strategy: Optional[str] = None
+    ) -> List[RetrievedChunk]:
         """
         Recherche les chunks les plus similaires à un embedding de requête.
         
@@ -259,11 +403,28 @@ class DocumentChunk(models.Model):
             top_k: Nombre de résultats à retourner
             similarity_threshold: Seuil de similarité minimale (0-1)
             source_document_ids: Liste optionnelle d'IDs de documents à filtrer
+            mode: 'vector' (pgvector seul) ou 'hybrid' (plein texte + vecteur, fusion RRF)
+            query_text: Texte de la question (requis pour le mode hybride)
+            strategy: 'exact' ou 'ann' (défaut: choisi via choose_search_strategy)
         
         Returns:
-            Liste de dictionnaires avec chunk, distance et score
+            Liste de RetrievedChunk triée par pertinence
         """
-        from django.db.models import F
+        if strategy is None:
+            strategy = cls.choose_search_strategy(user, source_document_ids)
+        
+        if mode == cls.SearchMode.HYBRID and query_text:
+            return cls._search_hybrid(
+                query_embedding=query_embedding,
+                query_text=query_text,
+                user=user,
+                top_k=top_k,
+                similarity_threshold=similarity_threshold,
+                source_document_ids=source_document_ids,
+                strategy=strategy
+            )
+        
+        from django.db.models import F, Value
         from pgvector.django import L2Distance
         
         # Construction de la requête de base
@@ -278,29 +439,397 @@ class DocumentChunk(models.Model):
         
         # Recherche vectorielle avec distance L2
         # Plus la distance est petite, plus c'est similaire
-        results = queryset.annotate(
-            distance=L2Distance('embedding', query_embedding)
-        ).order_by('distance')[:top_k]
+        # Projection: une seule requête jointe, sans la colonne embedding
+        # En mode exact, trier sur "distance + 0" empêche le planificateur
+        # d'utiliser l'index HNSW: il filtre via les index B-tree puis calcule
+        # toutes les distances du sous-ensemble
+        queryset = queryset.annotate(
+            distance=L2Distance('embedding', Value(vector_literal(cls._fit_to_column(query_embedding)))),
+            document_title=F('source_document__title')
+        )
+        if strategy == cls.SearchStrategy.EXACT:
+            queryset = queryset.order_by(F('distance') + Value(0.0))
+        else:
+            queryset = queryset.order_by('distance')
+        
+        with transaction.atomic():
+            cls._apply_strategy_settings(strategy)
+            rows = list(queryset.values_list(*cls.RESULT_COLUMNS)[:top_k])
         
         # Conversion de la distance L2 en score de similarité (0-1)
-        # Score = 1 / (1 + distance)
-        output = []
-        for chunk in results:
-            similarity_score = 1.0 / (1.0 + chunk.distance)
+        # Score = 1 / (1 + distance), puis filtrage par seuil
+        results = [RetrievedChunk.from_row(row) for row in rows]
+        return [r for r in results if r.similarity_score >= similarity_threshold]
+    
+    @classmethod
+    def estimate_candidates(
+        cls,
+        user: User,
+        source_document_ids: Optional[List[int]] = None
+    ) -> int:
+        """
+        Estime le nombre de chunks candidats à partir des total_chunks des
+        documents dans le périmètre (requête d'agrégat sur source_documents).
+        """
+        documents = SourceDocument.objects.filter(
+            user=user,
+            processing_status=SourceDocument.ProcessingStatus.COMPLETED
+        )
+        if source_document_ids:
+            documents = documents.filter(id__in=source_document_ids)
+        
+        return documents.aggregate(total=models.Sum('total_chunks'))['total'] or 0
+    
+    @classmethod
+    def choose_search_strategy(
+        cls,
+        user: User,
+        source_document_ids: Optional[List[int]] = None,
+        estimated_candidates: Optional[int] = None
+    ) -> str:
+        """
+        Choisit entre calcul exact et recherche ANN selon la sélectivité du filtre.
+        
+        Un filtre très sélectif (un petit document) donne peu de lignes via
+        l'index HNSW post-filtré; un calcul exact sur le sous-ensemble est
+        alors plus rapide et complet. Les filtres larges passent par l'index.
+        """
+        if estimated_candidates is None:
+            estimated_candidates = cls.estimate_candidates(user, source_document_ids)
+        
+        if estimated_candidates <= EXACT_SCAN_MAX_CANDIDATES:
+            strategy = cls.SearchStrategy.EXACT
+        else:
+            strategy = cls.SearchStrategy.ANN
+        
+        logger.debug(f"🧭 Stratégie de recherche: {strategy} ({estimated_candidates} chunks candidats)")
+        return strategy
+    
+    @classmethod
+    def _apply_strategy_settings(cls, strategy: str) -> None:
+        """Réglages HNSW locaux à la transaction courante (stratégie ANN)."""
+        if strategy != cls.SearchStrategy.ANN:
+            return
+        
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL hnsw.ef_search = %s", [HNSW_EF_SEARCH])
+            if HNSW_ITERATIVE_SCAN and cls._pgvector_version(cursor) >= HNSW_ITERATIVE_SCAN_MIN_VERSION:
+                cursor.execute("SET LOCAL hnsw.iterative_scan = %s", [HNSW_ITERATIVE_SCAN])
+    
+    @staticmethod
+    def _pgvector_version(cursor) -> tuple:
+        """Version de l'extension vector installée (lue une fois par process)."""
+        global _pgvector_version
+        if _pgvector_version is None:
+            cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            row = cursor.fetchone()
+            try:
+                _pgvector_version = tuple(int(part) for part in row[0].split('.')[:2]) if row else (0, 0)
+            except ValueError:
+                _pgvector_version = (0, 0)
+            if HNSW_ITERATIVE_SCAN and _pgvector_version < HNSW_ITERATIVE_SCAN_MIN_VERSION:
+                logger.warning(
+                    f"⚠️ RAG_HNSW_ITERATIVE_SCAN ignoré: pgvector {row[0] if row else '?'} "
+                    f"(>= {'.'.join(map(str, HNSW_ITERATIVE_SCAN_MIN_VERSION))} requis)"
+                )
+        return _pgvector_version
+    
+    @staticmethod
+    def _embedding_column_dimensions() -> Optional[int]:
+        """Dimension actuelle de la colonne embedding (cache process, voir EMBEDDING_COLUMN_CHECK_INTERVAL)."""
+        global _embedding_column
+        now = time.monotonic()
+        if _embedding_column is None or now - _embedding_column[1] > EMBEDDING_COLUMN_CHECK_INTERVAL:
+            from apps.documents.services.embedding_dimensions import column_dimensions
             
-            # Filtrage par seuil
-            if similarity_score >= similarity_threshold:
-                output.append({
-                    'chunk': chunk,
-                    'distance': float(chunk.distance),
-                    'similarity_score': similarity_score,
-                    'source_document': chunk.source_document,
-                    'page_number': chunk.page_number,
-                    'content': chunk.content
-                })
+            with connection.cursor() as cursor:
+                dimensions = column_dimensions(cursor, DocumentChunk._meta.db_table, 'embedding')
+            _embedding_column = (dimensions, now)
+        return _embedding_column[0]
+    
+    @classmethod
+    def _fit_to_column(cls, vector: Any, dimensions: Optional[int] = None) -> Any:
+        """
+        Tronque un vecteur plus long que la colonne embedding.
+        
+        Pendant une réduction de dimension, la colonne change avant le
+        redémarrage des process: sans cela, leurs recherches et insertions
+        échoueraient (dimensions différentes) jusqu'au redéploiement.
+        """
+        if dimensions is None:
+            dimensions = cls._embedding_column_dimensions()
+        vector = as_float32(vector)
+        if dimensions is not None and 0 < dimensions < vector.shape[-1]:
+            return truncate_embeddings(vector, dimensions)
+        return vector
+    
+    @classmethod
+    def _distance_order_sql(cls, distance_sql: str, strategy: str) -> str:
+        """Expression ORDER BY de distance (voir search_similar pour le mode exact)."""
+        if strategy == cls.SearchStrategy.EXACT:
+            return f"({distance_sql}) + 0"
+        return distance_sql
+    
+    @staticmethod
+    def _scope_sql(
+        user: User,
+        source_document_ids: Optional[List[int]] = None
+    ) -> tuple:
+        """
+        Clause WHERE (alias c = chunk, d = document) limitant la recherche
+        aux documents traités de l'utilisateur.
+        
+        Returns:
+            Tuple (fragment SQL, paramètres)
+        """
+        document_filter = ""
+        filter_params: List[Any] = []
+        if source_document_ids:
+            document_filter = "AND c.source_document_id = ANY(%s)"
+            filter_params = [list(source_document_ids)]
+        
+        where = f"""
+            d.user_id = %s
+            AND d.processing_status = %s
+            {document_filter}
+        """
+        params = [user.pk, SourceDocument.ProcessingStatus.COMPLETED, *filter_params]
+        return where, params
+    
+    @classmethod
+    def search_similar_batch(
+        cls,
+        query_embeddings: List[List[float]],
+        user: User,
+        top_k: int = 5,
+        similarity_threshold: float = 0.7,
+        source_document_ids: List[int] = None,
+        strategy: Optional[str] = None
+    ) -> List[List[RetrievedChunk]]:
+        """
+        Recherche vectorielle pour N questions en un seul aller-retour SQL.
+        
+        Les vecteurs sont passés dans une liste VALUES et chacun est résolu
+        par une jointure LATERAL (top-k indépendant par question, filtres
+        partagés). Un seul plan, un seul jeu de résultats.
+        
+        Args:
+            query_embeddings: Vecteurs des questions
+            user: Utilisateur pour filtrer les documents
+            top_k: Nombre de résultats par question
+            similarity_threshold: Seuil de similarité minimale (0-1)
+            source_document_ids: Liste optionnelle d'IDs de documents à filtrer
+            strategy: 'exact' ou 'ann' (défaut: choisi via choose_search_strategy)
+        
+        Returns:
+            Une liste de RetrievedChunk par question, dans l'ordre d'entrée
+        """
+        if not query_embeddings:
+            return []
+        
+        if strategy is None:
+            strategy = cls.choose_search_strategy(user, source_document_ids)
+        
+        base_where, base_params = cls._scope_sql(user, source_document_ids)
+        
+        values_sql = ", ".join(["(%s, %s::vector)"] * len(query_embeddings))
+        values_params: List[Any] = []
+        for idx, embedding in enumerate(query_embeddings):
+            values_params.extend([idx, vector_literal(cls._fit_to_column(embedding))])
+        
+        sql = f"""
+            SELECT q.idx, c.id, c.source_document_id, d.title, c.content,
+                   c.page_number, c.chunk_index, hit.distance
+            FROM (VALUES {values_sql}) AS q(idx, embedding)
+            CROSS JOIN LATERAL (
+                SELECT c.id, c.embedding <-> q.embedding AS distance
+                FROM document_chunks c
+                JOIN source_documents d ON d.id = c.source_document_id
+                WHERE {base_where}
+                ORDER BY {cls._distance_order_sql('c.embedding <-> q.embedding', strategy)}
+                LIMIT %s
+            ) hit
+            JOIN document_chunks c ON c.id = hit.id
+            JOIN source_documents d ON d.id = c.source_document_id
+            ORDER BY q.idx, hit.distance
+        """
+        params = [*values_params, *base_params, top_k]
+        
+        with transaction.atomic():
+            cls._apply_strategy_settings(strategy)
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+        
+        output: List[List[RetrievedChunk]] = [[] for _ in query_embeddings]
+        for idx, *row in rows:
+            result = RetrievedChunk.from_row(row)
+            if result.similarity_score >= similarity_threshold:
+                output[idx].append(result)
         
         return output
     
+    @classmethod
+    def _search_hybrid(
+        cls,
+        query_embedding: List[float],
+        query_text: str,
+        user: User,
+        top_k: int,
+        similarity_threshold: float,
+        source_document_ids: Optional[List[int]] = None,
+        strategy: str = SearchStrategy.ANN
+    ) -> List[RetrievedChunk]:
+        """
+        Recherche hybride: classement plein texte (ts_rank_cd, proche de BM25)
+        et classement vectoriel (L2) fusionnés par Reciprocal Rank Fusion,
+        le tout en une seule requête SQL.
+        
+        Les chunks trouvés uniquement par le plein texte (références, noms
+        propres...) sont conservés même si leur similarité vectorielle est
+        sous le seuil.
+        
+        Returns:
+            Liste de RetrievedChunk (avec rrf_score renseigné)
+        """
+        # Chaque classement sur-échantillonne pour laisser la fusion opérer
+        candidates = top_k * 4
+        
+        base_where, base_params = cls._scope_sql(user, source_document_ids)
+        
+        vector = vector_literal(cls._fit_to_column(query_embedding))
+        
+        # La requête plein texte est construite en OU logique pour qu'un seul
+        # terme rare (ex: numéro de pièce) suffise à remonter un chunk
+        sql = f"""
+            WITH q AS (
+                SELECT NULLIF(
+                    replace(plainto_tsquery(%s, %s)::text, '&', '|'), ''
+                )::tsquery AS query
+            ),
+            vec AS (
+                SELECT id, row_number() OVER (ORDER BY distance) AS rnk
+                FROM (
+                    SELECT c.id, c.embedding <-> %s::vector AS distance
+                    FROM document_chunks c
+                    JOIN source_documents d ON d.id = c.source_document_id
+                    WHERE {base_where}
+                    ORDER BY {cls._distance_order_sql('c.embedding <-> %s::vector', strategy)}
+                    LIMIT %s
+                ) v
+            ),
+            lex AS (
+                SELECT id, row_number() OVER (ORDER BY lex_rank DESC) AS rnk
+                FROM (
+                    SELECT c.id, ts_rank_cd(c.search_vector, q.query) AS lex_rank
+                    FROM document_chunks c
+                    JOIN source_documents d ON d.id = c.source_document_id
+                    CROSS JOIN q
+                    WHERE {base_where}
+                    AND c.search_vector @@ q.query
+                    ORDER BY lex_rank DESC
+                    LIMIT %s
+                ) l
+            ),
+            fused AS (
+                SELECT
+                    COALESCE(vec.id, lex.id) AS id,
+                    COALESCE(1.0 / (%s + vec.rnk), 0)
+                        + COALESCE(1.0 / (%s + lex.rnk), 0) AS rrf_score,
+                    lex.id IS NOT NULL AS lexical_match
+                FROM vec
+                FULL OUTER JOIN lex ON vec.id = lex.id
+            )
+            SELECT c.id, c.source_document_id, d.title, c.content,
+                   c.page_number, c.chunk_index,
+                   c.embedding <-> %s::vector AS distance,
+                   fused.rrf_score, fused.lexical_match
+            FROM fused
+            JOIN document_chunks c ON c.id = fused.id
+            JOIN source_documents d ON d.id = c.source_document_id
+            ORDER BY fused.rrf_score DESC
+            LIMIT %s
+        """
+        params = [
+            FULLTEXT_SEARCH_CONFIG, query_text,
+            vector, *base_params, vector, candidates,
+            *base_params, candidates,
+            RRF_K, RRF_K,
+            vector, top_k,
+        ]
+        
+        with transaction.atomic():
+            cls._apply_strategy_settings(strategy)
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+        
+        output = []
+        for *row, rrf_score, lexical_match in rows:
+            result = RetrievedChunk.from_row(row, rrf_score=float(rrf_score))
+            if result.similarity_score >= similarity_threshold or lexical_match:
+                output.append(result)
+        
+        return output
+    
+    # Colonnes écrites par copy_insert, avec leur type binaire PostgreSQL
+    COPY_COLUMNS = (
+        ('source_document_id', 'int8'),
+        ('content', 'text'),
+        ('content_length', 'int4'),
+        ('embedding', 'vector'),
+        ('chunk_index', 'int4'),
+        ('page_number', 'int4'),
+        ('metadata', 'jsonb'),
+        ('sentence_embeddings', 'bytea'),
+        ('created_at', 'timestamptz'),
+    )
+    
+    @classmethod
+    def copy_insert(cls, document: "SourceDocument", chunks: List[dict]) -> int:
+        """
+        Insère des chunks en un seul COPY BINARY.
+        
+        Les embeddings (float32) partent dans le format binaire de pgvector,
+        sans passer par une liste de floats Python ni par leur forme texte.
+        Comme bulk_create, n'appelle ni save() ni les signaux.
+        
+        Args:
+            document: Document source
+            chunks: Dicts avec content, embedding, chunk_index et
+                optionnellement page_number, metadata, sentence_embeddings
+        
+        Returns:
+            Nombre de chunks insérés
+        """
+        from django.utils import timezone
+        
+        created_at = timezone.now()
+        dimensions = cls._embedding_column_dimensions()
+        rows = (
+            (
+                document.pk,
+                chunk['content'],
+                len(chunk['content']),
+                cls._fit_to_column(chunk['embedding'], dimensions),
+                chunk['chunk_index'],
+                chunk.get('page_number'),
+                chunk.get('metadata') or {},
+                chunk.get('sentence_embeddings'),
+                created_at,
+            )
+            for chunk in chunks
+        )
+        
+        with connection.cursor() as cursor:
+            return copy_rows(
+                cursor,
+                cls._meta.db_table,
+                [column for column, _ in cls.COPY_COLUMNS],
+                [column_type for _, column_type in cls.COPY_COLUMNS],
+                rows
+            )
+    
     def save(self, *args, **kwargs):
         """Override pour calculer automatiquement la longueur du contenu."""
         self.content_length = len(self.content)
@@ -354,6 +883,65 @@ class QueryLog(models.Model):
         verbose_name="Tokens consommés (LLM)"
     )
     
+    prompt_tokens = models.IntegerField(
+        default=0,
+        verbose_name="Tokens du prompt"
+    )
+    
+    completion_tokens = models.IntegerField(
+        default=0,
+        verbose_name="Tokens de la réponse"
+    )
+    
+    # Comptage local avant l'appel (comparé aux tokens facturés ci-dessus)
+    estimated_prompt_tokens = models.IntegerField(
+        default=0,
+        verbose_name="Tokens du prompt (estimation locale)"
+    )
+    
+    estimated_completion_tokens = models.IntegerField(
+        default=0,
+        verbose_name="Tokens de la réponse (estimation locale)"
+    )
+    
+    # Modèle de chat retenu et raison du choix (routage par paliers)
+    model_used = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name="Modèle utilisé"
+    )
+    
+    routing_reason = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name="Raison du choix du modèle"
+    )
+    
+    # Détail de la latence par étape (null = étape non exécutée)
+    embedding_time_ms = models.IntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Embedding de la question (ms)"
+    )
+    
+    retrieval_time_ms = models.IntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Recherche des chunks (ms)"
+    )
+    
+    context_time_ms = models.IntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Construction du contexte (ms)"
+    )
+    
+    generation_time_ms = models.IntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Génération LLM (ms)"
+    )
+    
     # Feedback utilisateur
     user_rating = models.IntegerField(
         null=True,
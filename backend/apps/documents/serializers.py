@@ -356,6 +356,12 @@ class QueryLogSerializer(serializers.ModelSerializer):
             'retrieved_chunks_count',
             'response_time_ms',
             'tokens_used',
+            'prompt_tokens',
+            'completion_tokens',
+            'estimated_prompt_tokens',
+            'estimated_completion_tokens',
+            'model_used',
+            'routing_reason',
             'user_rating',
             'created_at',
         ]
@@ -0,0 +1,182 @@
+"""
+Réduction de la dimension des embeddings déjà stockés (modèles Matryoshka).
+
+Les vecteurs réduits sont recalculés depuis les vecteurs existants (premières
+composantes puis renormalisation), sans ré-interroger le modèle:
+
+1. Colonne fantôme embedding_reduced vector(d), remplie par lots (chaque lot
+   dans sa propre transaction: la table reste lisible et inscriptible)
+2. Rattrapage des chunks insérés pendant le remplissage, puis échange des
+   colonnes dans une transaction courte (table verrouillée en écriture)
+3. Recréation de l'index HNSW (CONCURRENTLY hors migration)
+
+Les embeddings de phrases (sentence_embeddings) sont tronqués dans les
+mêmes lots. Augmenter la dimension est impossible: il faut ré-indexer.
+
+Fenêtre de dégradation (pas d'interruption franche, mais pas transparent):
+- Étape 2: écritures bloquées le temps du rattrapage (lectures possibles)
+- Après l'échange, les process démarrés avec l'ancienne dimension tronquent
+  leurs vecteurs à celle de la colonne (DocumentChunk._fit_to_column), mais
+  ne la relisent que toutes les EMBEDDING_COLUMN_CHECK_INTERVAL secondes:
+  jusque-là, recherches et insertions échouent (dimensions différentes)
+- Jusqu'à la fin de l'étape 3, pas d'index HNSW: les recherches ANN
+  deviennent des parcours complets (lents sur une grosse table)
+
+Nécessite pgvector >= 0.7 (subvector, l2_normalize).
+"""
+
+from typing import Callable, List, Optional
+import logging
+
+import numpy as np
+from django.db import connection, transaction
+
+from apps.core.vectors import truncate_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+SHADOW_COLUMN = 'embedding_reduced'
+HNSW_INDEX_NAME = 'document_ch_embedding_hnsw_idx'
+DEFAULT_BATCH_SIZE = 2000
+
+
+def column_dimensions(cursor, table: str, column: str) -> Optional[int]:
+    """Dimension d'une colonne vector (None si la colonne n'existe pas)."""
+    cursor.execute(
+        """
+        SELECT atttypmod FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attname = %s AND NOT attisdropped
+        """,
+        [table, column]
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _truncate_sentence_matrix(raw, source_dimensions: int, dimensions: int) -> bytes:
+    matrix = np.frombuffer(bytes(raw), dtype=np.float32).reshape(-1, source_dimensions)
+    return truncate_embeddings(matrix, dimensions).tobytes()
+
+
+def _backfill_batch(cursor, table: str, ids: List[int], source_dimensions: int, dimensions: int) -> None:
+    """Remplit la colonne fantôme (et tronque les phrases) pour une liste de chunks."""
+    cursor.execute(
+        f"""
+        UPDATE {table}
+        SET {SHADOW_COLUMN} = l2_normalize(subvector(embedding, 1, %s))::vector({dimensions})
+        WHERE id = ANY(%s)
+        """,
+        [dimensions, ids]
+    )
+    cursor.execute(
+        f"SELECT id, sentence_embeddings FROM {table} WHERE id = ANY(%s) AND sentence_embeddings IS NOT NULL",
+        [ids]
+    )
+    updates = [
+        (_truncate_sentence_matrix(raw, source_dimensions, dimensions), chunk_id)
+        for chunk_id, raw in cursor.fetchall()
+        if raw
+    ]
+    if updates:
+        cursor.executemany(f"UPDATE {table} SET sentence_embeddings = %s WHERE id = %s", updates)
+
+
+def reduce_embedding_dimensions(
+    dimensions: int,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    concurrent_index: bool = True,
+    progress: Optional[Callable[[int, int], None]] = None,
+    schema_editor=None
+) -> int:
+    """
+    Passe DocumentChunk.embedding à `dimensions` composantes.
+
+    Reprenable: une exécution interrompue repart des chunks dont la colonne
+    fantôme est encore vide.
+
+    Args:
+        dimensions: Nouvelle dimension (inférieure ou égale à l'actuelle)
+        batch_size: Chunks par transaction de remplissage
+        concurrent_index: CREATE INDEX CONCURRENTLY (impossible dans une transaction)
+        progress: Appelé avec (chunks traités, total) après chaque lot
+        schema_editor: Éditeur de schéma de la migration appelante, le cas échéant
+
+    Returns:
+        Nombre de chunks convertis (0 si la colonne a déjà la bonne dimension)
+
+    Raises:
+        ValueError: Dimension supérieure à l'actuelle (ré-indexation nécessaire)
+    """
+    from apps.documents.models import DocumentChunk
+
+    table = DocumentChunk._meta.db_table
+
+    with connection.cursor() as cursor:
+        current = column_dimensions(cursor, table, 'embedding')
+        if current == dimensions:
+            return 0
+        if current is not None and current < dimensions:
+            raise ValueError(
+                f"Embeddings stockés en {current} dimensions: passer à {dimensions} "
+                f"nécessite de ré-indexer les documents"
+            )
+
+        # Colonne fantôme d'une exécution précédente à une autre dimension
+        if column_dimensions(cursor, table, SHADOW_COLUMN) not in (None, dimensions):
+            cursor.execute(f"ALTER TABLE {table} DROP COLUMN {SHADOW_COLUMN}")
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {SHADOW_COLUMN} vector({dimensions})")
+
+        cursor.execute(f"SELECT count(*) FROM {table} WHERE {SHADOW_COLUMN} IS NULL")
+        total = cursor.fetchone()[0]
+
+    logger.info(f"📐 Réduction des embeddings: {current} → {dimensions} dimensions, {total} chunks")
+
+    # 1. Remplissage par lots (parcours par clé primaire)
+    done = 0
+    last_id = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT id FROM {table}
+                WHERE id > %s AND {SHADOW_COLUMN} IS NULL
+                ORDER BY id LIMIT %s
+                FOR UPDATE
+                """,
+                [last_id, batch_size]
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+            _backfill_batch(cursor, table, ids, current, dimensions)
+
+        last_id = ids[-1]
+        done += len(ids)
+        if progress:
+            progress(done, total)
+
+    # 2. Rattrapage et échange des colonnes
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(f"SELECT id FROM {table} WHERE {SHADOW_COLUMN} IS NULL")
+        ids = [row[0] for row in cursor.fetchall()]
+        if ids:
+            _backfill_batch(cursor, table, ids, current, dimensions)
+            done += len(ids)
+
+        cursor.execute(f"DROP INDEX IF EXISTS {HNSW_INDEX_NAME}")
+        cursor.execute(f"ALTER TABLE {table} DROP COLUMN embedding")
+        cursor.execute(f"ALTER TABLE {table} RENAME COLUMN {SHADOW_COLUMN} TO embedding")
+        cursor.execute(f"ALTER TABLE {table} ALTER COLUMN embedding SET NOT NULL")
+
+    # 3. Index HNSW, avec les paramètres déclarés dans DocumentChunk.Meta
+    index = next(index for index in DocumentChunk._meta.indexes if index.name == HNSW_INDEX_NAME)
+    if schema_editor is not None:
+        schema_editor.execute(index.create_sql(DocumentChunk, schema_editor, concurrently=concurrent_index))
+    else:
+        with connection.schema_editor(atomic=False) as editor:
+            editor.execute(index.create_sql(DocumentChunk, editor, concurrently=concurrent_index))
+
+    logger.info(f"✅ Embeddings réduits à {dimensions} dimensions: {done} chunks")
+    return done
@@ -5,7 +5,6 @@ Gère l'extraction de texte, le chunking et la génération d'embeddings.
 
 from celery import shared_task
 from celery.utils.log import get_task_logger
-from django.core.files.base import File
 from django.utils import timezone
 from typing import List, Dict, Any, Tuple
 import re
@@ -38,6 +37,13 @@ logger = get_task_logger(__name__)
 CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 512))  # Caractères par chunk
 CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 50))  # Chevauchement entre chunks
 
+# Embeddings par phrase (compression du contexte au moment de la question)
+SENTENCE_EMBEDDINGS_ENABLED = os.getenv('RAG_SENTENCE_EMBEDDINGS', 'False') == 'True'
+MIN_SENTENCE_LENGTH = 20  # Caractères: les fragments plus courts sont rattachés au suivant
+
+# Chunks écrits par COPY BINARY groupé (DocumentChunk.copy_insert)
+CHUNK_COPY_BATCH_SIZE = int(os.getenv('CHUNK_COPY_BATCH_SIZE', 64))
+
 
 # ========================================
 # UTILITAIRES D'EXTRACTION DE TEXTE
@@ -249,6 +255,107 @@ def split_text_into_chunks(
     return chunks
 
 
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """
+    Découpe un chunk en phrases.
+    
+    Les fragments trop courts (titres, numéros) sont fusionnés avec la
+    phrase suivante pour garder des unités porteuses de sens.
+    
+    Args:
+        text: Contenu du chunk
+    
+    Returns:
+        Liste de positions (début, fin) des phrases dans le texte
+    """
+    spans = []
+    start = 0
+    for match in re.finditer(r'(?<=[.!?])\s+|\n+', text):
+        end = match.start()
+        if end - start >= MIN_SENTENCE_LENGTH:
+            spans.append((start, end))
+            start = match.end()
+    
+    if start < len(text.rstrip()):
+        if spans and len(text) - start < MIN_SENTENCE_LENGTH:
+            spans[-1] = (spans[-1][0], len(text.rstrip()))
+        else:
+            spans.append((start, len(text.rstrip())))
+    
+    return spans
+
+
+def embed_sentences(ai_router, texts: List[str]) -> List[Tuple[List[Tuple[int, int]], bytes]]:
+    """
+    Calcule les embeddings des phrases d'un lot de chunks, en un seul
+    appel batch pour tout le lot.
+    
+    Returns:
+        Par chunk, tuple (positions des phrases, matrice float32 sérialisée);
+        matrice vide pour un chunk d'une seule phrase (rien à compresser)
+    """
+    import numpy as np
+    
+    spans_by_text = [split_sentences(text) for text in texts]
+    sentences = [
+        text[start:end]
+        for text, spans in zip(texts, spans_by_text) if len(spans) >= 2
+        for start, end in spans
+    ]
+    results = ai_router.get_embeddings_batch(sentences, normalize=True) if sentences else []
+    
+    embedded = []
+    offset = 0
+    for spans in spans_by_text:
+        if len(spans) < 2:
+            embedded.append((spans, b''))
+            continue
+        matrix = np.vstack([r.embedding for r in results[offset:offset + len(spans)]])
+        offset += len(spans)
+        embedded.append((spans, matrix.tobytes()))
+    return embedded
+
+
+def embed_chunks(ai_router, chunks: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Any]]:
+    """
+    Calcule les embeddings d'un lot de chunks en un seul appel batch
+    (réparti en parallèle sur les serveurs du pool Ollama).
+    
+    Si le lot échoue, chaque chunk est retenté seul: un chunk en erreur
+    est journalisé et ignoré sans faire perdre le reste du lot.
+    
+    Returns:
+        Liste de couples (chunk, EmbeddingResult), sans les chunks en échec
+    
+    Raises:
+        OllamaUnavailableError: Si Ollama est en panne (disjoncteur ouvert)
+    """
+    from apps.core.ai_router import OllamaUnavailableError
+    
+    try:
+        results = ai_router.get_embeddings_batch(
+            [chunk_data['content'] for chunk_data in chunks],
+            normalize=True
+        )
+        return list(zip(chunks, results))
+    
+    except OllamaUnavailableError:
+        raise
+    
+    except Exception as e:
+        logger.warning(f"⚠️ Lot d'embeddings en échec, reprise chunk par chunk: {str(e)}")
+    
+    embedded = []
+    for chunk_data in chunks:
+        try:
+            embedded.append((chunk_data, ai_router.get_embedding(text=chunk_data['content'], normalize=True)))
+        except OllamaUnavailableError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Erreur traitement chunk {chunk_data['chunk_index']}: {str(e)}")
+    return embedded
+
+
 # ========================================
 # TÂCHE CELERY PRINCIPALE
 # ========================================
@@ -262,7 +369,7 @@ def process_document_ingestion(self, document_id: int):
     1. Chargement du document depuis la DB
     2. Extraction du texte (PDF, TXT, OCR)
     3. Découpage en chunks
-    4. Génération des embeddings (Ollama local)
+    4. Génération des embeddings par lots (Ollama local)
     5. Sauvegarde des chunks en DB avec vecteurs
     
     Args:
@@ -270,7 +377,7 @@ def process_document_ingestion(self, document_id: int):
     """
     # Import ici pour éviter les imports circulaires
     from apps.documents.models import SourceDocument, DocumentChunk
-    from apps.core.ai_router import get_ai_router
+    from apps.core.ai_router import get_ai_router, OllamaUnavailableError
     
     logger.info(f"🚀 Démarrage ingestion document ID={document_id}")
     
@@ -279,6 +386,12 @@ def process_document_ingestion(self, document_id: int):
         document = SourceDocument.objects.get(id=document_id)
         document.mark_as_processing()
         
+        # Nouvelle tentative ou retraitement: on repart de zéro (les lots
+        # COPY déjà écrits par une tentative précédente sont validés)
+        deleted, _ = DocumentChunk.objects.filter(source_document_id=document_id).delete()
+        if deleted:
+            logger.info(f"🧹 {deleted} chunks d'une tentative précédente supprimés")
+        
         file_path = document.file.path
         file_type = document.file_type.lower()
         
@@ -288,7 +401,7 @@ def process_document_ingestion(self, document_id: int):
                 extracted_text, metadata = extract_text_from_pdf(file_path)
             except ValueError:
                 # PDF scanné, tentative OCR
-                logger.warning(f"⚠️ PDF scanné détecté, tentative OCR...")
+                logger.warning("⚠️ PDF scanné détecté, tentative OCR...")
                 extracted_text = ocr_pdf_with_tesseract(file_path)
                 metadata = {'num_pages': 0, 'ocr_used': True}
                 
@@ -313,37 +426,44 @@ def process_document_ingestion(self, document_id: int):
         if not chunks_data:
             raise ValueError("Aucun chunk généré (texte trop court?)")
         
-        # 4. Génération des embeddings et sauvegarde
+        # 4. Génération des embeddings par lots (répartis sur le pool Ollama) et sauvegarde
         ai_router = get_ai_router()
         chunks_created = 0
         
-        for chunk_data in chunks_data:
-            try:
-                # Génération de l'embedding (local Ollama)
-                embedding_result = ai_router.get_embedding(
-                    text=chunk_data['content'],
-                    normalize=True
-                )
-                
-                # Création du DocumentChunk
-                DocumentChunk.objects.create(
-                    source_document=document,
-                    content=chunk_data['content'],
-                    embedding=embedding_result.embedding,
-                    chunk_index=chunk_data['chunk_index'],
-                    metadata=chunk_data.get('metadata', {})
-                )
-                
-                chunks_created += 1
+        for batch_start in range(0, len(chunks_data), CHUNK_COPY_BATCH_SIZE):
+            batch = chunks_data[batch_start:batch_start + CHUNK_COPY_BATCH_SIZE]
+            embedded = embed_chunks(ai_router, batch)
+            
+            # Embeddings par phrase (optionnel, pour la compression du contexte):
+            # un seul appel batch pour les phrases de tout le lot
+            sentences = [([], b'')] * len(embedded)
+            if SENTENCE_EMBEDDINGS_ENABLED and embedded:
+                try:
+                    sentences = embed_sentences(ai_router, [chunk_data['content'] for chunk_data, _ in embedded])
+                except OllamaUnavailableError:
+                    # Ollama en panne: inutile d'attendre sur chacun des lots restants
+                    raise
+                except Exception as e:
+                    # Chunks gardés sans compression possible
+                    logger.error(f"❌ Erreur embeddings des phrases du lot: {str(e)}")
+            
+            pending_chunks = []
+            for (chunk_data, embedding_result), (sentence_spans, sentence_embeddings) in zip(embedded, sentences):
+                metadata = chunk_data.get('metadata', {})
+                if sentence_embeddings:
+                    metadata = {**metadata, 'sentence_spans': sentence_spans}
                 
-                # Log de progression tous les 10 chunks
-                if chunks_created % 10 == 0:
-                    logger.info(f"  📦 {chunks_created}/{len(chunks_data)} chunks traités...")
+                # DocumentChunk en attente d'écriture (vecteur float32 tel quel)
+                pending_chunks.append({
+                    'content': chunk_data['content'],
+                    'embedding': embedding_result.embedding,
+                    'sentence_embeddings': sentence_embeddings or None,
+                    'chunk_index': chunk_data['chunk_index'],
+                    'metadata': metadata,
+                })
             
-            except Exception as e:
-                logger.error(f"❌ Erreur traitement chunk {chunk_data['chunk_index']}: {str(e)}")
-                # Continue avec les autres chunks
-                continue
+            chunks_created += DocumentChunk.copy_insert(document, pending_chunks)
+            logger.info(f"  📦 {chunks_created}/{len(chunks_data)} chunks traités...")
         
         # 5. Finalisation
         if chunks_created == 0:
@@ -371,15 +491,20 @@ def process_document_ingestion(self, document_id: int):
         error_message = f"Erreur lors de l'ingestion: {str(e)}"
         logger.error(f"❌ {error_message}")
         
-        # Mise à jour du statut d'erreur
+        # Mise à jour du statut d'erreur, sans laisser de chunks partiels
+        # dans les recherches
         try:
+            DocumentChunk.objects.filter(source_document_id=document_id).delete()
             document = SourceDocument.objects.get(id=document_id)
             document.mark_as_failed(error_message)
         except:
             pass
         
-        # Retry de la tâche (max 3 tentatives)
-        raise self.retry(exc=e, countdown=60)
+        # Retry de la tâche (max 3 tentatives), espacé si Ollama est en panne
+        countdown = 60
+        if isinstance(e, OllamaUnavailableError):
+            countdown = max(e.retry_after, 60 * (2 ** self.request.retries))
+        raise self.retry(exc=e, countdown=countdown)
 
 
 @shared_task
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class RagConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.rag'
+
+    def ready(self):
+        from . import signals  # noqa: F401
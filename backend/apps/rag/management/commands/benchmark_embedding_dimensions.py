@@ -0,0 +1,83 @@
+"""
+Rappel de la recherche en fonction de la dimension des embeddings (Matryoshka).
+
+Des chunks servent de questions; la vérité terrain est la recherche exacte
+à la dimension stockée, comparée à la recherche exacte sur les vecteurs
+tronqués et renormalisés. Le calcul se fait en mémoire (numpy), sans
+modifier la base.
+
+Usage:
+    python manage.py benchmark_embedding_dimensions
+    python manage.py benchmark_embedding_dimensions --dimensions 512 256 128 --k 5 --corpus 50000
+"""
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.vectors import truncate_embeddings
+
+
+class Command(BaseCommand):
+    help = "Rappel@k, taille des vecteurs et temps de parcours selon la dimension des embeddings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dimensions', type=int, nargs='+', default=[768, 512, 384, 256, 128, 64],
+            help="Dimensions à évaluer (défaut: 768 512 384 256 128 64)"
+        )
+        parser.add_argument('--corpus', type=int, default=20000, help="Chunks chargés (défaut: 20000)")
+        parser.add_argument('--queries', type=int, default=200, help="Chunks utilisés comme questions (défaut: 200)")
+        parser.add_argument('--k', type=int, default=10, help="Nombre de résultats comparés (défaut: 10)")
+        parser.add_argument('--seed', type=int, default=0, help="Graine du tirage des questions")
+
+    def handle(self, *args, **options):
+        from apps.documents.models import DocumentChunk
+
+        k = options['k']
+        corpus = np.asarray(
+            list(DocumentChunk.objects.order_by('id').values_list('embedding', flat=True)[:options['corpus']]),
+            dtype=np.float32
+        )
+        if len(corpus) <= k:
+            raise CommandError(f"Au moins {k + 1} chunks nécessaires ({len(corpus)} en base)")
+
+        stored_dimensions = corpus.shape[1]
+        dimensions = sorted({d for d in options['dimensions'] if 0 < d <= stored_dimensions}, reverse=True)
+        if not dimensions:
+            raise CommandError(f"Aucune dimension <= {stored_dimensions} (dimension stockée)")
+
+        rng = np.random.default_rng(options['seed'])
+        query_rows = rng.choice(len(corpus), size=min(options['queries'], len(corpus)), replace=False)
+
+        reference = self._top_k(corpus, corpus[query_rows], query_rows, k)
+
+        self.stdout.write(
+            f"📊 {len(corpus)} chunks, {len(query_rows)} questions, k={k}, "
+            f"dimension stockée: {stored_dimensions}"
+        )
+        self.stdout.write(f"{'dim.':>6}{'rappel@k':>11}{'min':>8}{'octets/vect.':>15}{'parcours':>12}")
+
+        for d in dimensions:
+            reduced = truncate_embeddings(corpus, d)
+            start = time.perf_counter()
+            found = self._top_k(reduced, reduced[query_rows], query_rows, k)
+            scan_ms = (time.perf_counter() - start) * 1000 / len(query_rows)
+
+            recalls = np.array([
+                len(np.intersect1d(found[i], reference[i])) / k for i in range(len(query_rows))
+            ])
+            # pgvector: 4 octets par composante + 8 octets d'en-tête
+            self.stdout.write(
+                f"{d:>6}{recalls.mean():>11.3f}{recalls.min():>8.2f}{4 * d + 8:>15}{scan_ms:>10.2f}ms"
+            )
+
+    @staticmethod
+    def _top_k(corpus: np.ndarray, queries: np.ndarray, query_rows: np.ndarray, k: int) -> np.ndarray:
+        """Indices des k plus proches voisins exacts de chaque question (hors elle-même)."""
+        # Vecteurs normalisés: plus grand produit scalaire = plus petite distance L2
+        scores = queries @ corpus.T
+        scores[np.arange(len(query_rows)), query_rows] = -np.inf
+        top = np.argpartition(-scores, k, axis=1)[:, :k]
+        return top
@@ -0,0 +1,102 @@
+"""
+Comparaison des backends d'embedding (Ollama HTTP vs modèle local CPU).
+
+Usage:
+    python manage.py benchmark_embeddings
+    python manage.py benchmark_embeddings --texts 500 --batch-size 64
+    python manage.py benchmark_embeddings --backends local --from-db
+"""
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.ai_router import AIRouter
+
+
+SAMPLE_SENTENCES = [
+    "Le rapport annuel présente une hausse du chiffre d'affaires de 12 % par rapport à l'exercice précédent.",
+    "Les conditions générales précisent que la résiliation doit être notifiée par lettre recommandée.",
+    "La température moyenne relevée en juillet dépasse les normales saisonnières de deux degrés.",
+    "Le comité de pilotage se réunit chaque trimestre pour valider la feuille de route du projet.",
+    "Les données personnelles sont conservées pendant une durée maximale de trois ans.",
+    "L'algorithme de recherche combine une similarité vectorielle et un score lexical.",
+    "La facture doit être réglée dans un délai de trente jours à compter de sa date d'émission.",
+    "Le chapitre trois décrit la méthodologie utilisée pour la collecte des échantillons.",
+]
+
+
+class Command(BaseCommand):
+    help = "Latence et débit des backends d'embedding (ollama, local), et concordance des vecteurs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--texts', type=int, default=200, help="Nombre de textes (défaut: 200)")
+        parser.add_argument('--batch-size', type=int, default=32, help="Taille des lots (défaut: 32)")
+        parser.add_argument(
+            '--backends', nargs='+', default=['ollama', 'local'], choices=['ollama', 'local'],
+            help="Backends à comparer (défaut: ollama local)"
+        )
+        parser.add_argument('--from-db', action='store_true', help="Utiliser le contenu de chunks existants")
+
+    def handle(self, *args, **options):
+        texts = self._load_texts(options['texts'], options['from_db'])
+        batch_size = options['batch_size']
+
+        self.stdout.write(f"📊 {len(texts)} textes, lots de {batch_size}")
+        self.stdout.write(f"{'backend':<10}{'p50 unit.':>12}{'p95 unit.':>12}{'débit lots':>16}")
+
+        vectors = {}
+        for backend in options['backends']:
+            router = AIRouter(embedding_backend=backend)
+
+            try:
+                router.get_embedding(texts[0])  # Chargement du modèle / connexion
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"{backend:<10}indisponible: {str(e)}"))
+                continue
+
+            # Latence d'un appel unitaire (cas d'une question utilisateur)
+            latencies = []
+            for text in texts[:min(50, len(texts))]:
+                start = time.perf_counter()
+                router.get_embedding(text)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            # Débit par lots (cas de l'ingestion)
+            start = time.perf_counter()
+            results = []
+            for i in range(0, len(texts), batch_size):
+                results.extend(router.get_embeddings_batch(texts[i:i + batch_size]))
+            throughput = len(texts) / (time.perf_counter() - start)
+
+            vectors[backend] = np.asarray([r.embedding for r in results], dtype=np.float32)
+            p50, p95 = np.percentile(latencies, [50, 95])
+            self.stdout.write(f"{backend:<10}{p50:>10.1f}ms{p95:>10.1f}ms{throughput:>10.1f} txt/s")
+
+        if 'ollama' in vectors and 'local' in vectors:
+            # Vecteurs normalisés: produit scalaire = similarité cosinus
+            agreement = np.sum(vectors['ollama'] * vectors['local'], axis=1)
+            self.stdout.write("")
+            self.stdout.write(
+                f"Concordance ollama/local (cosinus): moyenne {agreement.mean():.4f}, "
+                f"min {agreement.min():.4f}"
+            )
+            if agreement.min() < 0.99:
+                self.stdout.write(self.style.WARNING(
+                    "⚠️ Vecteurs non interchangeables: ré-indexer les documents avant de changer de backend"
+                ))
+
+    def _load_texts(self, count: int, from_db: bool):
+        if from_db:
+            from apps.documents.models import DocumentChunk
+
+            texts = list(DocumentChunk.objects.values_list('content', flat=True)[:count])
+            if not texts:
+                raise CommandError("Aucun chunk en base")
+            return texts
+
+        return [
+            f"{SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)]} (extrait {i})"
+            for i in range(count)
+        ]
@@ -0,0 +1,97 @@
+"""
+Rapport de latence des questions RAG, étape par étape.
+
+Usage:
+    python manage.py rag_latency_report
+    python manage.py rag_latency_report --hours 6 --percentiles 50 90 99
+    python manage.py rag_latency_report --exclude-cached
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.documents.models import QueryLog
+
+
+# Colonne QueryLog -> libellé de l'étape
+STAGE_COLUMNS = [
+    ('embedding_time_ms', 'embedding'),
+    ('retrieval_time_ms', 'retrieval'),
+    ('context_time_ms', 'context'),
+    ('generation_time_ms', 'generation'),
+    ('response_time_ms', 'total'),
+]
+
+
+class Command(BaseCommand):
+    help = "Percentiles de latence par étape (embedding, recherche, contexte, génération) sur une fenêtre de temps"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24, help="Fenêtre d'analyse (heures, défaut: 24)")
+        parser.add_argument(
+            '--percentiles', type=int, nargs='+', default=[50, 95, 99],
+            help="Percentiles à calculer (défaut: 50 95 99)"
+        )
+        parser.add_argument(
+            '--exclude-cached', action='store_true',
+            help="Ignorer les réponses servies depuis le cache (sans génération)"
+        )
+
+    def handle(self, *args, **options):
+        percentiles = options['percentiles']
+        if any(not (0 < p < 100) for p in percentiles):
+            raise CommandError("Les percentiles doivent être entre 1 et 99")
+
+        since = timezone.now() - timedelta(hours=options['hours'])
+        fractions = [p / 100 for p in percentiles]
+
+        where = "created_at >= %s"
+        if options['exclude_cached']:
+            where += " AND generation_time_ms IS NOT NULL"
+
+        # Un seul parcours de la table: count + percentile_cont par colonne
+        select_parts = []
+        for column, _ in STAGE_COLUMNS:
+            select_parts.append(f"COUNT({column})")
+            select_parts.append(f"percentile_cont(%s::float8[]) WITHIN GROUP (ORDER BY {column})")
+
+        sql = f"""
+            SELECT COUNT(*), {', '.join(select_parts)},
+                   SUM(prompt_tokens), SUM(completion_tokens)
+            FROM {QueryLog._meta.db_table}
+            WHERE {where}
+        """
+        params = [fractions] * len(STAGE_COLUMNS) + [since]
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+
+        total = row[0]
+        if not total:
+            self.stdout.write(self.style.WARNING(f"Aucune requête depuis {since:%Y-%m-%d %H:%M}"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"📊 Latence RAG depuis {since:%Y-%m-%d %H:%M} - {total} requêtes"
+        ))
+
+        header = f"{'étape':<12}{'n':>8}" + "".join(f"{f'p{p}':>10}" for p in percentiles)
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+
+        for i, (_, label) in enumerate(STAGE_COLUMNS):
+            count = row[1 + 2 * i]
+            values = row[2 + 2 * i] or [None] * len(percentiles)
+            cells = "".join(
+                f"{'-':>10}" if value is None else f"{value:>8.0f}ms"
+                for value in values
+            )
+            self.stdout.write(f"{label:<12}{count:>8}{cells}")
+
+        prompt_tokens, completion_tokens = row[-2] or 0, row[-1] or 0
+        self.stdout.write("")
+        self.stdout.write(f"Tokens prompt: {prompt_tokens} | Tokens réponse: {completion_tokens}")
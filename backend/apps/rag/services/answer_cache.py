@@ -0,0 +1,228 @@
+"""
+Cache sémantique des réponses RAG complètes.
+
+Clé: (utilisateur, version de l'ensemble de documents, paramètres, question).
+Une question quasi identique (similarité cosinus des embeddings au-dessus
+d'un seuil strict) réutilise la réponse déjà générée: zéro token, quelques
+millisecondes. La version change à chaque document terminé, retraité ou
+supprimé, donc une réponse périmée n'est jamais servie.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from apps.core.cache import TwoTierCache, get_redis_client, mark_redis_unavailable
+from apps.rag.services.embedding_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'True') == 'True'
+ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', 0.97))
+ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', 86400))  # 24h
+
+# Nombre maximal de questions indexées par ensemble (utilisateur, version)
+ANSWER_CACHE_BUCKET_SIZE = 256
+
+ANSWER_KEY_LENGTH = 64  # sha256 hexadécimal
+
+
+def _serialize_json(value: Any) -> bytes:
+    return json.dumps(value).encode('utf-8')
+
+
+def _deserialize_json(raw: bytes) -> Any:
+    return json.loads(raw)
+
+
+def _bucket_entry(key: str, vector: np.ndarray) -> bytes:
+    """Entrée d'index: clé exacte (64 caractères hexadécimaux) + embedding float32."""
+    return key.encode('ascii') + vector.astype(np.float32).tobytes()
+
+
+def _bucket_from_entries(entries: List[bytes]) -> Dict[str, Any]:
+    """
+    Index d'un ensemble à partir des entrées de la liste Redis.
+
+    Une question stockée deux fois (écritures simultanées) n'est gardée
+    qu'une fois; les entrées d'une autre dimension que la plus récente
+    (changement d'EMBEDDING_DIMENSIONS) sont ignorées.
+    """
+    by_key: Dict[str, np.ndarray] = {}
+    dimensions = (len(entries[-1]) - ANSWER_KEY_LENGTH) // 4 if entries else 0
+    for entry in entries:
+        vector = np.frombuffer(entry[ANSWER_KEY_LENGTH:], dtype=np.float32)
+        if vector.shape[0] == dimensions:
+            key = entry[:ANSWER_KEY_LENGTH].decode('ascii')
+            by_key.pop(key, None)
+            by_key[key] = vector
+    return {
+        'keys': list(by_key),
+        'vectors': np.vstack(list(by_key.values())) if by_key else np.empty((0, dimensions), dtype=np.float32)
+    }
+
+
+class SemanticAnswerCache:
+    """
+    Réponses en cache + index des embeddings de questions par ensemble.
+
+    - answers: clé exacte -> réponse sérialisée (JSON)
+    - index: ensemble -> liste Redis d'entrées (clé exacte + embedding),
+      allongée par RPUSH + LTRIM dans une transaction: des écritures
+      simultanées de plusieurs workers ne s'écrasent pas
+    - buckets: copie en mémoire de l'index (courte durée), seule source
+      si Redis est indisponible
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY,
+        ttl: int = ANSWER_CACHE_TTL
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.answers = TwoTierCache(
+            namespace='rag:answer',
+            max_entries=1024,
+            local_ttl=min(ttl, 3600),
+            redis_ttl=ttl,
+            serializer=_serialize_json,
+            deserializer=_deserialize_json
+        )
+        self.buckets = TwoTierCache(
+            namespace='rag:answer-index',
+            max_entries=256,
+            local_ttl=60,  # court: l'index est partagé entre workers via Redis
+            redis_ttl=0
+        )
+        self.index_ttl = ttl
+        self._buckets_lock = threading.Lock()
+
+    @staticmethod
+    def bucket_key(user_id: int, document_set_version: str, params: Dict[str, Any]) -> str:
+        """Clé d'ensemble: utilisateur, version des documents et paramètres de génération."""
+        payload = json.dumps(
+            {'user': user_id, 'version': document_set_version, **params},
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def answer_key(bucket_key: str, question: str) -> str:
+        payload = f"{bucket_key}\x00{normalize_question(question)}"
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_exact(self, bucket_key: str, question: str) -> Optional[Dict[str, Any]]:
+        """Réponse pour la même question normalisée, sans embedding."""
+        return self.answers.get(self.answer_key(bucket_key, question))
+
+    def get_similar(
+        self,
+        bucket_key: str,
+        query_embedding: List[float]
+    ) -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        Réponse d'une question quasi identique (cosinus >= seuil).
+
+        Returns:
+            Tuple (réponse ou None, meilleure similarité trouvée)
+        """
+        bucket = self._load_bucket(bucket_key)
+        if not bucket or not bucket['keys']:
+            return None, 0.0
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if bucket['vectors'].shape[1] != query.shape[0]:
+            return None, 0.0  # Ensemble indexé avant un changement d'EMBEDDING_DIMENSIONS
+        # Embeddings normalisés: le produit scalaire est la similarité cosinus
+        similarities = bucket['vectors'] @ query
+        best = int(np.argmax(similarities))
+        best_score = float(similarities[best])
+
+        if best_score < self.similarity_threshold:
+            return None, best_score
+
+        return self.answers.get(bucket['keys'][best]), best_score
+
+    def store(
+        self,
+        bucket_key: str,
+        question: str,
+        query_embedding: List[float],
+        response: Dict[str, Any]
+    ) -> None:
+        """Enregistre une réponse et indexe l'embedding de sa question."""
+        key = self.answer_key(bucket_key, question)
+        self.answers.set(key, response)
+
+        vector = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        entry = _bucket_entry(key, vector)
+
+        client = get_redis_client()
+        if client is not None:
+            index_key = self._index_key(bucket_key)
+            try:
+                with client.pipeline(transaction=True) as pipe:
+                    pipe.rpush(index_key, entry)
+                    pipe.ltrim(index_key, -ANSWER_CACHE_BUCKET_SIZE, -1)
+                    pipe.expire(index_key, self.index_ttl)
+                    pipe.execute()
+            except Exception as e:
+                mark_redis_unavailable(e)
+            else:
+                # Relue depuis Redis à la prochaine recherche (avec les ajouts des autres workers)
+                self.buckets.delete(bucket_key)
+                return
+
+        # Sans Redis: copie locale seule (sous verrou: plusieurs threads du process)
+        with self._buckets_lock:
+            bucket = self.buckets.get(bucket_key)
+            entries = [_bucket_entry(k, v) for k, v in zip(bucket['keys'], bucket['vectors'])] if bucket else []
+            entries = (entries + [entry])[-ANSWER_CACHE_BUCKET_SIZE:]
+            self.buckets.set(bucket_key, _bucket_from_entries(entries))
+
+    @staticmethod
+    def _index_key(bucket_key: str) -> str:
+        # Nom distinct de l'ancien index (valeur unique): pas de WRONGTYPE sur les clés existantes
+        return f"rag:answer-list:{bucket_key}"
+
+    def _load_bucket(self, bucket_key: str) -> Optional[Dict[str, Any]]:
+        """Index d'un ensemble: copie locale récente, sinon liste Redis."""
+        bucket = self.buckets.get(bucket_key)
+        if bucket is not None:
+            return bucket
+
+        client = get_redis_client()
+        if client is None:
+            return None
+        try:
+            entries = client.lrange(self._index_key(bucket_key), 0, -1)
+        except Exception as e:
+            mark_redis_unavailable(e)
+            return None
+        if not entries:
+            return None
+
+        bucket = _bucket_from_entries(entries)
+        self.buckets.set(bucket_key, bucket)
+        return bucket
+
+
+_answer_cache_instance: Optional[SemanticAnswerCache] = None
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Retourne le cache de réponses du process courant."""
+    global _answer_cache_instance
+    if _answer_cache_instance is None:
+        _answer_cache_instance = SemanticAnswerCache()
+    return _answer_cache_instance
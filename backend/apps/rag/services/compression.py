@@ -0,0 +1,116 @@
+"""
+Compression du contexte au niveau des phrases, guidée par la question.
+
+Les phrases des chunks retenus sont notées contre l'embedding de la question
+(produit matriciel unique sur les embeddings calculés à l'ingestion); seules
+les meilleures sont conservées, avec la citation (document, page) du chunk.
+"""
+
+from dataclasses import replace
+from typing import List, TYPE_CHECKING
+import logging
+import os
+
+import numpy as np
+
+from apps.core.vectors import truncate_embeddings
+
+if TYPE_CHECKING:
+    from apps.documents.models import RetrievedChunk
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+CONTEXT_COMPRESSION_ENABLED = os.getenv('RAG_CONTEXT_COMPRESSION', 'False') == 'True'
+COMPRESSION_SENTENCES_PER_CHUNK = int(os.getenv('RAG_COMPRESSION_SENTENCES_PER_CHUNK', 3))
+COMPRESSION_MIN_SIMILARITY = float(os.getenv('RAG_COMPRESSION_MIN_SIMILARITY', 0.3))
+
+SENTENCE_SEPARATOR = " […] "
+
+
+def compress_chunks(
+    chunks: List["RetrievedChunk"],
+    query_embedding: List[float],
+    sentences_per_chunk: int = COMPRESSION_SENTENCES_PER_CHUNK,
+    min_similarity: float = COMPRESSION_MIN_SIMILARITY
+) -> List["RetrievedChunk"]:
+    """
+    Réduit chaque chunk à ses phrases les plus proches de la question.
+
+    Les chunks sans embeddings de phrases (ingérés sans RAG_SENTENCE_EMBEDDINGS)
+    sont conservés tels quels. La meilleure phrase d'un chunk est toujours
+    gardée, même sous min_similarity, pour ne pas perdre la source.
+
+    Args:
+        chunks: Résultats de recherche
+        query_embedding: Embedding normalisé de la question
+        sentences_per_chunk: Nombre maximal de phrases gardées par chunk
+        min_similarity: Similarité cosinus minimale d'une phrase gardée
+
+    Returns:
+        Nouvelle liste de RetrievedChunk (contenu compressé)
+    """
+    from apps.documents.models import DocumentChunk
+
+    if not chunks:
+        return chunks
+
+    stored = {
+        chunk_id: (raw, metadata.get('sentence_spans'))
+        for chunk_id, raw, metadata in DocumentChunk.objects.filter(
+            id__in=[c.chunk_id for c in chunks],
+            sentence_embeddings__isnull=False
+        ).values_list('id', 'sentence_embeddings', 'metadata')
+    }
+    if not stored:
+        return chunks
+
+    query = np.asarray(query_embedding, dtype=np.float32)
+
+    # Une seule matrice pour toutes les phrases de tous les chunks
+    owners, spans, matrices = [], [], []
+    for chunk in chunks:
+        raw, chunk_spans = stored.get(chunk.chunk_id, (None, None))
+        if not raw or not chunk_spans:
+            continue
+        matrix = np.frombuffer(bytes(raw), dtype=np.float32).reshape(len(chunk_spans), -1)
+        # Chunk ingéré avant une réduction d'EMBEDDING_DIMENSIONS
+        if matrix.shape[1] < query.shape[0]:
+            continue
+        matrices.append(truncate_embeddings(matrix, query.shape[0]))
+        owners.extend([chunk.chunk_id] * len(chunk_spans))
+        spans.extend(chunk_spans)
+
+    if not matrices:
+        return chunks
+
+    scores = np.vstack(matrices) @ query
+    owners = np.asarray(owners)
+
+    compressed = []
+    original_chars = kept_chars = 0
+    for chunk in chunks:
+        positions = np.flatnonzero(owners == chunk.chunk_id)
+        if positions.size == 0:
+            compressed.append(chunk)
+            continue
+
+        best = positions[np.argsort(scores[positions])[::-1][:sentences_per_chunk]]
+        keep = [p for p in best if scores[p] >= min_similarity] or [best[0]]
+        keep.sort()  # ordre du texte
+
+        content = SENTENCE_SEPARATOR.join(
+            chunk.content[spans[p][0]:spans[p][1]].strip() for p in keep
+        )
+        original_chars += len(chunk.content)
+        kept_chars += len(content)
+        compressed.append(replace(chunk, content=content))
+
+    if original_chars:
+        logger.debug(f"✂️ Compression du contexte: {original_chars} → {kept_chars} caractères")
+
+    return compressed
@@ -0,0 +1,254 @@
+"""
+Construction du contexte RAG sous budget de tokens.
+
+- Fusion des chunks consécutifs (chunk_index) d'un même document
+- Suppression du texte de chevauchement (CHUNK_OVERLAP) entre chunks fusionnés
+- Un seul en-tête par document
+- Remplissage d'un budget de tokens propre au modèle
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, TYPE_CHECKING
+import logging
+import math
+import os
+
+if TYPE_CHECKING:
+    from apps.documents.models import RetrievedChunk
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+# Budget de contexte (tokens) par défaut et par famille de modèles (préfixe)
+DEFAULT_CONTEXT_TOKEN_BUDGET = int(os.getenv('RAG_CONTEXT_TOKEN_BUDGET', 2000))
+CONTEXT_TOKEN_BUDGETS: Dict[str, int] = {
+    'anthropic/': 4000,
+    'openai/': 3000,
+    'google/': 4000,
+    'deepseek/': 3000,
+    'meta-llama/': 2000,
+}
+
+# Estimation grossière pour du texte français (≈ 3.5 caractères par token)
+CHARS_PER_TOKEN = 3.5
+
+# Longueur maximale de chevauchement recherchée entre deux chunks consécutifs
+MAX_OVERLAP_SCAN = 2 * int(os.getenv('CHUNK_OVERLAP', 50)) + 20
+MIN_OVERLAP = 8
+
+CONTEXT_HEADER = "=== CONTEXTE EXTRAIT DES DOCUMENTS ===\n\n"
+EMPTY_CONTEXT = "Aucun contexte pertinent trouvé dans les documents."
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation rapide du nombre de tokens d'un texte."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def context_token_budget(model: Optional[str]) -> int:
+    """Budget de tokens de contexte pour un modèle donné."""
+    if model:
+        for prefix, budget in CONTEXT_TOKEN_BUDGETS.items():
+            if model.startswith(prefix):
+                return budget
+    return DEFAULT_CONTEXT_TOKEN_BUDGET
+
+
+def strip_overlap(previous: str, following: str) -> str:
+    """
+    Retire du début de `following` le texte déjà présent à la fin de `previous`
+    (chevauchement introduit au découpage).
+    """
+    longest = min(len(previous), len(following), MAX_OVERLAP_SCAN)
+    for size in range(longest, MIN_OVERLAP - 1, -1):
+        if previous.endswith(following[:size]):
+            return following[size:].lstrip()
+    return following
+
+
+@dataclass
+class ContextSpan:
+    """Suite de chunks consécutifs d'un même document, fusionnés."""
+    document_id: int
+    first_index: int
+    last_index: int
+    pages: List[int]
+    text: str
+    score: float
+
+    @property
+    def page_label(self) -> str:
+        if not self.pages:
+            return "N/A"
+        if self.pages[0] == self.pages[-1]:
+            return str(self.pages[0])
+        return f"{self.pages[0]}-{self.pages[-1]}"
+
+
+@dataclass
+class PackedContext:
+    """Contexte final et statistiques de remplissage."""
+    text: str
+    estimated_tokens: int
+    token_budget: int
+    chunks_used: int
+    spans: List[ContextSpan] = field(default_factory=list)
+    spans_dropped: int = 0  # Spans écartés faute de place
+    truncated: bool = False  # Span le plus pertinent tronqué au budget
+
+    @property
+    def complete(self) -> bool:
+        """Tout le contexte récupéré tient dans le budget."""
+        return not self.spans_dropped and not self.truncated
+
+
+def merge_into_spans(chunks: List["RetrievedChunk"]) -> Dict[int, List[ContextSpan]]:
+    """
+    Regroupe les chunks par document et fusionne les index consécutifs.
+
+    Returns:
+        Spans par document_id, dans l'ordre de lecture
+    """
+    by_document: Dict[int, List["RetrievedChunk"]] = {}
+    for chunk in chunks:
+        by_document.setdefault(chunk.document_id, []).append(chunk)
+
+    spans: Dict[int, List[ContextSpan]] = {}
+    for document_id, document_chunks in by_document.items():
+        document_chunks.sort(key=lambda c: c.chunk_index)
+        document_spans: List[ContextSpan] = []
+
+        for chunk in document_chunks:
+            content = chunk.content.strip()
+            current = document_spans[-1] if document_spans else None
+
+            if current is not None and chunk.chunk_index == current.last_index + 1:
+                current.text = f"{current.text}\n{strip_overlap(current.text, content)}"
+                current.last_index = chunk.chunk_index
+                current.score = max(current.score, chunk.similarity_score)
+                if chunk.page_number is not None and chunk.page_number not in current.pages:
+                    current.pages.append(chunk.page_number)
+            elif current is not None and chunk.chunk_index == current.last_index:
+                continue  # doublon
+            else:
+                document_spans.append(ContextSpan(
+                    document_id=document_id,
+                    first_index=chunk.chunk_index,
+                    last_index=chunk.chunk_index,
+                    pages=[chunk.page_number] if chunk.page_number is not None else [],
+                    text=content,
+                    score=chunk.similarity_score
+                ))
+
+        spans[document_id] = document_spans
+
+    return spans
+
+
+def pack_context(
+    chunks: List["RetrievedChunk"],
+    token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET,
+    count_tokens=estimate_tokens,
+    truncate_text=None
+) -> PackedContext:
+    """
+    Construit le contexte le plus utile possible dans un budget de tokens.
+
+    Les spans sont retenus par pertinence décroissante tant qu'ils tiennent
+    dans le budget, puis restitués document par document dans l'ordre de
+    lecture, sous un en-tête unique par document.
+
+    Args:
+        chunks: Résultats de recherche (RetrievedChunk)
+        token_budget: Budget total du contexte (en tokens)
+        count_tokens: Fonction de comptage des tokens
+        truncate_text: Fonction (texte, max_tokens) -> préfixe, pour tronquer
+            exactement au budget (défaut: coupe au ratio caractères/token)
+
+    Returns:
+        PackedContext
+    """
+    if not chunks:
+        return PackedContext(EMPTY_CONTEXT, count_tokens(EMPTY_CONTEXT), token_budget, 0)
+
+    titles = {chunk.document_id: chunk.document_title for chunk in chunks}
+    spans_by_document = merge_into_spans(chunks)
+
+    used = count_tokens(CONTEXT_HEADER)
+    selected: List[ContextSpan] = []
+    truncated = False
+    documents_with_header = set()
+
+    candidates = sorted(
+        (span for spans in spans_by_document.values() for span in spans),
+        key=lambda span: span.score,
+        reverse=True
+    )
+
+    for span in candidates:
+        cost = count_tokens(f"(Page {span.page_label}, Pertinence: {span.score:.2f})\n{span.text}\n\n")
+        if span.document_id not in documents_with_header:
+            cost += count_tokens(f"### Source: {titles[span.document_id]}\n")
+
+        if used + cost > token_budget:
+            if selected:
+                continue
+            truncated = True
+            # Rien ne tient: on tronque le span le plus pertinent au budget
+            if truncate_text is not None:
+                labels_cost = cost - count_tokens(span.text)
+                span.text = truncate_text(span.text, token_budget - used - labels_cost)
+                if not span.text:
+                    break
+                cost = labels_cost + count_tokens(span.text)
+            else:
+                available_chars = int((token_budget - used) * CHARS_PER_TOKEN * 0.9)
+                if available_chars <= 0:
+                    break
+                span.text = span.text[:available_chars]
+                cost = token_budget - used
+
+        selected.append(span)
+        documents_with_header.add(span.document_id)
+        used += cost
+
+    # Restitution: documents par meilleure pertinence, spans dans l'ordre de lecture
+    document_order = sorted(
+        documents_with_header,
+        key=lambda doc_id: max(s.score for s in selected if s.document_id == doc_id),
+        reverse=True
+    )
+
+    parts = [CONTEXT_HEADER]
+    chunks_used = 0
+    for document_id in document_order:
+        parts.append(f"### Source: {titles[document_id]}\n")
+        document_spans = sorted(
+            (s for s in selected if s.document_id == document_id),
+            key=lambda s: s.first_index
+        )
+        for span in document_spans:
+            parts.append(f"(Page {span.page_label}, Pertinence: {span.score:.2f})\n{span.text}\n\n")
+            chunks_used += span.last_index - span.first_index + 1
+
+    text = "".join(parts)
+    packed = PackedContext(
+        text=text,
+        estimated_tokens=count_tokens(text),
+        token_budget=token_budget,
+        chunks_used=chunks_used,
+        spans=selected,
+        spans_dropped=len(candidates) - len(selected),
+        truncated=truncated
+    )
+
+    logger.debug(
+        f"📄 Contexte RAG construit: {len(selected)} spans ({chunks_used} chunks) "
+        f"sur {len(documents_with_header)} documents, ~{packed.estimated_tokens}/{token_budget} tokens"
+    )
+
+    return packed
@@ -0,0 +1,110 @@
+"""
+Cache des embeddings de questions (LRU process + Redis).
+
+Évite un aller-retour Ollama quand la même question revient (FAQ,
+nouvelles tentatives après un timeout...).
+"""
+
+from typing import Optional, Tuple
+import hashlib
+import logging
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+from apps.core.cache import TwoTierCache
+from apps.core.vectors import as_float32
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 2048))
+QUERY_EMBEDDING_LOCAL_TTL = int(os.getenv('QUERY_EMBEDDING_LOCAL_TTL', 3600))      # 1h
+QUERY_EMBEDDING_REDIS_TTL = int(os.getenv('QUERY_EMBEDDING_REDIS_TTL', 7 * 86400))  # 7 jours
+
+
+def _serialize_embedding(embedding: np.ndarray) -> bytes:
+    return as_float32(embedding).tobytes()
+
+
+def _deserialize_embedding(raw: bytes) -> np.ndarray:
+    # Vue float32 en lecture seule sur les octets Redis (aucune copie)
+    return np.frombuffer(raw, dtype=np.float32)
+
+
+_query_embedding_cache: Optional[TwoTierCache] = None
+
+def get_query_embedding_cache() -> TwoTierCache:
+    """Retourne le cache d'embeddings de questions du process courant."""
+    global _query_embedding_cache
+    if _query_embedding_cache is None:
+        _query_embedding_cache = TwoTierCache(
+            namespace='rag:qemb',
+            max_entries=QUERY_EMBEDDING_CACHE_SIZE,
+            local_ttl=QUERY_EMBEDDING_LOCAL_TTL,
+            redis_ttl=QUERY_EMBEDDING_REDIS_TTL,
+            serializer=_serialize_embedding,
+            deserializer=_deserialize_embedding
+        )
+    return _query_embedding_cache
+
+
+def normalize_question(question: str) -> str:
+    """Normalise une question pour la clé de cache (Unicode, casse, espaces)."""
+    question = unicodedata.normalize('NFKC', question)
+    question = re.sub(r'\s+', ' ', question)
+    return question.strip().lower()
+
+
+def question_cache_key(question: str, model: str, dimensions: int) -> str:
+    """Clé de cache: hash du modèle, de la dimension et de la question normalisée."""
+    payload = f"{model}\x00{dimensions}\x00{normalize_question(question)}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_question_embedding(ai_router, question: str) -> Tuple[np.ndarray, bool]:
+    """
+    Retourne l'embedding (normalisé) d'une question, depuis le cache si possible.
+
+    Args:
+        ai_router: Instance d'AIRouter
+        question: Question de l'utilisateur
+
+    Returns:
+        Tuple (embedding float32, hit de cache)
+    """
+    cache = get_query_embedding_cache()
+    key = question_cache_key(question, ai_router.embedding_model, ai_router.embedding_dimensions)
+
+    embedding = cache.get(key)
+    if embedding is not None:
+        logger.debug(f"⚡ Embedding de question servi depuis le cache - {cache.stats()}")
+        return embedding, True
+
+    embedding_result = ai_router.get_embedding(text=question, normalize=True)
+    cache.set(key, embedding_result.embedding)
+
+    return embedding_result.embedding, False
+
+
+async def aget_question_embedding(ai_router, question: str) -> Tuple[np.ndarray, bool]:
+    """Version asynchrone de get_question_embedding (Redis dans un thread, Ollama en async)."""
+    from asgiref.sync import sync_to_async
+
+    cache = get_query_embedding_cache()
+    key = question_cache_key(question, ai_router.embedding_model, ai_router.embedding_dimensions)
+
+    embedding = await sync_to_async(cache.get, thread_sensitive=False)(key)
+    if embedding is not None:
+        return embedding, True
+
+    embedding_result = await ai_router.aget_embedding(text=question, normalize=True)
+    await sync_to_async(cache.set, thread_sensitive=False)(key, embedding_result.embedding)
+
+    return embedding_result.embedding, False
@@ -0,0 +1,581 @@
+"""
+Étapes d'une question RAG, partagées par les vues synchrone et asynchrone.
+
+Les étapes qui touchent la base de données sont synchrones (à appeler via
+sync_to_async depuis une vue ASGI); les appels réseau vers les fournisseurs
+IA (embedding, complétion) restent à la charge de la vue, qui peut ainsi
+utiliser les méthodes bloquantes ou asynchrones d'AIRouter.
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+import json
+import logging
+import os
+import time
+
+from django.db import transaction
+
+from apps.rag.services.answer_cache import get_answer_cache, ANSWER_CACHE_ENABLED
+from apps.rag.services.compression import compress_chunks, CONTEXT_COMPRESSION_ENABLED
+from apps.rag.services.context_builder import pack_context, context_token_budget, PackedContext
+from apps.rag.services.query_log_writer import get_query_log_writer, QueryLogRecord, QUERY_LOG_ASYNC
+from apps.rag.services.retriever import retrieve_chunks, MMR_LAMBDA, MMR_FETCH_FACTOR
+
+if TYPE_CHECKING:
+    from apps.core.ai_router import ChatCompletionResult
+    from apps.core.model_router import RoutingDecision
+    from apps.documents.models import RetrievedChunk
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURATION RAG
+# ========================================
+
+TOP_K_RESULTS = 5  # Nombre de chunks à récupérer
+MAX_TOP_K = 20  # Borne de top_k (taille des scans de candidats)
+SIMILARITY_THRESHOLD = 0.6  # Seuil de pertinence (0-1)
+MAX_QUESTION_LENGTH = 1000  # Caractères max dans la question
+SEARCH_MODE = os.getenv('RAG_SEARCH_MODE', 'vector')  # 'vector' ou 'hybrid' (sur demande)
+SEARCH_MODES = ('vector', 'hybrid')
+MMR_ENABLED = os.getenv('RAG_MMR_ENABLED', 'False') == 'True'  # Diversification par défaut
+
+# Paramètres de génération
+COMPLETION_TEMPERATURE = 0.3  # Faible température pour plus de précision
+COMPLETION_MAX_TOKENS = 1500
+
+NO_CONTEXT_ANSWER = "Je n'ai pas trouvé d'information pertinente dans vos documents pour répondre à cette question."
+
+
+class AskValidationError(ValueError):
+    """Paramètres de requête invalides (réponse 400)."""
+    pass
+
+
+_TRUE_VALUES = {'true', '1', 'yes', 'on'}
+_FALSE_VALUES = {'false', '0', 'no', 'off'}
+
+
+def _parse_bool(value: Any, name: str) -> bool:
+    """Booléen JSON ou de formulaire ('true'/'false', '1'/'0'...)."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in _TRUE_VALUES:
+            return True
+        if lowered in _FALSE_VALUES:
+            return False
+    raise AskValidationError(f"Le champ '{name}' doit être un booléen")
+
+
+@dataclass
+class AskParams:
+    """Paramètres validés d'une question RAG."""
+    question: str
+    document_ids: Optional[List[int]]
+    top_k: int
+    search_mode: str
+    model: Optional[str]
+    use_cache: bool
+    compress_context: bool
+    mmr_lambda: Optional[float]  # None = pas de MMR
+    mmr_fetch_factor: int
+
+    @classmethod
+    def from_data(cls, data: Dict[str, Any]) -> "AskParams":
+        """
+        Valide le corps de la requête.
+
+        Raises:
+            AskValidationError: Si un champ est invalide
+        """
+        question = (data.get('question') or '').strip()
+
+        if not question:
+            raise AskValidationError("Le champ 'question' est requis")
+
+        if len(question) > MAX_QUESTION_LENGTH:
+            raise AskValidationError(f"La question est trop longue (max {MAX_QUESTION_LENGTH} caractères)")
+
+        try:
+            mmr_lambda = float(data.get('mmr_lambda', MMR_LAMBDA))
+            mmr_fetch_factor = int(data.get('mmr_fetch_factor', MMR_FETCH_FACTOR))
+        except (TypeError, ValueError):
+            raise AskValidationError("Les champs 'mmr_lambda' et 'mmr_fetch_factor' doivent être numériques")
+
+        if not (0.0 <= mmr_lambda <= 1.0) or not (1 <= mmr_fetch_factor <= 10):
+            raise AskValidationError("mmr_lambda doit être entre 0 et 1, mmr_fetch_factor entre 1 et 10")
+
+        try:
+            top_k = int(data.get('top_k', TOP_K_RESULTS))
+        except (TypeError, ValueError):
+            raise AskValidationError("Le champ 'top_k' doit être un entier")
+
+        if not (1 <= top_k <= MAX_TOP_K):
+            raise AskValidationError(f"top_k doit être entre 1 et {MAX_TOP_K}")
+
+        search_mode = data.get('search_mode') or SEARCH_MODE
+        if search_mode not in SEARCH_MODES:
+            raise AskValidationError(f"search_mode doit être l'un de: {', '.join(SEARCH_MODES)}")
+
+        document_ids = data.get('document_ids', None)
+        if document_ids is not None:
+            if hasattr(data, 'getlist'):
+                document_ids = data.getlist('document_ids')  # Formulaire: champ répété
+            try:
+                if isinstance(document_ids, (str, bytes)):
+                    raise TypeError(document_ids)
+                document_ids = [int(document_id) for document_id in document_ids]
+            except (TypeError, ValueError):
+                raise AskValidationError("Le champ 'document_ids' doit être une liste d'entiers")
+
+        compress_context = data.get('compress_context', None)
+        if compress_context is None:
+            compress_context = CONTEXT_COMPRESSION_ENABLED
+
+        return cls(
+            question=question,
+            document_ids=document_ids,
+            top_k=top_k,
+            search_mode=search_mode,
+            model=data.get('model', None),
+            use_cache=_parse_bool(data.get('use_cache', True), 'use_cache') and ANSWER_CACHE_ENABLED,
+            compress_context=_parse_bool(compress_context, 'compress_context'),
+            mmr_lambda=mmr_lambda if _parse_bool(data.get('mmr', MMR_ENABLED), 'mmr') else None,
+            mmr_fetch_factor=mmr_fetch_factor
+        )
+
+
+def create_rag_prompt(question: str, context: str) -> List[Dict[str, str]]:
+    """
+    Crée le prompt RAG complet pour le LLM.
+    
+    Args:
+        question: Question de l'utilisateur
+        context: Contexte extrait des documents
+    
+    Returns:
+        Liste de messages pour l'API de chat
+    """
+    system_prompt = """Tu es un assistant intelligent spécialisé dans l'analyse de documents.
+Ta mission est de répondre aux questions en te basant UNIQUEMENT sur le contexte fourni.
+
+RÈGLES IMPORTANTES:
+1. Base tes réponses EXCLUSIVEMENT sur le contexte fourni
+2. Si l'information n'est pas dans le contexte, dis-le clairement
+3. Cite toujours tes sources (titre du document, numéro de page)
+4. Sois précis et factuel
+5. Si tu n'es pas sûr, exprime ton incertitude
+6. Réponds en français de manière claire et structurée
+
+Format de réponse attendu:
+- Réponse directe et concise
+- Citations entre guillemets si pertinent
+- Références aux sources utilisées
+"""
+    
+    user_prompt = f"""{context}
+
+=== QUESTION DE L'UTILISATEUR ===
+{question}
+
+Réponds à cette question en te basant uniquement sur le contexte ci-dessus."""
+    
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    
+    return messages
+
+
+def format_sources(chunks: List["RetrievedChunk"]) -> List[Dict[str, Any]]:
+    """Formatage des sources pour la réponse."""
+    return [
+        {
+            "document_id": chunk.document_id,
+            "document_title": chunk.document_title,
+            "page": chunk.page_number,
+            "excerpt": chunk.content[:200] + "..." if len(chunk.content) > 200 else chunk.content,
+            "relevance_score": round(chunk.similarity_score, 3)
+        }
+        for chunk in chunks
+    ]
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Formate un évènement Server-Sent Events (JSON sur une ligne)."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class RagPipeline:
+    """
+    État et étapes d'une question RAG.
+
+    Ordre d'appel:
+    1. lookup_cached_answer()            (base: version des documents)
+    2. embedding de la question          (vue: get/aget_question_embedding)
+       dans `with pipeline.stage('embedding')`
+    3. lookup_similar_answer(embedding)
+    4. retrieve(embedding)               (base)
+    5. build_messages(chunks, embedding) (base si compression; choisit
+                                         le modèle: pipeline.routing)
+    6. complétion LLM                    (vue: chat/achat_completion
+                                         avec routing=pipeline.routing)
+       dans `with pipeline.stage('generation')`
+    7. complete(chunks, completion)      (QueryLog en file d'écriture)
+
+    En streaming (SSE), format_sources(chunks) est envoyé avant l'étape 6
+    et complete() est appelé une fois le flux terminé.
+    """
+
+    def __init__(self, user, params: AskParams, ai_router):
+        self.user = user
+        self.params = params
+        self.ai_router = ai_router
+        self.start_time = time.time()
+
+        self.answer_cache = get_answer_cache()
+        self.cache_bucket: Optional[str] = None
+        self.embedding_cached = False
+        self.retrieval_info: Dict[str, Any] = {}
+        self.packed_context: Optional[PackedContext] = None
+        self.routing: Optional["RoutingDecision"] = None
+        self.timings: Dict[str, int] = {}
+
+    def elapsed_ms(self) -> int:
+        return int((time.time() - self.start_time) * 1000)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Chronomètre une étape (embedding, retrieval, context, generation)."""
+        stage_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0) + int((time.perf_counter() - stage_start) * 1000)
+
+    def staff_metadata(self) -> Dict[str, Any]:
+        """Détail de la latence par étape, réservé au staff."""
+        if not getattr(self.user, 'is_staff', False):
+            return {}
+        return {"timings": dict(self.timings)}
+
+    # ----------------------------------------
+    # Cache de réponses
+    # ----------------------------------------
+
+    def lookup_cached_answer(self) -> Optional[Dict[str, Any]]:
+        """Même question (normalisée) sur le même ensemble de documents."""
+        from apps.documents.models import SourceDocument
+
+        if not self.params.use_cache:
+            return None
+
+        p = self.params
+        self.cache_bucket = self.answer_cache.bucket_key(
+            self.user.id,
+            SourceDocument.document_set_version(self.user, p.document_ids),
+            {
+                "document_ids": sorted(p.document_ids or []),
+                "top_k": p.top_k,
+                "search_mode": p.search_mode,
+                "model": p.model,
+                "compress_context": p.compress_context,
+                "mmr": [p.mmr_lambda, p.mmr_fetch_factor] if p.mmr_lambda is not None else None,
+            }
+        )
+
+        cached_answer = self.answer_cache.get_exact(self.cache_bucket, p.question)
+        if cached_answer is None:
+            return None
+        return self.cached_payload(cached_answer, 1.0)
+
+    def lookup_similar_answer(self, query_embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Question quasi identique (similarité des embeddings)."""
+        if self.cache_bucket is None:
+            return None
+
+        cached_answer, similarity = self.answer_cache.get_similar(self.cache_bucket, query_embedding)
+        if cached_answer is None:
+            return None
+        return self.cached_payload(cached_answer, similarity)
+
+    def cached_payload(self, cached_answer: Dict[str, Any], cache_similarity: float) -> Dict[str, Any]:
+        """Réponse servie depuis le cache sémantique (aucun appel LLM)."""
+        total_time_ms = self.elapsed_ms()
+
+        query_id = self.log_query(
+            response_text=cached_answer["answer"],
+            retrieved_chunks_count=cached_answer["chunks_retrieved"],
+            response_time_ms=total_time_ms,
+            tokens_used=0,
+            source_document_ids=[source["document_id"] for source in cached_answer["sources"]],
+            model_used=cached_answer["model_used"] or ""
+        )
+
+        logger.info(f"⚡ Réponse RAG servie depuis le cache en {total_time_ms}ms (similarité: {cache_similarity:.3f})")
+
+        return {
+            "answer": cached_answer["answer"],
+            "sources": cached_answer["sources"],
+            "metadata": {
+                "query_time_ms": total_time_ms,
+                "chunks_retrieved": cached_answer["chunks_retrieved"],
+                "tokens_used": 0,
+                "model_used": cached_answer["model_used"],
+                "cached": True,
+                "cache_similarity": round(cache_similarity, 4),
+                **self.staff_metadata(),
+                "query_id": query_id
+            }
+        }
+
+    # ----------------------------------------
+    # Récupération et contexte
+    # ----------------------------------------
+
+    def retrieve(self, query_embedding: List[float]) -> List["RetrievedChunk"]:
+        """Recherche des chunks pertinents (backend et stratégie automatiques)."""
+        p = self.params
+        logger.debug(f"🔎 Recherche des {p.top_k} chunks les plus pertinents...")
+
+        with self.stage('retrieval'):
+            chunks, self.retrieval_info = retrieve_chunks(
+                query_embedding=query_embedding,
+                user=self.user,
+                top_k=p.top_k,
+                similarity_threshold=SIMILARITY_THRESHOLD,
+                source_document_ids=p.document_ids,
+                mode=p.search_mode,
+                query_text=p.question,
+                mmr_lambda=p.mmr_lambda,
+                mmr_fetch_factor=p.mmr_fetch_factor
+            )
+        return chunks
+
+    def no_context_payload(self) -> Dict[str, Any]:
+        """Réponse quand aucun chunk pertinent n'a été trouvé."""
+        return {
+            "answer": NO_CONTEXT_ANSWER,
+            "sources": [],
+            "metadata": {
+                "query_time_ms": self.elapsed_ms(),
+                "chunks_retrieved": 0,
+                "tokens_used": 0,
+                "model_used": None,
+                "search_mode": self.params.search_mode,
+                "embedding_cached": self.embedding_cached,
+                **self.retrieval_info,
+                **self.staff_metadata()
+            }
+        }
+
+    def build_messages(
+        self,
+        chunks: List["RetrievedChunk"],
+        query_embedding: List[float],
+        allow_local: bool = True
+    ) -> List[Dict[str, str]]:
+        """
+        Choix du modèle, contexte sous son budget de tokens (compression
+        optionnelle) puis prompt.
+
+        Le routage par paliers se fait ici, avant le remplissage: chaque
+        palier disponible, du moins cher au plus capable, reçoit un contexte
+        construit pour son propre budget; le premier où tout le contexte
+        récupéré tient est retenu (sinon le dernier). La décision est gardée
+        dans self.routing pour la complétion.
+
+        Args:
+            allow_local: Autoriser un palier Ollama local (pas en streaming)
+        """
+        with self.stage('context'):
+            context_chunks = chunks
+            if self.params.compress_context:
+                context_chunks = compress_chunks(chunks, query_embedding)
+
+            router = self.ai_router.model_router
+            tiers = [] if self.params.model else router.available_tiers(allow_local)
+
+            for position, tier in enumerate(tiers):
+                self.packed_context = self._pack_context(context_chunks, tier.model, tier.max_prompt_tokens)
+                last = position == len(tiers) - 1
+                if self.packed_context.complete or last:
+                    messages = create_rag_prompt(self.params.question, self.packed_context.text)
+                    note = "" if self.packed_context.complete else f"{self.packed_context.spans_dropped} spans écartés"
+                    self.routing = router.tier_decision(
+                        tier,
+                        self.ai_router.estimate_prompt_tokens(messages, tier.model),
+                        note
+                    )
+                    return messages
+
+            # Modèle demandé, routage désactivé ou aucun palier disponible
+            self.routing = router.choose(0, requested_model=self.params.model, allow_local=allow_local)
+            self.packed_context = self._pack_context(context_chunks, self.routing.model)
+            return create_rag_prompt(self.params.question, self.packed_context.text)
+
+    def _pack_context(
+        self,
+        context_chunks: List["RetrievedChunk"],
+        model: str,
+        max_prompt_tokens: int = 0
+    ) -> PackedContext:
+        """
+        Contexte pour un modèle, compté avec son tokenizer.
+
+        Le budget est le plus petit entre celui du modèle (coût, qualité),
+        la place laissée dans sa fenêtre par les consignes, la question et la
+        réponse, et la limite de prompt du palier.
+        """
+        counter = self.ai_router.token_counter(model)
+        fixed_tokens = counter.count_messages(create_rag_prompt(self.params.question, ""))
+        token_budget = min(
+            context_token_budget(model),
+            counter.profile.context_window - COMPLETION_MAX_TOKENS - fixed_tokens
+        )
+        if max_prompt_tokens > 0:
+            token_budget = min(token_budget, max_prompt_tokens - fixed_tokens)
+
+        return pack_context(
+            context_chunks,
+            token_budget=max(0, token_budget),
+            count_tokens=counter.count,
+            truncate_text=counter.truncate
+        )
+
+    # ----------------------------------------
+    # Finalisation
+    # ----------------------------------------
+
+    def log_query(
+        self,
+        response_text: str,
+        retrieved_chunks_count: int,
+        response_time_ms: int,
+        tokens_used: int,
+        source_document_ids: List[int],
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        model_used: str = "",
+        routing_reason: Optional[str] = None,
+        estimated_prompt_tokens: int = 0,
+        estimated_completion_tokens: int = 0
+    ) -> int:
+        """
+        Enregistre la requête dans QueryLog et retourne son id.
+
+        Par défaut l'écriture est mise en file (QueryLogWriter) avec un id
+        pré-alloué; QUERY_LOG_ASYNC=False rétablit l'écriture immédiate.
+        """
+        from apps.documents.models import QueryLog
+
+        fields = dict(
+            query_text=self.params.question,
+            response_text=response_text,
+            retrieved_chunks_count=retrieved_chunks_count,
+            response_time_ms=response_time_ms,
+            tokens_used=tokens_used,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            model_used=model_used,
+            routing_reason=(routing_reason or "")[:255],
+            estimated_prompt_tokens=estimated_prompt_tokens,
+            estimated_completion_tokens=estimated_completion_tokens,
+            embedding_time_ms=self.timings.get('embedding'),
+            retrieval_time_ms=self.timings.get('retrieval'),
+            context_time_ms=self.timings.get('context'),
+            generation_time_ms=self.timings.get('generation')
+        )
+
+        if QUERY_LOG_ASYNC:
+            writer = get_query_log_writer()
+            query_id = writer.reserve_id()
+            writer.submit(QueryLogRecord(
+                id=query_id,
+                user_id=self.user.id,
+                source_document_ids=list(set(source_document_ids)),
+                **fields
+            ))
+            return query_id
+
+        with transaction.atomic():
+            query_log = QueryLog.objects.create(user=self.user, **fields)
+            
+            # Association avec les documents sources
+            query_log.source_documents.set(list(set(source_document_ids)))
+
+        return query_log.id
+
+    def complete(
+        self,
+        chunks: List["RetrievedChunk"],
+        query_embedding: List[float],
+        completion_result: "ChatCompletionResult"
+    ) -> Dict[str, Any]:
+        """Mise en cache, log de la requête et réponse finale."""
+        sources = format_sources(chunks)
+
+        # Mise en cache de la réponse complète
+        if self.cache_bucket is not None:
+            self.answer_cache.store(self.cache_bucket, self.params.question, query_embedding, {
+                "answer": completion_result.content,
+                "sources": sources,
+                "model_used": completion_result.model,
+                "chunks_retrieved": len(chunks),
+            })
+
+        total_time_ms = self.elapsed_ms()
+
+        # Log de la requête en DB (différé et groupé)
+        query_id = self.log_query(
+            response_text=completion_result.content,
+            retrieved_chunks_count=len(chunks),
+            response_time_ms=total_time_ms,
+            tokens_used=completion_result.tokens_used,
+            source_document_ids=[c.document_id for c in chunks],
+            prompt_tokens=completion_result.prompt_tokens,
+            completion_tokens=completion_result.completion_tokens,
+            model_used=completion_result.model,
+            routing_reason=completion_result.routing_reason,
+            estimated_prompt_tokens=completion_result.estimated_prompt_tokens,
+            estimated_completion_tokens=completion_result.estimated_completion_tokens
+        )
+
+        logger.info(
+            f"✅ Requête RAG terminée en {total_time_ms}ms - "
+            f"{len(chunks)} chunks, {completion_result.tokens_used} tokens - "
+            f"récupération: {self.retrieval_info.get('retriever')}/{self.retrieval_info.get('strategy')}"
+        )
+
+        return {
+            "answer": completion_result.content,
+            "sources": sources,
+            "metadata": {
+                "query_time_ms": total_time_ms,
+                "chunks_retrieved": len(chunks),
+                "tokens_used": completion_result.tokens_used,
+                "prompt_tokens": completion_result.prompt_tokens,
+                "completion_tokens": completion_result.completion_tokens,
+                "estimated_prompt_tokens": completion_result.estimated_prompt_tokens,
+                "estimated_completion_tokens": completion_result.estimated_completion_tokens,
+                "context_tokens": self.packed_context.estimated_tokens if self.packed_context else 0,
+                "context_compressed": self.params.compress_context,
+                "model_used": completion_result.model,
+                "routing_reason": completion_result.routing_reason,
+                "time_to_first_token_ms": completion_result.time_to_first_token_ms,
+                "search_mode": self.params.search_mode,
+                "embedding_cached": self.embedding_cached,
+                "cached": False,
+                **self.retrieval_info,
+                **self.staff_metadata(),
+                "query_id": query_id
+            }
+        }
@@ -0,0 +1,324 @@
+"""
+Écriture différée et groupée des QueryLog.
+
+Les questions RAG ne paient plus les allers-retours d'écriture du log
+(INSERT + table M2M dans une transaction): les enregistrements sont mis
+en file et un thread d'arrière-plan les insère par lots (bulk_create sur
+query_logs et sur la table de liaison des documents).
+
+L'identifiant du log reste connu immédiatement (query_id de la réponse):
+les ids sont pré-alloués par blocs depuis la séquence de la table.
+
+Chaque process a sa propre file: un log n'est visible des autres workers
+qu'après le prochain vidage (au plus QUERY_LOG_FLUSH_INTERVAL secondes).
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from django.db import connection, close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+QUERY_LOG_ASYNC = os.getenv('QUERY_LOG_ASYNC', 'True') == 'True'
+QUERY_LOG_FLUSH_INTERVAL = float(os.getenv('QUERY_LOG_FLUSH_INTERVAL', 1.0))  # secondes
+QUERY_LOG_BATCH_SIZE = int(os.getenv('QUERY_LOG_BATCH_SIZE', 200))
+QUERY_LOG_ID_BLOCK = int(os.getenv('QUERY_LOG_ID_BLOCK', 50))  # ids pré-alloués par requête SQL
+QUERY_LOG_MAX_PENDING = 10000  # Au-delà, les logs sont écrits de façon synchrone
+
+
+@dataclass
+class QueryLogRecord:
+    """Champs d'un QueryLog en attente d'écriture."""
+    id: int
+    user_id: int
+    query_text: str
+    response_text: str
+    retrieved_chunks_count: int
+    response_time_ms: int
+    tokens_used: int
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    model_used: str = ""
+    routing_reason: str = ""
+    estimated_prompt_tokens: int = 0
+    estimated_completion_tokens: int = 0
+    embedding_time_ms: Optional[int] = None
+    retrieval_time_ms: Optional[int] = None
+    context_time_ms: Optional[int] = None
+    generation_time_ms: Optional[int] = None
+    source_document_ids: List[int] = field(default_factory=list)
+
+
+class QueryLogWriter:
+    """
+    File d'écriture des QueryLog, vidée par lots par un thread démon.
+
+    Le thread est (re)démarré à la demande et après un fork (workers
+    gunicorn/celery): chaque process a sa propre file.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = QUERY_LOG_FLUSH_INTERVAL,
+        batch_size: int = QUERY_LOG_BATCH_SIZE,
+        id_block: int = QUERY_LOG_ID_BLOCK
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.id_block = id_block
+
+        self._queue: "queue.Queue[QueryLogRecord]" = queue.Queue()
+        self._flush_lock = threading.Lock()
+        self._ids_lock = threading.Lock()
+        self._reserved_ids: List[int] = []
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+
+        self.written = 0
+        self.failed = 0
+
+    # ----------------------------------------
+    # Identifiants
+    # ----------------------------------------
+
+    def reserve_id(self) -> int:
+        """Retourne un id de QueryLog réservé (bloc de nextval() si besoin)."""
+        self._reset_after_fork()
+        with self._ids_lock:
+            if not self._reserved_ids:
+                self._reserved_ids = self._allocate_ids(self.id_block)
+            return self._reserved_ids.pop(0)
+
+    @staticmethod
+    def _allocate_ids(count: int) -> List[int]:
+        from apps.documents.models import QueryLog
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                [QueryLog._meta.db_table, count]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _reset_after_fork(self) -> None:
+        """
+        Process fils (fork): la file et les ids réservés du parent ne sont pas
+        à nous (le parent écrira ses logs lui-même; les réécrire ici
+        échouerait sur des ids en double).
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._ids_lock:
+            if self._pid != pid:
+                self._queue = queue.Queue()
+                self._reserved_ids = []
+                self._flush_lock = threading.Lock()  # Peut-être tenu par le thread du parent
+                self._thread = None
+                self._pid = pid
+
+    # ----------------------------------------
+    # File d'écriture
+    # ----------------------------------------
+
+    def submit(self, record: QueryLogRecord) -> None:
+        """Met un log en file (écriture synchrone si la file déborde)."""
+        self._reset_after_fork()
+        if self._queue.qsize() >= QUERY_LOG_MAX_PENDING:
+            logger.warning("⚠️ File des QueryLog pleine, écriture synchrone")
+            self._write([record])
+            return
+
+        self._ensure_thread()
+        self._queue.put(record)
+
+    def flush(self) -> int:
+        """
+        Écrit immédiatement tous les logs en attente. Retourne le nombre écrit.
+
+        Si la base est injoignable, le lot en cours est remis en file pour le
+        prochain vidage et le vidage s'arrête.
+        """
+        self._reset_after_fork()
+        total = 0
+        with self._flush_lock:
+            while True:
+                batch = self._drain(self.batch_size)
+                if not batch:
+                    break
+                try:
+                    total += self._write(batch)
+                except Exception as e:
+                    self._requeue(batch, e)
+                    break
+        return total
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _requeue(self, records: List[QueryLogRecord], error: Exception) -> None:
+        """Remet en file un lot non écrit (perdu si la file déborde)."""
+        if self._queue.qsize() + len(records) > QUERY_LOG_MAX_PENDING:
+            self.failed += len(records)
+            logger.error(f"❌ {len(records)} QueryLog perdus (file pleine): {str(error)}")
+            return
+
+        logger.warning(f"⚠️ Écriture de {len(records)} QueryLog reportée: {str(error)}")
+        for record in records:
+            self._queue.put(record)
+
+    def _drain(self, limit: int) -> List[QueryLogRecord]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, records: List[QueryLogRecord]) -> int:
+        """
+        Deux INSERT groupés: query_logs puis la table de liaison M2M.
+
+        Si le lot échoue (document ou utilisateur supprimé entre-temps), les
+        logs sont réécrits un par un: seuls ceux qui ne peuvent pas l'être
+        sont perdus.
+        """
+        from apps.documents.models import QueryLog
+
+        Link = QueryLog.source_documents.through
+        logs, links = self._build(records)
+
+        try:
+            with transaction.atomic():
+                QueryLog.objects.bulk_create(logs)
+                if links:
+                    Link.objects.bulk_create(links)
+        except Exception as e:
+            logger.warning(f"⚠️ Écriture groupée de {len(records)} QueryLog échouée, écriture unitaire: {str(e)}")
+            return self._write_each(records)
+
+        self.written += len(records)
+        logger.debug(f"📝 {len(records)} QueryLog écrits ({len(links)} liens documents)")
+        return len(records)
+
+    def _write_each(self, records: List[QueryLogRecord]) -> int:
+        """Écrit les logs un par un, sans les liens vers des documents supprimés."""
+        from apps.documents.models import QueryLog, SourceDocument
+
+        Link = QueryLog.source_documents.through
+        existing_documents = set(SourceDocument.objects.filter(
+            id__in={document_id for r in records for document_id in r.source_document_ids}
+        ).values_list('id', flat=True))
+
+        written = 0
+        for record in records:
+            record.source_document_ids = [d for d in record.source_document_ids if d in existing_documents]
+            (log,), links = self._build([record])
+            try:
+                with transaction.atomic():
+                    log.save(force_insert=True)
+                    if links:
+                        Link.objects.bulk_create(links)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"❌ Écriture du QueryLog {record.id} échouée: {str(e)}")
+                continue
+            written += 1
+
+        self.written += written
+        return written
+
+    @staticmethod
+    def _build(records: List[QueryLogRecord]):
+        """Instances QueryLog et lignes de la table de liaison (non sauvegardées)."""
+        from apps.documents.models import QueryLog
+
+        Link = QueryLog.source_documents.through
+        logs = [
+            QueryLog(
+                id=r.id,
+                user_id=r.user_id,
+                query_text=r.query_text,
+                response_text=r.response_text,
+                retrieved_chunks_count=r.retrieved_chunks_count,
+                response_time_ms=r.response_time_ms,
+                tokens_used=r.tokens_used,
+                prompt_tokens=r.prompt_tokens,
+                completion_tokens=r.completion_tokens,
+                model_used=r.model_used,
+                routing_reason=r.routing_reason,
+                estimated_prompt_tokens=r.estimated_prompt_tokens,
+                estimated_completion_tokens=r.estimated_completion_tokens,
+                embedding_time_ms=r.embedding_time_ms,
+                retrieval_time_ms=r.retrieval_time_ms,
+                context_time_ms=r.context_time_ms,
+                generation_time_ms=r.generation_time_ms
+            )
+            for r in records
+        ]
+        links = [
+            Link(querylog_id=r.id, sourcedocument_id=document_id)
+            for r in records
+            for document_id in set(r.source_document_ids)
+        ]
+        return logs, links
+
+    # ----------------------------------------
+    # Thread d'arrière-plan
+    # ----------------------------------------
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        # Après un fork, le thread du parent n'existe pas dans le fils
+        with self._flush_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='query-log-writer',
+                    daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        stop = threading.Event()
+        while not stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                # Le thread doit survivre: sinon plus aucun log n'est écrit
+                logger.error(f"❌ Vidage des QueryLog échoué: {str(e)}")
+            finally:
+                close_old_connections()
+
+
+# ========================================
+# SINGLETON
+# ========================================
+
+_query_log_writer: Optional[QueryLogWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_query_log_writer() -> QueryLogWriter:
+    """Retourne le writer de QueryLog du process."""
+    global _query_log_writer
+    if _query_log_writer is None:
+        with _writer_lock:
+            if _query_log_writer is None:
+                _query_log_writer = QueryLogWriter()
+                atexit.register(_query_log_writer.flush)
+    return _query_log_writer
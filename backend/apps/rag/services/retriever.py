@@ -0,0 +1,408 @@
+"""
+Récupération des chunks pertinents pour le RAG.
+
+Deux backends:
+- pgvector (SQL): recherche vectorielle ou hybride dans PostgreSQL
+- Mémoire (NumPy): recherche exacte sur une matrice en cache process-local,
+  utilisée quand la question est limitée à quelques petits documents
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
+import threading
+import logging
+import os
+
+import numpy as np
+
+from apps.core.vectors import truncate_embeddings
+
+if TYPE_CHECKING:
+    from apps.documents.models import RetrievedChunk
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+# Nombre maximal de chunks dans le périmètre pour basculer en recherche mémoire
+IN_MEMORY_MAX_CHUNKS = int(os.getenv('RAG_IN_MEMORY_MAX_CHUNKS', 2000))
+
+# Budget mémoire du cache de matrices (Mo, par process)
+IN_MEMORY_CACHE_MAX_MB = int(os.getenv('RAG_IN_MEMORY_CACHE_MAX_MB', 128))
+
+# Diversification MMR: compromis pertinence/diversité et sur-échantillonnage
+MMR_LAMBDA = float(os.getenv('RAG_MMR_LAMBDA', 0.7))
+MMR_FETCH_FACTOR = int(os.getenv('RAG_MMR_FETCH_FACTOR', 4))
+
+
+class RetrieverBackend:
+    """Backends de récupération disponibles."""
+    PGVECTOR = 'pgvector'
+    MEMORY = 'memory'
+
+
+# ========================================
+# CACHE DE MATRICES (LRU PROCESS-LOCAL)
+# ========================================
+
+@dataclass
+class DocumentMatrix:
+    """Vecteurs d'un document chargés en mémoire."""
+    chunk_ids: np.ndarray        # int64, shape (n,)
+    vectors: np.ndarray          # float32, shape (n, d)
+    squared_norms: np.ndarray    # float32, shape (n,)
+
+    @property
+    def nbytes(self) -> int:
+        return self.chunk_ids.nbytes + self.vectors.nbytes + self.squared_norms.nbytes
+
+
+class InMemoryVectorIndex:
+    """
+    Cache LRU des matrices d'embeddings par document.
+
+    Clé: (document_id, processed_at). Un document retraité obtient un nouveau
+    processed_at et n'est donc jamais servi depuis une entrée périmée;
+    invalidate_document() libère en plus la mémoire immédiatement.
+    """
+
+    def __init__(self, max_bytes: int = IN_MEMORY_CACHE_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[int, Any], DocumentMatrix]" = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+
+    def _get(self, key: Tuple[int, Any]) -> Optional[DocumentMatrix]:
+        with self._lock:
+            matrix = self._entries.get(key)
+            if matrix is not None:
+                self._entries.move_to_end(key)
+            return matrix
+
+    def _put(self, key: Tuple[int, Any], matrix: DocumentMatrix) -> None:
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = matrix
+            self._current_bytes += matrix.nbytes
+
+            # Éviction LRU jusqu'à repasser sous le budget
+            while self._current_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._current_bytes -= evicted.nbytes
+
+    def invalidate_document(self, document_id: int) -> None:
+        """Supprime toutes les entrées d'un document (retraitement, suppression)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == document_id]:
+                self._current_bytes -= self._entries.pop(key).nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def _load_document(self, document_id: int) -> DocumentMatrix:
+        """Charge les vecteurs d'un document depuis PostgreSQL (une requête)."""
+        from apps.documents.models import DocumentChunk
+
+        rows = list(
+            DocumentChunk.objects
+            .filter(source_document_id=document_id)
+            .order_by('chunk_index')
+            .values_list('id', 'embedding')
+        )
+
+        if rows:
+            chunk_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+            vectors = np.vstack([r[1] for r in rows]).astype(np.float32, copy=False)
+        else:
+            chunk_ids = np.empty(0, dtype=np.int64)
+            vectors = np.empty((0, 0), dtype=np.float32)
+
+        return DocumentMatrix(
+            chunk_ids=chunk_ids,
+            vectors=vectors,
+            squared_norms=np.einsum('ij,ij->i', vectors, vectors)
+        )
+
+    @staticmethod
+    def _truncate(matrix: DocumentMatrix, dimensions: int) -> DocumentMatrix:
+        if matrix.vectors.shape[1] == dimensions:
+            return matrix
+        vectors = truncate_embeddings(matrix.vectors, dimensions)
+        return DocumentMatrix(
+            chunk_ids=matrix.chunk_ids,
+            vectors=vectors,
+            squared_norms=np.einsum('ij,ij->i', vectors, vectors)
+        )
+
+    def get_matrix(self, document_id: int, processed_at: Any) -> DocumentMatrix:
+        """Retourne la matrice d'un document, chargée au besoin."""
+        key = (document_id, processed_at)
+        matrix = self._get(key)
+        if matrix is None:
+            matrix = self._load_document(document_id)
+            self._put(key, matrix)
+            logger.debug(f"🧮 Matrice chargée en mémoire - Document {document_id}: {len(matrix.chunk_ids)} vecteurs")
+        return matrix
+
+    def search(
+        self,
+        query_embedding: List[float],
+        documents: List[Tuple[int, Any]],
+        top_k: int
+    ) -> List[Tuple[int, float]]:
+        """
+        Top-k exact par distance L2 sur les documents donnés.
+
+        Args:
+            query_embedding: Vecteur de la question
+            documents: Liste de (document_id, processed_at)
+            top_k: Nombre de résultats
+
+        Returns:
+            Liste de (chunk_id, distance) triée par distance croissante
+        """
+        matrices = [self.get_matrix(doc_id, processed_at) for doc_id, processed_at in documents]
+        matrices = [m for m in matrices if len(m.chunk_ids)]
+        if not matrices:
+            return []
+
+        # Pendant une réduction de dimension, matrices en cache, matrices
+        # relues et question peuvent différer: tout ramener à la plus petite
+        query = np.asarray(query_embedding, dtype=np.float32)
+        dimensions = min(query.shape[0], *(m.vectors.shape[1] for m in matrices))
+        query = truncate_embeddings(query, dimensions)
+        matrices = [self._truncate(m, dimensions) for m in matrices]
+
+        if len(matrices) == 1:
+            chunk_ids, vectors, squared_norms = matrices[0].chunk_ids, matrices[0].vectors, matrices[0].squared_norms
+        else:
+            chunk_ids = np.concatenate([m.chunk_ids for m in matrices])
+            vectors = np.vstack([m.vectors for m in matrices])
+            squared_norms = np.concatenate([m.squared_norms for m in matrices])
+
+        # ||a - q||² = ||a||² + ||q||² - 2 a·q  (un seul produit matrice-vecteur)
+        squared = squared_norms + np.dot(query, query) - 2.0 * (vectors @ query)
+        distances = np.sqrt(np.maximum(squared, 0.0))
+
+        k = min(top_k, len(distances))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+
+        return [(int(chunk_ids[i]), float(distances[i])) for i in top]
+
+
+_vector_index_instance: Optional[InMemoryVectorIndex] = None
+
+def get_vector_index() -> InMemoryVectorIndex:
+    """Retourne le cache de matrices du process courant."""
+    global _vector_index_instance
+    if _vector_index_instance is None:
+        _vector_index_instance = InMemoryVectorIndex()
+    return _vector_index_instance
+
+
+# ========================================
+# DIVERSIFICATION (MAXIMAL MARGINAL RELEVANCE)
+# ========================================
+
+def mmr_select(
+    query_vector: np.ndarray,
+    candidate_vectors: np.ndarray,
+    top_k: int,
+    lambda_mult: float = MMR_LAMBDA
+) -> List[int]:
+    """
+    Sélection MMR: à chaque étape, le candidat maximisant
+    lambda * sim(question) - (1 - lambda) * max sim(déjà sélectionnés).
+
+    Args:
+        query_vector: Vecteur de la question, shape (d,)
+        candidate_vectors: Vecteurs candidats, shape (n, d)
+        top_k: Nombre de candidats à sélectionner
+        lambda_mult: 1.0 = pertinence pure, 0.0 = diversité pure
+
+    Returns:
+        Indices des candidats sélectionnés, dans l'ordre de sélection
+    """
+    n = len(candidate_vectors)
+    if n == 0:
+        return []
+
+    # Normalisation: les produits scalaires deviennent des cosinus
+    vectors = candidate_vectors / np.maximum(np.linalg.norm(candidate_vectors, axis=1, keepdims=True), 1e-12)
+    query = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+
+    relevance = vectors @ query
+    pairwise = vectors @ vectors.T
+
+    selected: List[int] = []
+    max_redundancy = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+
+    for _ in range(min(top_k, n)):
+        redundancy = np.where(np.isfinite(max_redundancy), max_redundancy, 0.0)
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        max_redundancy = np.maximum(max_redundancy, pairwise[:, pick])
+
+    return selected
+
+
+def diversify_mmr(
+    query_embedding: List[float],
+    candidates: List["RetrievedChunk"],
+    top_k: int,
+    lambda_mult: float = MMR_LAMBDA
+) -> List["RetrievedChunk"]:
+    """
+    Re-classe des candidats sur-échantillonnés par MMR.
+    Charge les vecteurs des seuls candidats (une requête).
+    """
+    from apps.documents.models import DocumentChunk
+
+    if len(candidates) <= top_k:
+        return candidates
+
+    vectors_by_id = dict(
+        DocumentChunk.objects.filter(
+            id__in=[c.chunk_id for c in candidates]
+        ).values_list('id', 'embedding')
+    )
+    candidates = [c for c in candidates if c.chunk_id in vectors_by_id]
+    if not candidates:
+        return []
+
+    matrix = np.vstack([vectors_by_id[c.chunk_id] for c in candidates]).astype(np.float32, copy=False)
+    picks = mmr_select(np.asarray(query_embedding, dtype=np.float32), matrix, top_k, lambda_mult)
+
+    return [candidates[i] for i in picks]
+
+
+# ========================================
+# POINT D'ENTRÉE DE LA RÉCUPÉRATION
+# ========================================
+
+def _search_in_memory(
+    query_embedding: List[float],
+    documents: List[Tuple[int, Any]],
+    top_k: int,
+    similarity_threshold: float
+) -> List["RetrievedChunk"]:
+    """Recherche exacte en mémoire, puis projection des seuls chunks retenus."""
+    from django.db.models import F
+    from apps.documents.models import DocumentChunk, RetrievedChunk
+
+    hits = get_vector_index().search(query_embedding, documents, top_k)
+    hits = [(chunk_id, distance) for chunk_id, distance in hits
+            if 1.0 / (1.0 + distance) >= similarity_threshold]
+    if not hits:
+        return []
+
+    columns = [c for c in DocumentChunk.RESULT_COLUMNS if c != 'distance']
+    rows = {
+        row[0]: row for row in DocumentChunk.objects.filter(
+            id__in=[chunk_id for chunk_id, _ in hits]
+        ).annotate(
+            document_title=F('source_document__title')
+        ).values_list(*columns)
+    }
+
+    return [
+        RetrievedChunk.from_row((*rows[chunk_id], distance))
+        for chunk_id, distance in hits
+        if chunk_id in rows
+    ]
+
+
+def retrieve_chunks(
+    query_embedding: List[float],
+    user,
+    top_k: int,
+    similarity_threshold: float,
+    source_document_ids: Optional[List[int]] = None,
+    mode: str = 'vector',
+    query_text: Optional[str] = None,
+    mmr_lambda: Optional[float] = None,
+    mmr_fetch_factor: int = MMR_FETCH_FACTOR
+) -> Tuple[List["RetrievedChunk"], Dict[str, Any]]:
+    """
+    Récupère les chunks pertinents en choisissant le backend et la stratégie.
+
+    1. Estimation du nombre de chunks candidats (total_chunks des documents)
+    2. Question limitée à quelques documents (sous IN_MEMORY_MAX_CHUNKS) en
+       mode vectoriel: recherche exacte dans le cache NumPy, sans pgvector
+    3. Sinon search_similar, en calcul exact ou ANN selon la sélectivité
+    4. Si mmr_lambda est fourni: sur-échantillonnage (top_k * mmr_fetch_factor)
+       puis sélection diversifiée par MMR
+
+    Returns:
+        Tuple (chunks récupérés, infos de récupération pour les métadonnées)
+    """
+    from apps.documents.models import SourceDocument, DocumentChunk
+
+    fetch_k = top_k * max(mmr_fetch_factor, 1) if mmr_lambda is not None else top_k
+    info: Dict[str, Any] = {}
+
+    if source_document_ids:
+        documents = list(
+            SourceDocument.objects.filter(
+                id__in=source_document_ids,
+                user=user,
+                processing_status=SourceDocument.ProcessingStatus.COMPLETED
+            ).values_list('id', 'processed_at', 'total_chunks')
+        )
+        estimated_candidates = sum(total for _, _, total in documents)
+    else:
+        documents = []
+        estimated_candidates = DocumentChunk.estimate_candidates(user)
+
+    if source_document_ids and mode == DocumentChunk.SearchMode.VECTOR and estimated_candidates <= IN_MEMORY_MAX_CHUNKS:
+        results = _search_in_memory(
+            query_embedding,
+            [(doc_id, processed_at) for doc_id, processed_at, _ in documents],
+            fetch_k,
+            similarity_threshold
+        )
+        info.update({
+            "retriever": RetrieverBackend.MEMORY,
+            "strategy": DocumentChunk.SearchStrategy.EXACT.value,
+        })
+    else:
+        strategy = DocumentChunk.choose_search_strategy(
+            user,
+            source_document_ids,
+            estimated_candidates=estimated_candidates
+        )
+        results = DocumentChunk.search_similar(
+            query_embedding=query_embedding,
+            user=user,
+            top_k=fetch_k,
+            similarity_threshold=similarity_threshold,
+            source_document_ids=source_document_ids,
+            mode=mode,
+            query_text=query_text,
+            strategy=strategy
+        )
+        info.update({
+            "retriever": RetrieverBackend.PGVECTOR,
+            "strategy": str(strategy),
+        })
+
+    info["estimated_candidates"] = estimated_candidates
+
+    if mmr_lambda is not None:
+        results = diversify_mmr(query_embedding, results, top_k, mmr_lambda)
+        info["mmr"] = {"lambda": mmr_lambda, "fetch_k": fetch_k}
+
+    return results, info
@@ -0,0 +1,22 @@
+"""
+Signaux de l'app RAG: invalidation des caches quand les documents changent.
+"""
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.documents.models import SourceDocument
+from apps.rag.services.retriever import get_vector_index
+
+
+@receiver(post_save, sender=SourceDocument)
+def invalidate_on_reprocessing(sender, instance: SourceDocument, **kwargs):
+    """Un document qui n'est plus COMPLETED (retraitement) sort du cache mémoire."""
+    if instance.processing_status != SourceDocument.ProcessingStatus.COMPLETED:
+        get_vector_index().invalidate_document(instance.pk)
+
+
+@receiver(post_delete, sender=SourceDocument)
+def invalidate_on_delete(sender, instance: SourceDocument, **kwargs):
+    """Un document supprimé sort du cache mémoire."""
+    get_vector_index().invalidate_document(instance.pk)
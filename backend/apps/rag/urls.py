@@ -2,12 +2,22 @@
 URLs pour l'app RAG
 """
 from django.urls import path
-from .views import AskDocumentView, DocumentStatsView, RateFeedbackView
+from .views import (
+    AskDocumentView,
+    AskDocumentAsyncView,
+    AskDocumentStreamView,
+    DocumentStatsView,
+    ProviderHealthView,
+    RateFeedbackView,
+)
 
 app_name = 'rag'
 
 urlpatterns = [
     path('ask/', AskDocumentView.as_view(), name='ask-document'),
+    path('ask/stream/', AskDocumentStreamView.as_view(), name='ask-document-stream'),
+    path('ask/async/', AskDocumentAsyncView.as_view(), name='ask-document-async'),
     path('stats/', DocumentStatsView.as_view(), name='document-stats'),
     path('feedback/', RateFeedbackView.as_view(), name='rate-feedback'),
+    path('health/', ProviderHealthView.as_view(), name='provider-health'),
 ]
@@ -6,120 +6,40 @@ Gère les requêtes utilisateur et génère des réponses contextuelles.
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
-from django.utils import timezone
-from django.db import transaction
-from typing import List, Dict, Any, Optional
-import time
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
+from typing import Dict, Any
+import json
 import logging
 
 # Import des modèles (ajustez selon votre structure)
 # from apps.documents.models import SourceDocument, DocumentChunk, QueryLog
 # from apps.core.ai_router import get_ai_router, ChatMessage
 
-logger = logging.getLogger(__name__)
-
-
-# ========================================
-# CONFIGURATION RAG
-# ========================================
-
-TOP_K_RESULTS = 5  # Nombre de chunks à récupérer
-SIMILARITY_THRESHOLD = 0.6  # Seuil de pertinence (0-1)
-MAX_CONTEXT_LENGTH = 3000  # Caractères max dans le contexte
-
-
-# ========================================
-# CONSTRUCTION DU CONTEXTE RAG
-# ========================================
-
-def build_rag_context(
-    retrieved_chunks: List[Dict[str, Any]],
-    max_length: int = MAX_CONTEXT_LENGTH
-) -> str:
-    """
-    Construit le contexte RAG à partir des chunks récupérés.
-    
-    Args:
-        retrieved_chunks: Liste de chunks avec scores de similarité
-        max_length: Longueur maximale du contexte en caractères
-    
-    Returns:
-        Contexte formaté pour le LLM
-    """
-    if not retrieved_chunks:
-        return "Aucun contexte pertinent trouvé dans les documents."
-    
-    context_parts = []
-    current_length = 0
-    
-    for idx, chunk_data in enumerate(retrieved_chunks, start=1):
-        chunk = chunk_data['chunk']
-        score = chunk_data['similarity_score']
-        source = chunk_data['source_document']
-        page = chunk_data.get('page_number', 'N/A')
-        
-        # Format: [Source X, Page Y, Score: Z.ZZ] Contenu...
-        header = f"[Source: {source.title}, Page: {page}, Pertinence: {score:.2f}]\n"
-        content = chunk.content.strip()
-        
-        chunk_text = f"{header}{content}\n\n"
-        
-        # Vérification de la longueur
-        if current_length + len(chunk_text) > max_length:
-            break
-        
-        context_parts.append(chunk_text)
-        current_length += len(chunk_text)
-    
-    context = "=== CONTEXTE EXTRAIT DES DOCUMENTS ===\n\n" + "".join(context_parts)
-    
-    logger.debug(f"📄 Contexte RAG construit: {len(context_parts)} chunks, {current_length} caractères")
-    
-    return context
+from apps.core.ai_router import OllamaUnavailableError, OpenRouterUnavailableError, PromptTooLargeError
+from apps.rag.services.pipeline import (
+    AskParams,
+    AskValidationError,
+    RagPipeline,
+    format_sources,
+    sse_event,
+    COMPLETION_TEMPERATURE,
+    COMPLETION_MAX_TOKENS,
+)
 
+logger = logging.getLogger(__name__)
 
-def create_rag_prompt(question: str, context: str) -> List[Dict[str, str]]:
-    """
-    Crée le prompt RAG complet pour le LLM.
-    
-    Args:
-        question: Question de l'utilisateur
-        context: Contexte extrait des documents
-    
-    Returns:
-        Liste de messages pour l'API de chat
-    """
-    system_prompt = """Tu es un assistant intelligent spécialisé dans l'analyse de documents.
-Ta mission est de répondre aux questions en te basant UNIQUEMENT sur le contexte fourni.
-
-RÈGLES IMPORTANTES:
-1. Base tes réponses EXCLUSIVEMENT sur le contexte fourni
-2. Si l'information n'est pas dans le contexte, dis-le clairement
-3. Cite toujours tes sources (titre du document, numéro de page)
-4. Sois précis et factuel
-5. Si tu n'es pas sûr, exprime ton incertitude
-6. Réponds en français de manière claire et structurée
-
-Format de réponse attendu:
-- Réponse directe et concise
-- Citations entre guillemets si pertinent
-- Références aux sources utilisées
-"""
-    
-    user_prompt = f"""{context}
 
-=== QUESTION DE L'UTILISATEUR ===
-{question}
+# Fournisseur IA en panne (disjoncteur ouvert): 503 immédiat plutôt qu'une attente
+PROVIDER_UNAVAILABLE_ERRORS = (OllamaUnavailableError, OpenRouterUnavailableError)
+PROVIDER_UNAVAILABLE_MESSAGE = "Le service IA est momentanément indisponible, veuillez réessayer dans quelques instants"
 
-Réponds à cette question en te basant uniquement sur le contexte ci-dessus."""
-    
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt}
-    ]
-    
-    return messages
+# Prompt refusé avant l'appel (fenêtre de contexte du modèle dépassée): rien n'est facturé
+PROMPT_TOO_LARGE_MESSAGE = "La question et son contexte dépassent la capacité du modèle, veuillez raccourcir la question"
 
 
 # ========================================
@@ -135,6 +55,12 @@ class AskDocumentView(APIView):
         "question": "Quelle est la conclusion du rapport?",
         "document_ids": [1, 2, 3],  # Optionnel: filtrer par documents
         "top_k": 5,  # Optionnel: nombre de chunks à récupérer
+        "search_mode": "hybrid",  # Optionnel: 'vector' ou 'hybrid'
+        "use_cache": true,  # Optionnel: réutiliser une réponse en cache
+        "compress_context": false,  # Optionnel: ne garder que les phrases pertinentes
+        "mmr": true,  # Optionnel: diversification MMR des chunks
+        "mmr_lambda": 0.7,  # Optionnel: 1.0 = pertinence pure, 0.0 = diversité pure
+        "mmr_fetch_factor": 4,  # Optionnel: sur-échantillonnage avant MMR
         "model": "anthropic/claude-3.5-sonnet"  # Optionnel: modèle LLM
     }
     
@@ -162,124 +88,73 @@ class AskDocumentView(APIView):
     def post(self, request):
         """Traite une question utilisateur via RAG."""
         
-        start_time = time.time()
-        
         # 1. Validation des données d'entrée
-        question = request.data.get('question', '').strip()
-        document_ids = request.data.get('document_ids', None)
-        top_k = request.data.get('top_k', TOP_K_RESULTS)
-        model = request.data.get('model', None)
-        
-        if not question:
-            return Response(
-                {"error": "Le champ 'question' est requis"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        if len(question) > 1000:
-            return Response(
-                {"error": "La question est trop longue (max 1000 caractères)"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        try:
+            params = AskParams.from_data(request.data)
+        except AskValidationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        logger.info(f"🔍 Nouvelle requête RAG: '{question[:100]}...' (user: {request.user.username})")
+        logger.info(f"🔍 Nouvelle requête RAG: '{params.question[:100]}...' (user: {request.user.username})")
         
         try:
             # Import ici pour éviter les imports circulaires
-            from apps.documents.models import DocumentChunk, QueryLog
             from apps.core.ai_router import get_ai_router
+            from apps.rag.services.embedding_cache import get_question_embedding
             
             ai_router = get_ai_router()
+            pipeline = RagPipeline(request.user, params, ai_router)
             
-            # 2. Génération de l'embedding de la question (local Ollama)
+            # 2a. Cache de réponses: même question sur le même ensemble de documents
+            cached = pipeline.lookup_cached_answer()
+            if cached is not None:
+                return Response(cached, status=status.HTTP_200_OK)
+            
+            # 2b. Embedding de la question (cache LRU/Redis, sinon local Ollama)
             logger.debug("📊 Génération de l'embedding de la question...")
-            embedding_result = ai_router.get_embedding(
-                text=question,
-                normalize=True
-            )
+            with pipeline.stage('embedding'):
+                query_embedding, pipeline.embedding_cached = get_question_embedding(ai_router, params.question)
             
-            # 3. Recherche vectorielle de similarité (SQL avec pgvector)
-            logger.debug(f"🔎 Recherche des {top_k} chunks les plus pertinents...")
-            retrieved_chunks = DocumentChunk.search_similar(
-                query_embedding=embedding_result.embedding,
-                user=request.user,
-                top_k=top_k,
-                similarity_threshold=SIMILARITY_THRESHOLD,
-                source_document_ids=document_ids
-            )
+            # 2c. Cache de réponses: question quasi identique (similarité des embeddings)
+            cached = pipeline.lookup_similar_answer(query_embedding)
+            if cached is not None:
+                return Response(cached, status=status.HTTP_200_OK)
             
+            # 3. Recherche vectorielle de similarité (SQL avec pgvector)
+            retrieved_chunks = pipeline.retrieve(query_embedding)
             if not retrieved_chunks:
-                return Response({
-                    "answer": "Je n'ai pas trouvé d'information pertinente dans vos documents pour répondre à cette question.",
-                    "sources": [],
-                    "metadata": {
-                        "query_time_ms": int((time.time() - start_time) * 1000),
-                        "chunks_retrieved": 0,
-                        "tokens_used": 0,
-                        "model_used": None
-                    }
-                }, status=status.HTTP_200_OK)
-            
-            # 4. Construction du contexte RAG
-            context = build_rag_context(retrieved_chunks)
+                return Response(pipeline.no_context_payload(), status=status.HTTP_200_OK)
             
-            # 5. Génération de la réponse via OpenRouter
-            logger.debug(f"🤖 Génération de la réponse via LLM...")
-            messages = create_rag_prompt(question, context)
-            
-            completion_result = ai_router.chat_completion(
-                messages=messages,
-                model=model,
-                temperature=0.3,  # Faible température pour plus de précision
-                max_tokens=1500
-            )
+            # 4. Construction du contexte RAG (budget de tokens du modèle)
+            messages = pipeline.build_messages(retrieved_chunks, query_embedding)
             
-            # 6. Formatage des sources pour la réponse
-            sources = []
-            for chunk_data in retrieved_chunks:
-                sources.append({
-                    "document_id": chunk_data['source_document'].id,
-                    "document_title": chunk_data['source_document'].title,
-                    "page": chunk_data.get('page_number', None),
-                    "excerpt": chunk_data['content'][:200] + "..." if len(chunk_data['content']) > 200 else chunk_data['content'],
-                    "relevance_score": round(chunk_data['similarity_score'], 3)
-                })
-            
-            # 7. Calcul du temps total
-            total_time_ms = int((time.time() - start_time) * 1000)
-            
-            # 8. Log de la requête en DB (async dans une transaction)
-            with transaction.atomic():
-                query_log = QueryLog.objects.create(
-                    user=request.user,
-                    query_text=question,
-                    response_text=completion_result.content,
-                    retrieved_chunks_count=len(retrieved_chunks),
-                    response_time_ms=total_time_ms,
-                    tokens_used=completion_result.tokens_used
+            # 5. Génération de la réponse via OpenRouter
+            logger.debug("🤖 Génération de la réponse via LLM...")
+            with pipeline.stage('generation'):
+                completion_result = ai_router.chat_completion(
+                    messages=messages,
+                    model=params.model,
+                    temperature=COMPLETION_TEMPERATURE,
+                    max_tokens=COMPLETION_MAX_TOKENS,
+                    routing=pipeline.routing
                 )
-                
-                # Association avec les documents sources
-                source_doc_ids = list(set([c['source_document'].id for c in retrieved_chunks]))
-                query_log.source_documents.set(source_doc_ids)
-            
-            logger.info(
-                f"✅ Requête RAG terminée en {total_time_ms}ms - "
-                f"{len(retrieved_chunks)} chunks, {completion_result.tokens_used} tokens"
-            )
             
-            # 9. Réponse finale
-            return Response({
-                "answer": completion_result.content,
-                "sources": sources,
-                "metadata": {
-                    "query_time_ms": total_time_ms,
-                    "chunks_retrieved": len(retrieved_chunks),
-                    "tokens_used": completion_result.tokens_used,
-                    "model_used": completion_result.model,
-                    "query_id": query_log.id
-                }
-            }, status=status.HTTP_200_OK)
+            # 6. Mise en cache, log de la requête et réponse finale
+            payload = pipeline.complete(retrieved_chunks, query_embedding, completion_result)
+            return Response(payload, status=status.HTTP_200_OK)
+        
+        except PromptTooLargeError as e:
+            logger.warning(f"⚠️ Requête RAG refusée: {str(e)}")
+            
+            return Response({"error": PROMPT_TOO_LARGE_MESSAGE}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        
+        except PROVIDER_UNAVAILABLE_ERRORS as e:
+            logger.warning(f"⚠️ Requête RAG refusée: {str(e)}")
+            
+            return Response(
+                {"error": PROVIDER_UNAVAILABLE_MESSAGE},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(int(e.retry_after) + 1)}
+            )
         
         except Exception as e:
             logger.error(f"❌ Erreur lors du traitement RAG: {str(e)}", exc_info=True)
@@ -290,6 +165,323 @@ class AskDocumentView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class AskDocumentStreamView(APIView):
+    """
+    Variante Server-Sent Events de AskDocumentView.
+    
+    POST /api/rag/ask/stream/
+    Même corps que /api/rag/ask/. Réponse text/event-stream:
+    
+        event: sources   data: {"sources": [...], "metadata": {"chunks_retrieved": 5, ...}}
+        event: delta     data: {"content": "La conclusion"}   (répété)
+        event: done      data: {"metadata": {..., "query_id": 42}}
+        event: error     data: {"error": "..."}               (en cas d'échec)
+    
+    Les sources partent avant le premier token; le QueryLog est écrit
+    une fois le flux terminé.
+    
+    En ASGI, le flux est un générateur asynchrone (astream_chat_completion):
+    Django n'envoie un itérateur synchrone qu'une fois entièrement consommé.
+    Le générateur synchrone sert en WSGI.
+    """
+    
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        """Traite une question utilisateur via RAG, réponse en streaming."""
+        
+        try:
+            params = AskParams.from_data(request.data)
+        except AskValidationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        logger.info(f"🔍 Nouvelle requête RAG (stream): '{params.question[:100]}...' (user: {request.user.username})")
+        
+        from django.core.handlers.asgi import ASGIRequest
+        
+        if isinstance(request._request, ASGIRequest):
+            events = self._aevents(request.user, params)
+        else:
+            events = self._events(request.user, params)
+        
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Pas de bufferisation nginx
+        return response
+    
+    def _events(self, user, params: AskParams):
+        """Générateur des évènements SSE."""
+        from apps.core.ai_router import get_ai_router, ChatCompletionResult
+        from apps.rag.services.embedding_cache import get_question_embedding
+        
+        try:
+            ai_router = get_ai_router()
+            pipeline = RagPipeline(user, params, ai_router)
+            
+            # 1. Caches de réponses et embedding de la question
+            cached = pipeline.lookup_cached_answer()
+            if cached is None:
+                with pipeline.stage('embedding'):
+                    query_embedding, pipeline.embedding_cached = get_question_embedding(ai_router, params.question)
+                cached = pipeline.lookup_similar_answer(query_embedding)
+            if cached is not None:
+                yield from self._replay(cached)
+                return
+            
+            # 2. Recherche: les sources partent immédiatement
+            retrieved_chunks = pipeline.retrieve(query_embedding)
+            if not retrieved_chunks:
+                yield from self._replay(pipeline.no_context_payload())
+                return
+            
+            yield sse_event("sources", {
+                "sources": format_sources(retrieved_chunks),
+                "metadata": {"chunks_retrieved": len(retrieved_chunks), **pipeline.retrieval_info}
+            })
+            
+            # 3. Génération en streaming
+            messages = pipeline.build_messages(retrieved_chunks, query_embedding, allow_local=False)
+            completion_result = None
+            with pipeline.stage('generation'):
+                for item in ai_router.stream_chat_completion(
+                    messages=messages,
+                    model=params.model,
+                    temperature=COMPLETION_TEMPERATURE,
+                    max_tokens=COMPLETION_MAX_TOKENS,
+                    routing=pipeline.routing
+                ):
+                    if isinstance(item, ChatCompletionResult):
+                        completion_result = item
+                    else:
+                        yield sse_event("delta", {"content": item})
+            
+            # 4. Flux terminé: mise en cache, QueryLog et métadonnées finales
+            payload = pipeline.complete(retrieved_chunks, query_embedding, completion_result)
+            yield sse_event("done", {"metadata": payload["metadata"]})
+        
+        except Exception as e:
+            yield self._error_event(e, user)
+    
+    async def _aevents(self, user, params: AskParams):
+        """Générateur asynchrone des évènements SSE (ASGI)."""
+        from apps.core.ai_router import get_ai_router, ChatCompletionResult
+        from apps.rag.services.embedding_cache import aget_question_embedding
+        
+        try:
+            ai_router = get_ai_router()
+            pipeline = RagPipeline(user, params, ai_router)
+            
+            # 1. Caches de réponses et embedding de la question
+            cached = await sync_to_async(pipeline.lookup_cached_answer)()
+            if cached is None:
+                with pipeline.stage('embedding'):
+                    query_embedding, pipeline.embedding_cached = await aget_question_embedding(ai_router, params.question)
+                cached = await sync_to_async(pipeline.lookup_similar_answer)(query_embedding)
+            if cached is not None:
+                for event in self._replay(cached):
+                    yield event
+                return
+            
+            # 2. Recherche: les sources partent immédiatement
+            retrieved_chunks = await sync_to_async(pipeline.retrieve)(query_embedding)
+            if not retrieved_chunks:
+                for event in self._replay(pipeline.no_context_payload()):
+                    yield event
+                return
+            
+            yield sse_event("sources", {
+                "sources": format_sources(retrieved_chunks),
+                "metadata": {"chunks_retrieved": len(retrieved_chunks), **pipeline.retrieval_info}
+            })
+            
+            # 3. Génération en streaming
+            messages = await sync_to_async(pipeline.build_messages)(retrieved_chunks, query_embedding, allow_local=False)
+            completion_result = None
+            with pipeline.stage('generation'):
+                async for item in ai_router.astream_chat_completion(
+                    messages=messages,
+                    model=params.model,
+                    temperature=COMPLETION_TEMPERATURE,
+                    max_tokens=COMPLETION_MAX_TOKENS,
+                    routing=pipeline.routing
+                ):
+                    if isinstance(item, ChatCompletionResult):
+                        completion_result = item
+                    else:
+                        yield sse_event("delta", {"content": item})
+            
+            # 4. Flux terminé: mise en cache, QueryLog et métadonnées finales
+            payload = await sync_to_async(pipeline.complete)(retrieved_chunks, query_embedding, completion_result)
+            yield sse_event("done", {"metadata": payload["metadata"]})
+        
+        except Exception as e:
+            yield self._error_event(e, user)
+    
+    @staticmethod
+    def _error_event(error: Exception, user) -> str:
+        """Évènement SSE 'error' correspondant à une exception du flux."""
+        if isinstance(error, PromptTooLargeError):
+            logger.warning(f"⚠️ Requête RAG (stream) refusée: {str(error)}")
+            return sse_event("error", {"error": PROMPT_TOO_LARGE_MESSAGE})
+        
+        if isinstance(error, PROVIDER_UNAVAILABLE_ERRORS):
+            logger.warning(f"⚠️ Requête RAG (stream) refusée: {str(error)}")
+            return sse_event("error", {
+                "error": PROVIDER_UNAVAILABLE_MESSAGE,
+                "retry_after": int(error.retry_after) + 1
+            })
+        
+        logger.error(f"❌ Erreur lors du traitement RAG (stream): {str(error)}", exc_info=error)
+        return sse_event("error", {
+            "error": "Une erreur est survenue lors du traitement de votre question",
+            "details": str(error) if user.is_staff else None
+        })
+    
+    @staticmethod
+    def _replay(payload: Dict[str, Any]):
+        """Réponse déjà complète (cache, aucun contexte) au format SSE."""
+        yield sse_event("sources", {"sources": payload["sources"], "metadata": {}})
+        yield sse_event("delta", {"content": payload["answer"]})
+        yield sse_event("done", {"metadata": payload["metadata"]})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AskDocumentAsyncView(View):
+    """
+    Variante asynchrone de AskDocumentView, à servir en ASGI (uvicorn).
+    
+    POST /api/rag/ask/async/
+    Même corps et même réponse que /api/rag/ask/.
+    
+    Les appels réseau (embedding Ollama, complétion OpenRouter) sont
+    attendus sans bloquer de thread: un worker peut ainsi traiter de
+    nombreuses questions en parallèle pendant que les LLM répondent.
+    Les étapes en base passent par sync_to_async.
+    
+    Même authentification que les vues DRF: en-tête `Authorization: Token`,
+    sinon session avec contrôle CSRF (comme SessionAuthentication). La vue
+    est exemptée du middleware CSRF pour les clients à jeton uniquement.
+    """
+    
+    async def post(self, request):
+        """Traite une question utilisateur via RAG (ASGI)."""
+        
+        user, error = await self._authenticate(request)
+        if error is not None:
+            return error
+        
+        # 1. Validation des données d'entrée
+        try:
+            data = json.loads(request.body or b'{}')
+            params = AskParams.from_data(data)
+        except (json.JSONDecodeError, AttributeError):
+            return JsonResponse({"error": "Corps JSON invalide"}, status=status.HTTP_400_BAD_REQUEST)
+        except AskValidationError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        logger.info(f"🔍 Nouvelle requête RAG async: '{params.question[:100]}...' (user: {user.username})")
+        
+        try:
+            from apps.core.ai_router import get_ai_router
+            from apps.rag.services.embedding_cache import aget_question_embedding
+            
+            ai_router = get_ai_router()
+            pipeline = RagPipeline(user, params, ai_router)
+            
+            # 2. Caches de réponses et embedding de la question
+            cached = await sync_to_async(pipeline.lookup_cached_answer)()
+            if cached is not None:
+                return JsonResponse(cached)
+            
+            with pipeline.stage('embedding'):
+                query_embedding, pipeline.embedding_cached = await aget_question_embedding(ai_router, params.question)
+            
+            cached = await sync_to_async(pipeline.lookup_similar_answer)(query_embedding)
+            if cached is not None:
+                return JsonResponse(cached)
+            
+            # 3. Recherche et construction du contexte
+            retrieved_chunks = await sync_to_async(pipeline.retrieve)(query_embedding)
+            if not retrieved_chunks:
+                return JsonResponse(pipeline.no_context_payload())
+            
+            messages = await sync_to_async(pipeline.build_messages)(retrieved_chunks, query_embedding)
+            
+            # 4. Génération de la réponse
+            with pipeline.stage('generation'):
+                completion_result = await ai_router.achat_completion(
+                    messages=messages,
+                    model=params.model,
+                    temperature=COMPLETION_TEMPERATURE,
+                    max_tokens=COMPLETION_MAX_TOKENS,
+                    routing=pipeline.routing
+                )
+            
+            # 5. Mise en cache, log de la requête et réponse finale
+            payload = await sync_to_async(pipeline.complete)(retrieved_chunks, query_embedding, completion_result)
+            return JsonResponse(payload)
+        
+        except PromptTooLargeError as e:
+            logger.warning(f"⚠️ Requête RAG async refusée: {str(e)}")
+            
+            return JsonResponse(
+                {"error": PROMPT_TOO_LARGE_MESSAGE},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        
+        except PROVIDER_UNAVAILABLE_ERRORS as e:
+            logger.warning(f"⚠️ Requête RAG async refusée: {str(e)}")
+            
+            response = JsonResponse(
+                {"error": PROVIDER_UNAVAILABLE_MESSAGE},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            response['Retry-After'] = str(int(e.retry_after) + 1)
+            return response
+        
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du traitement RAG async: {str(e)}", exc_info=True)
+            
+            return JsonResponse({
+                "error": "Une erreur est survenue lors du traitement de votre question",
+                "details": str(e) if user.is_staff else None
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+    @staticmethod
+    async def _authenticate(request):
+        """
+        Authentifie la requête comme TokenAuthentication puis SessionAuthentication.
+        
+        Returns:
+            Tuple (utilisateur, None) ou (None, réponse d'erreur)
+        """
+        auth = request.headers.get('Authorization', '').split()
+        if auth and auth[0].lower() == 'token':
+            from rest_framework.authentication import TokenAuthentication
+            from rest_framework.exceptions import AuthenticationFailed
+            
+            if len(auth) != 2:
+                return None, JsonResponse({"error": "En-tête Authorization invalide"}, status=status.HTTP_401_UNAUTHORIZED)
+            try:
+                user, _ = await sync_to_async(TokenAuthentication().authenticate_credentials)(auth[1])
+            except AuthenticationFailed as e:
+                return None, JsonResponse({"error": str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+            return user, None
+        
+        user = await request.auser()
+        if not user.is_authenticated:
+            return None, JsonResponse({"error": "Authentification requise"}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # Session (cookie envoyé automatiquement par le navigateur): jeton CSRF obligatoire
+        from django.middleware.csrf import CsrfViewMiddleware
+        
+        rejection = CsrfViewMiddleware(lambda r: None).process_view(request, None, (), {})
+        if rejection is not None:
+            return None, JsonResponse({"error": "Jeton CSRF manquant ou invalide"}, status=status.HTTP_403_FORBIDDEN)
+        return user, None
+
+
 class DocumentStatsView(APIView):
     """
     Retourne les statistiques sur les documents de l'utilisateur.
@@ -303,7 +495,7 @@ class DocumentStatsView(APIView):
         """Retourne les stats des documents."""
         
         from apps.documents.models import SourceDocument, DocumentChunk
-        from django.db.models import Count, Sum
+        from django.db.models import Sum
         
         # Stats globales
         user_docs = SourceDocument.objects.filter(user=request.user)
@@ -334,9 +526,55 @@ class DocumentStatsView(APIView):
         
         stats['recent_documents'] = list(recent_docs)
         
+        # Métriques des caches du process (staff uniquement)
+        if request.user.is_staff:
+            from apps.rag.services.embedding_cache import get_query_embedding_cache
+            from apps.rag.services.query_log_writer import get_query_log_writer
+            stats['caches'] = {
+                "query_embedding": get_query_embedding_cache().stats(),
+            }
+            from apps.core.ai_router import get_ai_router
+            stats['ollama_endpoints'] = get_ai_router().ollama_pool.stats()
+            stats['chat_models'] = get_ai_router().model_router.latencies.stats()
+            writer = get_query_log_writer()
+            stats['query_log_writer'] = {
+                "pending": writer.pending(),
+                "written": writer.written,
+                "failed": writer.failed,
+            }
+        
         return Response(stats, status=status.HTTP_200_OK)
 
 
+class ProviderHealthView(APIView):
+    """
+    État des fournisseurs IA, pour les load balancers et la supervision.
+    
+    GET /api/rag/health/
+    Réponse servie depuis le cache du HealthMonitor (aucun appel réseau):
+    200 si aucun fournisseur configuré n'est en échec, 503 sinon.
+    Le détail (URLs, disjoncteurs, latences) est réservé au staff.
+    """
+    
+    permission_classes = [AllowAny]
+    
+    def get(self, request):
+        from apps.core.ai_router import get_ai_router
+        
+        health = get_ai_router().get_health_status()
+        providers = {name: health[name]["status"] for name in ("ollama", "openrouter")}
+        healthy = 'unhealthy' not in providers.values()
+        
+        payload = {"status": "ok" if healthy else "degraded", "providers": providers}
+        if request.user.is_staff:
+            payload["details"] = health
+        
+        return Response(
+            payload,
+            status=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+
 class RateFeedbackView(APIView):
     """
     Permet à l'utilisateur de noter une réponse RAG.
@@ -371,7 +609,7 @@ class RateFeedbackView(APIView):
             )
         
         try:
-            query_log = QueryLog.objects.get(id=query_id, user=request.user)
+            query_log = self._get_query_log(query_id, request.user)
             query_log.user_rating = rating
             query_log.save(update_fields=['user_rating'])
             
@@ -384,25 +622,30 @@ class RateFeedbackView(APIView):
             }, status=status.HTTP_200_OK)
         
         except QueryLog.DoesNotExist:
+            from apps.rag.services.query_log_writer import QUERY_LOG_FLUSH_INTERVAL
+            
             return Response(
                 {"error": "Requête introuvable"},
-                status=status.HTTP_404_NOT_FOUND
+                status=status.HTTP_404_NOT_FOUND,
+                # Log peut-être encore en file dans un autre worker
+                headers={"Retry-After": str(int(QUERY_LOG_FLUSH_INTERVAL) + 1)}
             )
-
-
-# ========================================
-# URLS (à ajouter dans apps/rag/urls.py)
-# ========================================
-
-"""
-from django.urls import path
-from .views import AskDocumentView, DocumentStatsView, RateFeedbackView
-
-app_name = 'rag'
-
-urlpatterns = [
-    path('ask/', AskDocumentView.as_view(), name='ask-document'),
-    path('stats/', DocumentStatsView.as_view(), name='document-stats'),
-    path('feedback/', RateFeedbackView.as_view(), name='rate-feedback'),
-]
-"""
+    
+    @staticmethod
+    def _get_query_log(query_id, user):
+        """
+        QueryLog de l'utilisateur, en tenant compte de l'écriture différée.
+        
+        La file de ce process est vidée avant une seconde recherche. Un log
+        encore en file dans un autre worker n'est pas attendu ici: le client
+        reçoit une 404 avec Retry-After et peut renvoyer sa note.
+        """
+        from apps.documents.models import QueryLog
+        from apps.rag.services.query_log_writer import get_query_log_writer
+        
+        try:
+            return QueryLog.objects.get(id=query_id, user=user)
+        except QueryLog.DoesNotExist:
+            get_query_log_writer().flush()
+        
+        return QueryLog.objects.get(id=query_id, user=user)
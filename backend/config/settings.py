@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Recherche plein texte (index GIN)
     
     "django_filters", # new
     'django.contrib.sites',  # new
@@ -93,6 +94,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'  # uvicorn config.asgi:application (vues async)
 
 # ========================================
 # BASE DE DONNÉES POSTGRESQL + PGVECTOR
@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""
+Faux serveurs Ollama et OpenAI/OpenRouter pour les tests de charge hors ligne.
+
+Réponses déterministes (même entrée = même vecteur, même texte), avec
+latence, taux d'erreur et débit configurables par fournisseur. Aucune
+dépendance hors bibliothèque standard.
+
+API simulées:
+    Ollama (--ollama-port):  GET /api/tags, GET /api/version,
+                             POST /api/embeddings, POST /api/embed, POST /api/chat
+    OpenAI (--openai-port):  GET /v1/models, GET /v1/auth/key,
+                             POST /v1/chat/completions (avec ou sans streaming)
+                             (aussi sous /api/v1, comme OpenRouter)
+    Les deux:                GET /_fake/stats (compteurs de la simulation)
+
+Latences (millisecondes):
+    50                  fixe
+    uniform:20:80       uniforme entre 20 et 80
+    normal:50:10        normale (moyenne, écart-type), bornée à 0
+    lognormal:50:0.5    log-normale (médiane, sigma): queue de distribution longue
+    exp:50              exponentielle (moyenne)
+
+Usage:
+    python scripts/fake_providers.py
+    python scripts/fake_providers.py --ollama-latency lognormal:40:0.6 --ollama-concurrency 2 \\
+        --openai-latency normal:800:200 --token-latency 15 --openai-error-rate 0.02 --openai-max-rps 20
+
+    # Puis, côté Django / Celery:
+    OLLAMA_BASE_URL=http://localhost:11435 \\
+    OPENROUTER_BASE_URL=http://localhost:11436/v1 OPENROUTER_API_KEY=fake \\
+    python manage.py benchmark_embeddings --backends ollama
+"""
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+
+# ========================================
+# CONFIGURATION
+# ========================================
+
+DEFAULT_EMBEDDING_MODEL = "nomic-embed-text"
+DEFAULT_CHAT_MODEL = "llama3.2"
+
+FAKE_WORDS = (
+    "le document indique que la procédure doit être validée par le comité avant "
+    "la fin du trimestre selon les conditions prévues au contrat les données "
+    "analysées montrent une progression régulière des résultats sur la période "
+    "étudiée et confirment les hypothèses présentées dans le rapport initial"
+).split()
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+# ========================================
+# DISTRIBUTIONS DE LATENCE
+# ========================================
+
+class Latency:
+    """Distribution de latence (ms) décrite par une chaîne 'type:paramètres'."""
+
+    KINDS = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exp': 1}
+
+    def __init__(self, spec: str):
+        parts = spec.split(':')
+        if parts[0].replace('.', '', 1).isdigit():
+            parts = ['fixed'] + parts
+        kind, params = parts[0], parts[1:]
+        if kind not in self.KINDS or len(params) != self.KINDS[kind]:
+            raise ValueError(f"Latence invalide: '{spec}' (ex: 50, uniform:20:80, normal:50:10, lognormal:50:0.5, exp:50)")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(p) for p in params]
+
+    def sample(self, rng: random.Random) -> float:
+        """Tire une latence, en secondes."""
+        p = self.params
+        if self.kind == 'fixed':
+            ms = p[0]
+        elif self.kind == 'uniform':
+            ms = rng.uniform(p[0], p[1])
+        elif self.kind == 'normal':
+            ms = rng.gauss(p[0], p[1])
+        elif self.kind == 'lognormal':
+            ms = p[0] * math.exp(rng.gauss(0, p[1]))
+        else:
+            ms = rng.expovariate(1 / p[0]) if p[0] > 0 else 0
+        return max(ms, 0) / 1000
+
+
+# ========================================
+# PROFIL DE SIMULATION PAR FOURNISSEUR
+# ========================================
+
+class TokenBucket:
+    """Limite de débit (requêtes/s) avec une rafale d'une seconde (au moins une requête)."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(rate, 1.0)  # Sous 1 req/s, la rafale doit contenir un jeton entier
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> Tuple[bool, float]:
+        """Retourne (accepté, attente conseillée en secondes)."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True, 0.0
+            return False, (1 - self.tokens) / self.rate
+
+
+@dataclass
+class ProviderProfile:
+    """Comportement simulé d'un fournisseur."""
+    name: str
+    latency: Latency
+    token_latency: Latency
+    error_rate: float = 0.0
+    error_codes: List[int] = field(default_factory=lambda: [500, 503])
+    max_rps: float = 0.0  # 0 = illimité; au-delà: 429
+    concurrency: int = 0  # 0 = illimité; au-delà: file d'attente (comme OLLAMA_NUM_PARALLEL)
+    dimensions: int = 768
+    completion_tokens: int = 80
+    seed: int = 0
+
+    def __post_init__(self):
+        self.rng = random.Random(self.seed)
+        self.rng_lock = threading.Lock()
+        self.bucket = TokenBucket(self.max_rps) if self.max_rps > 0 else None
+        self.slots = threading.BoundedSemaphore(self.concurrency) if self.concurrency > 0 else None
+        self.stats: Dict[str, Any] = {
+            "requests": 0, "errors": 0, "throttled": 0, "in_flight": 0,
+            "queued": 0, "by_path": {}
+        }
+        self.stats_lock = threading.Lock()
+
+    def draw(self, latency: Latency) -> float:
+        with self.rng_lock:
+            return latency.sample(self.rng)
+
+    def should_fail(self) -> Optional[int]:
+        if self.error_rate <= 0:
+            return None
+        with self.rng_lock:
+            if self.rng.random() < self.error_rate:
+                return self.rng.choice(self.error_codes)
+        return None
+
+    def count(self, key: str, delta: int = 1, path: Optional[str] = None) -> None:
+        with self.stats_lock:
+            self.stats[key] += delta
+            if path:
+                self.stats["by_path"][path] = self.stats["by_path"].get(path, 0) + 1
+
+
+# ========================================
+# CONTENU DÉTERMINISTE
+# ========================================
+
+@lru_cache(maxsize=50000)
+def _word_vector(word: str, dimensions: int) -> Tuple[float, ...]:
+    rng = random.Random(hashlib.sha256(word.encode('utf-8')).digest())
+    return tuple(rng.gauss(0, 1) for _ in range(dimensions))
+
+
+def fake_embedding(text: str, dimensions: int) -> List[float]:
+    """
+    Vecteur normalisé, fonction du texte seul: somme des vecteurs (pseudo-
+    aléatoires) de ses mots. Des textes partageant des mots sont proches,
+    ce qui garde un sens aux recherches de similarité pendant les tests.
+    """
+    words = _WORD_RE.findall(text.lower()) or [""]
+    vector = [0.0] * dimensions
+    for word in words:
+        vector = [a + b for a, b in zip(vector, _word_vector(word, dimensions))]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def fake_completion(model: str, messages: List[Dict[str, Any]], target_tokens: int) -> List[str]:
+    """Liste de tokens (mots) déterminée par le modèle et les messages."""
+    payload = json.dumps([model, messages], sort_keys=True, ensure_ascii=False)
+    rng = random.Random(hashlib.sha256(payload.encode('utf-8')).digest())
+    words = [rng.choice(FAKE_WORDS) for _ in range(target_tokens)]
+    words[0] = words[0].capitalize()
+    return [word + ('.' if i == len(words) - 1 else ' ') for i, word in enumerate(words)]
+
+
+def count_prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(len(_WORD_RE.findall(str(m.get('content') or ''))) + 4 for m in messages) + 3
+
+
+# ========================================
+# SERVEUR HTTP
+# ========================================
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    """Routage commun: limitation, erreurs simulées, latence, puis réponse."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, comme les vrais fournisseurs
+    profile: ProviderProfile
+    verbose = False
+    routes: Dict[Tuple[str, str], str] = {}
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    # ----------------------------------------
+    # Entrées / sorties
+    # ----------------------------------------
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _write_chunk(self, data: str) -> None:
+        raw = data.encode('utf-8')
+        self.wfile.write(f"{len(raw):x}\r\n".encode('ascii') + raw + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _error_body(self, status: int, message: str) -> Any:
+        return {"error": message}
+
+    # ----------------------------------------
+    # Routage
+    # ----------------------------------------
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method: str) -> None:
+        path = self.path.split('?', 1)[0].rstrip('/')
+        # Corps lu avant toute réponse (sinon il corromprait la requête suivante en keep-alive)
+        try:
+            body = self._read_json() if method == 'POST' else {}
+        except ValueError:
+            self._send_json(400, self._error_body(400, "JSON invalide"))
+            return
+
+        if path == '/_fake/stats':
+            with self.profile.stats_lock:
+                self._send_json(200, {"provider": self.profile.name, **self.profile.stats})
+            return
+
+        handler_name = self.routes.get((method, path))
+        if handler_name is None:
+            self._send_json(404, self._error_body(404, f"Route inconnue: {method} {path}"))
+            return
+
+        profile = self.profile
+        profile.count("requests", path=path)
+
+        if profile.bucket is not None:
+            accepted, retry_after = profile.bucket.try_acquire()
+            if not accepted:
+                profile.count("throttled")
+                self._send_json(
+                    429, self._error_body(429, "Rate limit exceeded"),
+                    headers={"Retry-After": f"{max(retry_after, 0.001):.3f}"}
+                )
+                return
+
+        if profile.slots is not None and not profile.slots.acquire(blocking=False):
+            profile.count("queued")
+            profile.slots.acquire()
+        profile.count("in_flight")
+        try:
+            status = profile.should_fail()
+            if status is not None:
+                time.sleep(profile.draw(profile.latency))
+                profile.count("errors")
+                self._send_json(status, self._error_body(status, "Erreur simulée"))
+                return
+            getattr(self, handler_name)(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client parti (timeout, annulation)
+        finally:
+            profile.count("in_flight", -1)
+            if profile.slots is not None:
+                profile.slots.release()
+
+    def _target_tokens(self, max_tokens: Optional[int]) -> Tuple[int, str]:
+        target = self.profile.completion_tokens
+        if max_tokens and max_tokens < target:
+            return max(int(max_tokens), 1), "length"
+        return target, "stop"
+
+
+class OllamaHandler(FakeProviderHandler):
+    """API Ollama (embeddings et chat)."""
+
+    routes = {
+        ('GET', '/api/tags'): 'tags',
+        ('GET', '/api/version'): 'version',
+        ('POST', '/api/embeddings'): 'embeddings',
+        ('POST', '/api/embed'): 'embed',
+        ('POST', '/api/chat'): 'chat',
+    }
+
+    def tags(self, body):
+        models = [DEFAULT_EMBEDDING_MODEL, DEFAULT_CHAT_MODEL]
+        self._send_json(200, {"models": [
+            {"name": f"{name}:latest", "model": f"{name}:latest", "size": 274302450} for name in models
+        ]})
+
+    def version(self, body):
+        self._send_json(200, {"version": "0.0.0-fake"})
+
+    def embeddings(self, body):
+        time.sleep(self.profile.draw(self.profile.latency))
+        self._send_json(200, {"embedding": fake_embedding(str(body.get('prompt') or ''), self.profile.dimensions)})
+
+    def embed(self, body):
+        texts = body.get('input') or ''
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        time.sleep(sum(self.profile.draw(self.profile.latency) for _ in texts))
+        self._send_json(200, {
+            "model": body.get('model') or DEFAULT_EMBEDDING_MODEL,
+            "embeddings": [fake_embedding(str(text), self.profile.dimensions) for text in texts],
+        })
+
+    def chat(self, body):
+        model = body.get('model') or DEFAULT_CHAT_MODEL
+        messages = body.get('messages') or []
+        target, done_reason = self._target_tokens((body.get('options') or {}).get('num_predict'))
+        tokens = fake_completion(model, messages, target)
+        prompt_tokens = count_prompt_tokens(messages)
+        start = time.time()
+
+        time.sleep(self.profile.draw(self.profile.latency))
+        final = {
+            "model": model,
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            "done": True,
+            "done_reason": done_reason,
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": len(tokens),
+        }
+
+        if body.get('stream', True) is False:
+            time.sleep(sum(self.profile.draw(self.profile.token_latency) for _ in tokens))
+            final["message"] = {"role": "assistant", "content": ''.join(tokens)}
+            final["total_duration"] = int((time.time() - start) * 1e9)
+            self._send_json(200, final)
+            return
+
+        self._start_stream('application/x-ndjson')
+        for token in tokens:
+            self._write_chunk(json.dumps({
+                "model": model, "message": {"role": "assistant", "content": token}, "done": False
+            }, ensure_ascii=False) + "\n")
+            time.sleep(self.profile.draw(self.profile.token_latency))
+        final["message"] = {"role": "assistant", "content": ""}
+        final["total_duration"] = int((time.time() - start) * 1e9)
+        self._write_chunk(json.dumps(final) + "\n")
+        self._end_stream()
+
+
+class OpenAIHandler(FakeProviderHandler):
+    """API compatible OpenAI (chat, streaming SSE), sous /v1 et /api/v1."""
+
+    routes = {
+        (method, prefix + path): name
+        for prefix in ('/v1', '/api/v1')
+        for method, path, name in (
+            ('GET', '/models', 'models'),
+            ('GET', '/auth/key', 'auth_key'),
+            ('POST', '/chat/completions', 'chat_completions'),
+        )
+    }
+
+    def _error_body(self, status: int, message: str) -> Any:
+        return {"error": {"message": message, "type": "fake_error", "code": status}}
+
+    def models(self, body):
+        self._send_json(200, {"object": "list", "data": [
+            {"id": DEFAULT_CHAT_MODEL, "object": "model", "created": 0, "owned_by": "fake"}
+        ]})
+
+    def auth_key(self, body):
+        self._send_json(200, {"data": {"label": "fake", "usage": 0, "limit": None, "limit_remaining": None}})
+
+    def chat_completions(self, body):
+        model = body.get('model') or DEFAULT_CHAT_MODEL
+        messages = body.get('messages') or []
+        target, finish_reason = self._target_tokens(body.get('max_tokens') or body.get('max_completion_tokens'))
+        tokens = fake_completion(model, messages, target)
+        prompt_tokens = count_prompt_tokens(messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        time.sleep(self.profile.draw(self.profile.latency))  # Temps jusqu'au premier token
+
+        if not body.get('stream'):
+            time.sleep(sum(self.profile.draw(self.profile.token_latency) for _ in tokens))
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": ''.join(tokens)},
+                    "finish_reason": finish_reason,
+                }],
+                "usage": usage,
+            })
+            return
+
+        def event(choices, **extra):
+            return "data: " + json.dumps({
+                "id": completion_id, "object": "chat.completion.chunk", "created": created,
+                "model": model, "choices": choices, **extra
+            }, ensure_ascii=False) + "\n\n"
+
+        self._start_stream('text/event-stream')
+        self._write_chunk(event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]))
+        for token in tokens:
+            self._write_chunk(event([{"index": 0, "delta": {"content": token}, "finish_reason": None}]))
+            time.sleep(self.profile.draw(self.profile.token_latency))
+        self._write_chunk(event([{"index": 0, "delta": {}, "finish_reason": finish_reason}]))
+        if (body.get('stream_options') or {}).get('include_usage'):
+            self._write_chunk(event([], usage=usage))
+        self._write_chunk("data: [DONE]\n\n")
+        self._end_stream()
+
+
+# ========================================
+# LANCEMENT
+# ========================================
+
+def make_server(handler_class, host: str, port: int, profile: ProviderProfile, verbose: bool) -> ThreadingHTTPServer:
+    handler = type(handler_class.__name__, (handler_class,), {"profile": profile, "verbose": verbose})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Faux serveurs Ollama et OpenAI/OpenRouter (tests de charge)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--ollama-port', type=int, default=11435, help="0 = désactivé (défaut: 11435)")
+    parser.add_argument('--openai-port', type=int, default=11436, help="0 = désactivé (défaut: 11436)")
+    parser.add_argument('--seed', type=int, default=0, help="Graine des tirages (latences, erreurs)")
+    parser.add_argument('--dimensions', type=int, default=768, help="Dimension des embeddings (défaut: 768)")
+    parser.add_argument('--completion-tokens', type=int, default=80, help="Longueur des réponses (défaut: 80)")
+    parser.add_argument('--token-latency', type=Latency, default=Latency('0'), help="Délai entre tokens générés")
+    parser.add_argument('--error-codes', default='500,503', help="Codes des erreurs simulées (défaut: 500,503)")
+    for name, latency in (('ollama', '20'), ('openai', '300')):
+        parser.add_argument(f'--{name}-latency', type=Latency, default=Latency(latency),
+                            help=f"Latence par embedding / avant le premier token (défaut: {latency})")
+        parser.add_argument(f'--{name}-error-rate', type=float, default=0.0, help="Part de requêtes en erreur (0-1)")
+        parser.add_argument(f'--{name}-max-rps', type=float, default=0.0, help="Requêtes/s max, au-delà 429 (0 = illimité)")
+        parser.add_argument(f'--{name}-concurrency', type=int, default=0,
+                            help="Requêtes traitées en parallèle, les autres attendent (0 = illimité)")
+    parser.add_argument('--verbose', action='store_true', help="Journaliser chaque requête")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    error_codes = [int(code) for code in args.error_codes.split(',') if code.strip()]
+
+    servers = []
+    for name, handler_class, port in (('ollama', OllamaHandler, args.ollama_port), ('openai', OpenAIHandler, args.openai_port)):
+        if not port:
+            continue
+        profile = ProviderProfile(
+            name=name,
+            latency=getattr(args, f'{name}_latency'),
+            token_latency=args.token_latency,
+            error_rate=getattr(args, f'{name}_error_rate'),
+            error_codes=error_codes,
+            max_rps=getattr(args, f'{name}_max_rps'),
+            concurrency=getattr(args, f'{name}_concurrency'),
+            dimensions=args.dimensions,
+            completion_tokens=args.completion_tokens,
+            seed=args.seed,
+        )
+        server = make_server(handler_class, args.host, port, profile, args.verbose)
+        threading.Thread(target=server.serve_forever, name=f"fake-{name}", daemon=True).start()
+        servers.append(server)
+        print(f"✅ Faux {name} sur http://{args.host}:{port} - latence {profile.latency.spec}, "
+              f"erreurs {profile.error_rate:.0%}, débit max {profile.max_rps or '∞'} req/s")
+
+    if not servers:
+        print("❌ Aucun serveur activé")
+        return 1
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+            print(f"📊 {server.RequestHandlerClass.profile.name}: {json.dumps(server.RequestHandlerClass.profile.stats)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())